@@ -0,0 +1,438 @@
+"""Statistics of the moderation results.
+
+The results of an export (see `export_results.py`) are loaded once into
+compact arrays: one integer index per result into the arrays of unique
+papers, categories and moderators, and the code of the primary decision (see
+`schema.py`). All statistics are then computed with vectorized NumPy
+operations (`np.bincount` grouped by category or by paper) instead of loops
+over the results, so hundreds of thousands of results take seconds:
+- per category: distribution of the primary decisions
+- per paper and category: number of results, decision counts, majority
+  decision and agreement of the moderators who annotated the paper
+- per category: inter-moderator agreement on papers annotated by several
+  moderators (observed agreement and Fleiss' kappa, on the four primary
+  decisions and on fit vs bad fit)
+- per category: fit rates of the positive and negative papers of the queues,
+  given a labels file
+- per queue, given a queue file: number of papers shared with other queues
+  and the largest overlap with another queue, computed on the packed queues
+  of `queue_io.py`
+
+The labels file is a JSON file mapping each category code to its positive
+and negative papers: `{"astro-ph.CO": {"pos": [paper IDs], "neg": [paper IDs]}}`.
+
+Example usage:
+```bash
+python analytics.py --results_collection mod_results-all2023_v2-test-pos50-neg50-ar5iv-1001
+python analytics.py --results_collection mod_results-all2023_v2-test-pos50-neg50-ar5iv-1001 --labels labels.json --output_dir analytics
+python analytics.py --queues data/mod-queue-all2023_v2-test-pos50-neg50.queues --output_dir analytics
+```
+"""
+
+import json
+import logging
+import os
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from decisions import PrimaryDecision
+from export_results import read_export
+from queue_io import PackedQueues, load_packed_queues
+from schema import PRIMARY_CODES, PRIMARY_DECISIONS
+from utils import MODERATOR_RESULTS_COLLECTION
+
+# NOTE: not the parser of utils, to which export_results adds its own arguments
+parser = ArgumentParser()
+parser.add_argument(
+    "--results_collection",
+    "-mrc",
+    type=str,
+    default=MODERATOR_RESULTS_COLLECTION,
+    help="Firestore collection of the moderation results",
+)
+parser.add_argument(
+    "--export_dir",
+    type=str,
+    default=None,
+    help="Directory of the export of the results (default: exports/<results_collection>)",
+)
+parser.add_argument(
+    "--labels",
+    type=str,
+    default=None,
+    help="JSON file with the positive and negative papers of each category",
+)
+parser.add_argument(
+    "--queues",
+    type=str,
+    default=None,
+    help="Queue file (.json, .jsonl or .queues) to compute the overlap statistics of",
+)
+parser.add_argument(
+    "--output_dir",
+    type=str,
+    default=None,
+    help="Directory to save the statistics to as CSV files",
+)
+
+logger = logging.getLogger(__name__)
+
+NUM_DECISIONS = len(PrimaryDecision)
+# decision names in the order of their codes
+DECISION_NAMES = [PRIMARY_DECISIONS[code].name for code in range(NUM_DECISIONS)]
+BAD_FIT_CODE = PRIMARY_CODES[PrimaryDecision.BAD_FIT]
+# label codes of the papers
+NEG, POS, UNLABELED = 0, 1, -1
+
+
+@dataclass(frozen=True)
+class ResultArrays:
+    """Moderation results as arrays of integer codes, one entry per result.
+
+    Args:
+        papers (np.ndarray): unique paper IDs
+        categories (np.ndarray): unique category codes
+        moderators (np.ndarray): unique moderator names
+        paper (np.ndarray): index into `papers` of each result
+        category (np.ndarray): index into `categories` of each result
+        moderator (np.ndarray): index into `moderators` of each result
+        primary (np.ndarray): code of the primary decision of each result
+
+    """
+
+    papers: np.ndarray
+    categories: np.ndarray
+    moderators: np.ndarray
+    paper: np.ndarray
+    category: np.ndarray
+    moderator: np.ndarray
+    primary: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ResultArrays":
+        """Build the arrays from the results of an export (see `read_export`).
+
+        Raises:
+            ValueError: if a primary decision is not a `PrimaryDecision` name
+
+        """
+        # NOTE: the columns are factorized as object arrays, so that the unique
+        # values are sorted lexically (for a categorical column, sort=True
+        # would follow the order of its categories instead)
+        paper, papers = pd.factorize(df["paper_id"].to_numpy(object), sort=True)
+        category, categories = pd.factorize(df["category"].to_numpy(object), sort=True)
+        moderator, moderators = pd.factorize(df["name"].to_numpy(object), sort=True)
+        codes = {decision.name: code for decision, code in PRIMARY_CODES.items()}
+        primary = df["primary_decision"].astype(str).map(codes)
+        unknown = primary.isna()
+        if unknown.any():
+            values = sorted(df.loc[unknown, "primary_decision"].astype(str).unique())
+            raise ValueError(
+                f"{unknown.sum()} results have an unknown primary decision: {values}"
+            )
+        return cls(
+            papers=np.asarray(papers, dtype=object),
+            categories=np.asarray(categories, dtype=object),
+            moderators=np.asarray(moderators, dtype=object),
+            paper=paper.astype(np.int32),
+            category=category.astype(np.int32),
+            moderator=moderator.astype(np.int32),
+            primary=primary.to_numpy(dtype=np.int8),
+        )
+
+    def __len__(self) -> int:
+        return len(self.primary)
+
+
+def grouped_counts(
+    group: np.ndarray, values: np.ndarray, num_groups: int, num_values: int
+) -> np.ndarray:
+    """Count the occurrences of each value in each group.
+
+    Args:
+        group (np.ndarray): group index of each entry
+        values (np.ndarray): value (between 0 and `num_values` - 1) of each entry
+        num_groups (int): number of groups
+        num_values (int): number of values
+    Returns:
+        np.ndarray: counts of shape (num_groups, num_values)
+
+    """
+    flat = group.astype(np.int64) * num_values + values
+    return np.bincount(flat, minlength=num_groups * num_values).reshape(
+        num_groups, num_values
+    )
+
+
+def agreement(counts: np.ndarray, group: np.ndarray, num_groups: int) -> pd.DataFrame:
+    """Compute the agreement of the raters on the items of each group.
+
+    Only items with at least two ratings are taken into account. Fleiss' kappa
+    is computed with the expected agreement of the pooled ratings of the group,
+    which also applies when items have different numbers of ratings.
+
+    Args:
+        counts (np.ndarray): number of ratings of each item in each class,
+            of shape (num_items, num_classes)
+        group (np.ndarray): group index of each item
+        num_groups (int): number of groups
+    Returns:
+        pd.DataFrame: number of items with several ratings, observed agreement
+        and Fleiss' kappa of each group (NaN for groups without such items)
+
+    """
+    n = counts.sum(axis=1)
+    shared = n >= 2
+    counts, n, group = counts[shared], n[shared], group[shared]
+    # fraction of agreeing pairs of ratings of each item
+    observed = ((counts**2).sum(axis=1) - n) / (n * (n - 1))
+    num_items = np.bincount(group, minlength=num_groups)
+    pooled = np.zeros((num_groups, counts.shape[1]))
+    np.add.at(pooled, group, counts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_observed = np.bincount(group, observed, minlength=num_groups) / num_items
+        proportions = pooled / pooled.sum(axis=1, keepdims=True)
+        expected = (proportions**2).sum(axis=1)
+        kappa = (mean_observed - expected) / (1 - expected)
+    return pd.DataFrame(
+        {"shared_papers": num_items, "agreement": mean_observed, "kappa": kappa}
+    )
+
+
+def item_keys(
+    paper: np.ndarray, category: np.ndarray | int, num_categories: int
+) -> np.ndarray:
+    """Get a unique integer key of each paper-category pair."""
+    return paper.astype(np.int64) * num_categories + category
+
+
+def load_labels(path: str, results: ResultArrays) -> tuple[np.ndarray, np.ndarray]:
+    """Load the labels of the papers in the results.
+
+    Args:
+        path (str): path to the labels file
+        results (ResultArrays): results
+    Returns:
+        keys (np.ndarray): sorted paper-category keys (see `item_keys`) of
+            the labeled papers of the results
+        labels (np.ndarray): label (`POS` or `NEG`) of each key
+
+    """
+    with open(path, "r") as f:
+        labels_by_category = json.load(f)
+    paper_index = pd.Index(results.papers)
+    category_index = pd.Index(results.categories)
+    keys, labels = [], []
+    for category, split in labels_by_category.items():
+        category_idx = category_index.get_indexer([category])[0]
+        if category_idx == -1:
+            continue
+        for label, paper_ids in [(POS, split["pos"]), (NEG, split["neg"])]:
+            paper_idx = paper_index.get_indexer(paper_ids)
+            paper_idx = paper_idx[paper_idx != -1]
+            keys.append(item_keys(paper_idx, category_idx, len(results.categories)))
+            labels.append(np.full(len(paper_idx), label, dtype=np.int8))
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8)
+    keys, labels = np.concatenate(keys), np.concatenate(labels)
+    order = np.argsort(keys, kind="stable")
+    return keys[order], labels[order]
+
+
+def queue_overlap(queues: PackedQueues) -> pd.DataFrame:
+    """Compute the overlap of each queue with the other queues.
+
+    Args:
+        queues (PackedQueues): queues
+    Returns:
+        pd.DataFrame: size of each queue, number and fraction of its papers that
+        are also in other queues, and the other queue sharing the most papers
+
+    """
+    sizes = np.diff(queues.offsets)
+    # papers of each entry that are in more than one queue, summed per queue
+    shared_entries = queues.paper_counts()[queues.entries] > 1
+    cumulative = np.concatenate([[0], np.cumsum(shared_entries)])
+    shared = cumulative[queues.offsets[1:]] - cumulative[queues.offsets[:-1]]
+    overlap = queues.overlap_matrix()
+    np.fill_diagonal(overlap, -1)
+    closest = overlap.argmax(axis=1) if len(queues) > 1 else np.zeros(len(queues), int)
+    max_overlap = overlap[np.arange(len(queues)), closest].clip(min=0)
+    names = pd.Series(queues.names)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shared_fraction = shared / sizes
+    return pd.DataFrame(
+        {
+            "queue": names,
+            "category": names.str.rpartition(":")[2],
+            "size": sizes,
+            "shared_papers": shared,
+            "shared_fraction": shared_fraction,
+            "max_overlap": max_overlap,
+            "max_overlap_queue": np.where(
+                max_overlap > 0, names.to_numpy()[closest], None
+            ),
+        }
+    )
+
+
+def analyze(
+    results: ResultArrays, labels: tuple[np.ndarray, np.ndarray] | None = None
+) -> dict[str, pd.DataFrame]:
+    """Compute the statistics of the results.
+
+    Args:
+        results (ResultArrays): results
+        labels (tuple[np.ndarray, np.ndarray] | None): output of `load_labels`,
+            or None to skip the statistics of the positive and negative papers
+    Returns:
+        dict with the statistics per category ("categories") and per paper and
+        category ("papers")
+
+    """
+    num_categories = len(results.categories)
+    # one item per paper-category pair, shared by the queues of the category
+    keys, item = np.unique(
+        item_keys(results.paper, results.category, num_categories),
+        return_inverse=True,
+    )
+    item_category = (keys % num_categories).astype(np.int32)
+    item_counts = grouped_counts(item, results.primary, len(keys), NUM_DECISIONS)
+
+    # per paper and category
+    n = item_counts.sum(axis=1)
+    # 3 for GREAT_FIT down to 0 for BAD_FIT
+    scores = np.arange(NUM_DECISIONS - 1, -1, -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        item_agreement = np.where(
+            n >= 2, ((item_counts**2).sum(axis=1) - n) / (n * (n - 1)), np.nan
+        )
+    papers = pd.DataFrame(
+        {
+            "paper_id": results.papers[keys // num_categories],
+            "category": results.categories[item_category],
+            "num_results": n,
+            **dict(zip(DECISION_NAMES, item_counts.T)),
+            # ties are broken towards the better fit
+            "majority": np.asarray(DECISION_NAMES)[item_counts.argmax(axis=1)],
+            "mean_score": item_counts @ scores / n,
+            "agreement": item_agreement,
+        }
+    )
+
+    # per category
+    category_counts = grouped_counts(
+        results.category, results.primary, num_categories, NUM_DECISIONS
+    )
+    num_results = category_counts.sum(axis=1)
+    categories = pd.DataFrame(
+        {
+            "num_results": num_results,
+            "num_moderators": np.bincount(
+                np.unique(
+                    results.category.astype(np.int64) * len(results.moderators)
+                    + results.moderator
+                )
+                // len(results.moderators),
+                minlength=num_categories,
+            ),
+            "num_papers": np.bincount(item_category, minlength=num_categories),
+            **dict(zip(DECISION_NAMES, category_counts.T)),
+            "fit_rate": 1 - category_counts[:, BAD_FIT_CODE] / num_results,
+        },
+        index=pd.Index(results.categories, name="category"),
+    )
+    fit_counts = np.stack(
+        [
+            n - item_counts[:, BAD_FIT_CODE],
+            item_counts[:, BAD_FIT_CODE],
+        ],
+        axis=1,
+    )
+    for suffix, counts in [("", item_counts), ("_fit", fit_counts)]:
+        stats = agreement(counts, item_category, num_categories)
+        if not suffix:
+            categories["shared_papers"] = stats["shared_papers"].to_numpy()
+        categories[f"agreement{suffix}"] = stats["agreement"].to_numpy()
+        categories[f"kappa{suffix}"] = stats["kappa"].to_numpy()
+
+    if labels is not None:
+        label_keys, label_values = labels
+        # label of each item
+        position = np.searchsorted(label_keys, keys).clip(max=len(label_keys) - 1)
+        if len(label_keys):
+            found = label_keys[position] == keys
+            item_label = np.where(found, label_values[position], UNLABELED)
+        else:
+            item_label = np.full(len(keys), UNLABELED, dtype=np.int8)
+        papers["label"] = pd.Categorical.from_codes(
+            item_label + 1, ["unlabeled", "neg", "pos"]
+        )
+        # fit and bad fit results of each category and label
+        result_label = item_label[item]
+        labeled = result_label != UNLABELED
+        group = results.category[labeled] * 2 + result_label[labeled]
+        is_bad = (results.primary[labeled] == BAD_FIT_CODE).astype(np.int64)
+        counts = grouped_counts(group, is_bad, 2 * num_categories, 2).reshape(
+            num_categories, 2, 2
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for label, name in [(POS, "pos"), (NEG, "neg")]:
+                total = counts[:, label].sum(axis=1)
+                categories[f"{name}_results"] = total
+                categories[f"{name}_fit_rate"] = counts[:, label, 0] / total
+            # fraction of results agreeing with the label: fit for positive
+            # papers and bad fit for negative papers
+            categories["label_agreement"] = (
+                counts[:, POS, 0] + counts[:, NEG, 1]
+            ) / counts.sum(axis=(1, 2))
+
+    return {"categories": categories, "papers": papers}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parser.parse_args()
+
+    stats = {}
+    if args.queues is not None:
+        start = time.time()
+        queues = load_packed_queues(args.queues)
+        stats["queues"] = queue_overlap(queues)
+        counts = np.bincount(queues.paper_counts())
+        logger.info(
+            f"Computed the overlap of {len(queues)} queues with {len(queues.entries)} "
+            f"entries of {len(queues.ids)} papers in {time.time() - start:.1f}s"
+        )
+        print("Number of papers in 1, 2, ... queues:", counts[1:].tolist())
+
+    export_dir = args.export_dir or os.path.join("exports", args.results_collection)
+    start = time.time()
+    results = ResultArrays.from_frame(read_export(export_dir))
+    logger.info(
+        f"Loaded {len(results)} results of {len(results.papers)} papers in "
+        f"{len(results.categories)} categories from {export_dir} "
+        f"in {time.time() - start:.1f}s"
+    )
+    if len(results) > 0:
+        start = time.time()
+        labels = None if args.labels is None else load_labels(args.labels, results)
+        stats.update(analyze(results, labels))
+        logger.info(f"Computed statistics in {time.time() - start:.1f}s")
+
+        with pd.option_context(
+            "display.max_rows", None, "display.width", 200, "display.precision", 3
+        ):
+            print(stats["categories"])
+    elif not stats:
+        raise SystemExit(f"No results in {export_dir}, run export_results.py first")
+    else:
+        logger.warning(f"No results in {export_dir}, only the queues are analyzed")
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for name, df in stats.items():
+            path = os.path.join(args.output_dir, f"{name}.csv")
+            df.to_csv(path, index=name == "categories")
+            logger.info(f"Saved {len(df)} rows to {path}")
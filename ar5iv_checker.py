@@ -0,0 +1,126 @@
+"""Concurrent, rate-limited check of which papers have an ar5iv page.
+
+A page is available if ar5iv answers with a 2xx status code, and missing if
+it answers with a redirect or a 404. Other status codes (e.g. 503) and
+connection errors are retried.
+
+Example usage:
+```python
+checker = Ar5ivChecker(max_workers=16, rate=20)
+available = checker.check_many(["2309.04535", "2309.01443"])
+```
+
+The checker can be run against a local server with `base_url`, see
+`tests/test_ar5iv_checker.py`.
+"""
+
+import logging
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tenacity import retry, stop_after_attempt, wait_exponential
+from tqdm import tqdm
+from http_utils import TIMEOUT, TokenBucket, make_session
+
+logger = logging.getLogger(__name__)
+
+AR5IV_URL = "https://ar5iv.labs.arxiv.org/html"
+
+
+class Ar5ivChecker:
+    """Check ar5iv pages with a thread pool sharing one connection pool.
+
+    Args:
+        base_url (str): URL under which the ar5iv pages are served
+        max_workers (int): number of concurrent requests
+        rate (float): maximum number of requests per second
+        max_attempts (int): number of attempts per paper before giving up
+        min_wait (float): minimum number of seconds to wait before retrying
+        timeout (float | tuple[float, float]): connect and read timeouts of a
+            request in seconds
+
+    """
+
+    def __init__(
+        self,
+        base_url: str = AR5IV_URL,
+        max_workers: int = 16,
+        rate: float = 20.0,
+        max_attempts: int = 3,
+        min_wait: float = 4,
+        timeout: float | tuple[float, float] = TIMEOUT,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = make_session(max_workers)
+        self.bucket = TokenBucket(rate)
+        self._check = retry(
+            stop=stop_after_attempt(max_attempts),
+            wait=wait_exponential(multiplier=1, min=min_wait, max=15),
+            reraise=True,
+        )(self._check_once)
+
+    def _check_once(self, paper_id: str) -> bool:
+        self.bucket.acquire()
+        response = self.session.get(
+            f"{self.base_url}/{paper_id}",
+            allow_redirects=False,
+            timeout=self.timeout,
+        )
+        match response.status_code:
+            case s if 200 <= s < 300:
+                return True
+            # ar5iv redirects to arXiv when it has no page for the paper
+            case s if 300 <= s < 400 or s == 404:
+                return False
+            case _:
+                # e.g. 503 when ar5iv is overloaded, which is retried
+                raise Exception(f"Unexpected status code: {response.status_code}")
+
+    def check(self, paper_id: str) -> bool:
+        """Check if the paper has an ar5iv page.
+
+        Args:
+            paper_id (str): arXiv paper ID
+        Returns:
+            bool: True if the paper has an ar5iv page, False otherwise
+
+        """
+        return self._check(paper_id)
+
+    def check_many(self, paper_ids: Iterable[str]) -> dict[str, bool | None]:
+        """Check the ar5iv pages of several papers concurrently.
+
+        Duplicate IDs are only checked once.
+
+        Args:
+            paper_ids (Iterable[str]): arXiv paper IDs
+        Returns:
+            dict mapping each paper ID to True if it has an ar5iv page, False if
+            it does not, and None if the check failed
+
+        """
+        unique_ids = list(dict.fromkeys(paper_ids))
+        logger.info(
+            f"Checking ar5iv pages of {len(unique_ids)} papers with {self.max_workers} workers"
+        )
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.check, paper_id): paper_id
+                for paper_id in unique_ids
+            }
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Checking ar5iv"
+            ):
+                paper_id = futures[future]
+                try:
+                    results[paper_id] = future.result()
+                except Exception as e:
+                    logger.warning(f"Could not check ar5iv page of {paper_id}: {e}")
+                    results[paper_id] = None
+        num_failed = sum(result is None for result in results.values())
+        logger.info(
+            f"Papers with ar5iv pages: {sum(result is True for result in results.values())} / {len(results)} ({num_failed} failed)"
+        )
+        return results
@@ -4,35 +4,160 @@ Example usage for local development:
 ```bash
 streamlit run arxiv-classifier-app.py
 ```
+
+The progress dashboard of the annotation campaign is at `?page=admin`, e.g.
+http://localhost:8501/?page=admin
+
+To run against a local SQLite file instead of Firestore (see `backend.py`):
+```bash
+ARXIV_ANNOTATOR_BACKEND=sqlite streamlit run arxiv-classifier-app.py
+```
 """
 
-import pandas as pd
 import streamlit as st
 import logging
+import importlib
+import os
 import random
-import firebase_admin
-from firebase_admin import credentials, firestore
-from firebase_admin.firestore import FieldFilter
-from utils import (
+import threading
+import time
+from functools import partial
+from backend import BACKEND_ENV, Backend, get_backend
+from decisions import (
     PrimaryDecision,
     SecondaryDecisionUponGoodOK,
     SecondaryDecisionUponBad,
 )
+from paper_store import PaperStore
+from roster import load_roster
+from schema import encode_result
+from cache import SharedCache
+from progress import (
+    completed_positions,
+    delete_with_progress,
+    queue_hash,
+    rebuild_progress,
+    submit_with_progress,
+)
+from write_queue import DELETE, SUBMIT, WriteBehindQueue
 
 MODERATOR_QUEUE_COLLECTION = "mod_queues_v5-all2023_v2-test-pos50-neg50-ar5iv-1001"
 PAPER_INFO_COLLECTION = "paper_info_v5-all2023_v2-test-pos50-neg50-ar5iv-1001"
 MODERATOR_RESULTS_COLLECTION = "mod_results-all2023_v2-test-pos50-neg50-ar5iv-1001"
+MODERATOR_PROGRESS_COLLECTION = "mod_progress-all2023_v2-test-pos50-neg50-ar5iv-1001"
+
+# CSV of moderators and their categories
+ROSTER_PATH = "data/mod_cats-2025-09-10.csv"
+
+# value of the `page` query parameter of the admin dashboard (?page=admin)
+ADMIN_PAGE = "admin"
+# seconds for which the dashboard status is shared by all admin sessions
+ADMIN_REFRESH_INTERVAL = 60
+# windows (in hours) over which the throughput is shown
+THROUGHPUT_WINDOWS = [1, 24]
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-if not firebase_admin._apps:
-    # Get the credentials from secrets.toml
-    cred = credentials.Certificate(dict(st.secrets["firebase"]))
-    firebase_admin.initialize_app(cred)
+@st.cache_resource
+def get_app_backend() -> Backend:
+    """Get the storage backend shared by all sessions, connecting on first use."""
+    if os.environ.get(BACKEND_ENV, "firestore") == "firestore":
+        # imported here since firebase_admin and grpc are slow to import
+        import firebase_admin
+        from firebase_admin import credentials
+
+        if not firebase_admin._apps:
+            # Get the credentials from secrets.toml
+            cred = credentials.Certificate(dict(st.secrets["firebase"]))
+            firebase_admin.initialize_app(cred)
+    return get_backend()
+
+
+@st.cache_resource
+def prefetch_backend_modules() -> None:
+    """Import the Firestore client in the background while the first page renders.
+
+    The backend is only needed once a moderator starts moderating, so the
+    slow import of firebase_admin and grpc does not delay the first page.
+    """
+    if os.environ.get(BACKEND_ENV, "firestore") == "firestore":
+        threading.Thread(
+            target=importlib.import_module,
+            args=("firebase_admin.firestore",),
+            daemon=True,
+        ).start()
 
-db = firestore.client()
+
+prefetch_backend_modules()
+
+
+@st.cache_resource
+def get_shared_cache() -> SharedCache:
+    """Get the cache of paper_info and mod_queues documents shared by all sessions."""
+    return SharedCache()
+
+
+shared_cache = get_shared_cache()
+
+
+@st.cache_resource
+def get_write_queue() -> WriteBehindQueue:
+    """Get the queue of moderation result writes shared by all sessions."""
+    return WriteBehindQueue()
+
+
+write_queue = get_write_queue()
+
+
+def format_mod_queue_id(mod_name: str, current_cat: str) -> str:
+    """Format the moderation queue document ID.
+
+    Args:
+        mod_name (str): name of the moderator
+        current_cat (str): category
+    Returns:
+        str: formatted moderation queue document ID
+
+    """
+    return f"{mod_name}:{current_cat.split(':')[0]}"
+
+
+def get_completed_paper_ids(
+    mod_name: str, current_cat: str, full_queue: list[str]
+) -> set[str]:
+    """Retrieve the IDs of the papers already annotated by the moderator for the category.
+
+    The IDs are read from the progress document of the queue, which is built
+    from a (projection) query of the MODERATOR_RESULTS_COLLECTION the first
+    time the queue is loaded.
+
+    Args:
+        mod_name (str): name of the moderator
+        current_cat (str): category
+        full_queue (list[str]): full list of papers
+    Returns:
+        set[str]: IDs of the annotated papers
+
+    """
+    progress_id = format_mod_queue_id(mod_name, current_cat)
+    progress = get_app_backend().get(MODERATOR_PROGRESS_COLLECTION, progress_id)
+    # the bitset is indexed by queue position, so it is rebuilt whenever the
+    # papers or their order changed, not only the size of the queue
+    if progress is None or progress.get("queue_hash") != queue_hash(full_queue):
+        progress = rebuild_progress(
+            get_app_backend(),
+            MODERATOR_RESULTS_COLLECTION,
+            MODERATOR_PROGRESS_COLLECTION,
+            progress_id,
+            mod_name,
+            current_cat,
+            full_queue,
+            # the queue was re-pushed since the progress document was created
+            overwrite=progress is not None,
+        )
+    return {full_queue[position] for position in completed_positions(progress)}
 
 
 def load_moderation_queue(
@@ -41,7 +166,7 @@ def load_moderation_queue(
     """Retrieve the list of unannotated papers for the specified category and moderator.
 
     1. Get the full list of papers from the MODERATOR_QUEUE_COLLECTION
-    2. Remove papers that are already in MODERATOR_RESULTS_COLLECTION
+    2. Remove papers that are already annotated according to MODERATOR_PROGRESS_COLLECTION
     3. Return the list of remaining papers
 
     NOTE: some moderators belong to multiple categories.
@@ -54,44 +179,29 @@ def load_moderation_queue(
         remaining_queue (list[str]): list of papers that have not been annotated
 
     """
-
-    def format_mod_queue_id(mod_name: str, current_cat: str) -> str:
-        """Format the moderation queue document ID.
-
-        Args:
-            mod_name (str): name of the moderator
-            current_cat (str): category
-        Returns:
-            str: formatted moderation queue document ID
-
-        """
-        return f"{mod_name}:{current_cat.split(':')[0]}"
-
     mod_queue_id = format_mod_queue_id(mod_name, current_cat)
     logger.info(f"Getting queue for {mod_queue_id=}")
-    doc = db.collection(MODERATOR_QUEUE_COLLECTION).document(mod_queue_id).get()
-    if doc.exists:
-        full_queue = doc.to_dict().get("queue", [])
+    is_cached, queue_doc = shared_cache.get(MODERATOR_QUEUE_COLLECTION, mod_queue_id)
+    if not is_cached:
+        queue_doc = get_app_backend().get(MODERATOR_QUEUE_COLLECTION, mod_queue_id)
+        shared_cache.set(MODERATOR_QUEUE_COLLECTION, mod_queue_id, queue_doc)
+    logger.info(f"Shared cache stats: {shared_cache.stats()}")
+    if queue_doc is not None:
+        # copy the cached queue since the remaining queue is shuffled in place
+        full_queue = list(queue_doc.get("queue", []))
         logger.info(f"Loaded queue with {len(full_queue)} papers")
-        # Query the MODERATOR_RESULTS_COLLECTION where "name" == mod_name and "category" == current_cat
-        results = (
-            db.collection(MODERATOR_RESULTS_COLLECTION)
-            .where(filter=FieldFilter("name", "==", mod_name))
-            .where(filter=FieldFilter("category", "==", current_cat))
-            .get()
-        )
-        if results:
-            results_ids = [result.to_dict().get("paper_id") for result in results]
+        completed_ids = get_completed_paper_ids(mod_name, current_cat, full_queue)
+        if completed_ids:
             logger.info(
-                f"Found {len(results_ids)} existing results for {mod_name=} and {current_cat=}"
+                f"Found {len(completed_ids)} existing results for {mod_name=} and {current_cat=}"
             )
             remaining_queue = [
-                paper_id for paper_id in full_queue if paper_id not in results_ids
+                paper_id for paper_id in full_queue if paper_id not in completed_ids
             ]
             logger.info(f"Returning queue with {len(remaining_queue)} remaining papers")
         else:
             logger.info(f"No existing results found for {mod_name=} and {current_cat=}")
-            remaining_queue = full_queue
+            remaining_queue = list(full_queue)
 
         # We shuffle the remaining_queue in place to randomize the order in which
         # papers are presented to the moderator. The random seed is set using a
@@ -109,19 +219,24 @@ def load_moderation_queue(
         return [], []
 
 
-def get_paper_info(paper_id: str) -> dict | None:
-    """Retrieve paper information from the paper_info collection.
+def get_paper_infos(paper_ids: list[str]) -> dict[str, dict | None]:
+    """Retrieve paper information for several papers with a single batched read.
 
     Args:
-        paper_id (str): arXiv paper ID
+        paper_ids (list[str]): list of arXiv paper IDs
     Returns:
-        dict of paper information if found, otherwise None
+        dict mapping each paper ID to its paper information if found, otherwise None
 
     """
-    doc = db.collection(PAPER_INFO_COLLECTION).document(paper_id).get()
-    if doc.exists:
-        return doc.to_dict()
-    return None
+    paper_infos = shared_cache.get_many(PAPER_INFO_COLLECTION, paper_ids)
+    missing = [paper_id for paper_id in paper_ids if paper_id not in paper_infos]
+    if missing:
+        for paper_id, paper_info in (
+            get_app_backend().get_many(PAPER_INFO_COLLECTION, missing).items()
+        ):
+            paper_infos[paper_id] = paper_info
+            shared_cache.set(PAPER_INFO_COLLECTION, paper_id, paper_info)
+    return paper_infos
 
 
 def format_mod_results_id(mod_name: str, current_cat: str, paper_id: str) -> str:
@@ -142,13 +257,24 @@ def delete_moderation_result(
     paper_id: str,
     current_cat: str,
     mod_name: str,
+    full_queue: list[str],
 ) -> None:
-    """Delete moderation result from the MODERATOR_RESULTS_COLLECTION collection on Firestore."""
+    """Delete moderation result from the MODERATOR_RESULTS_COLLECTION collection on Firestore.
+
+    The progress document of the queue is updated in the same transaction.
+    """
     logger.warning(
         f"Deleting moderation result for {paper_id=} with {current_cat=} under {mod_name=}"
     )
     doc_id = format_mod_results_id(mod_name, current_cat, paper_id)
-    db.collection(MODERATOR_RESULTS_COLLECTION).document(doc_id).delete()
+    delete_with_progress(
+        get_app_backend(),
+        MODERATOR_RESULTS_COLLECTION,
+        doc_id,
+        MODERATOR_PROGRESS_COLLECTION,
+        format_mod_queue_id(mod_name, current_cat),
+        full_queue.index(paper_id),
+    )
 
 
 def submit_moderation_result(
@@ -157,9 +283,12 @@ def submit_moderation_result(
     mod_name: str,
     decision_p: PrimaryDecision,
     decision_s: SecondaryDecisionUponGoodOK | SecondaryDecisionUponBad | None,
+    full_queue: list[str],
 ) -> None:
     """Submit moderation result to the MODERATOR_RESULTS_COLLECTION collection on Firestore.
 
+    The progress document of the queue is updated in the same transaction.
+
     Args:
         paper_id (str): arXiv paper ID
         current_cat (str): category
@@ -167,43 +296,177 @@ def submit_moderation_result(
         decision_p (PrimaryDecision): primary decision
         decision_s (SecondaryDecisionUponGoodOK | SecondaryDecisionUponBad | None): secondary decision
             None if the primary decision is Great Fit
+        full_queue (list[str]): full list of papers
 
     """
     logger.warning(
         f"Submitting moderation result for {paper_id=} with {current_cat=} under {mod_name=}"
     )
     # add result
-    mod_results_ref = db.collection(MODERATOR_RESULTS_COLLECTION).document(
-        document_id=format_mod_results_id(mod_name, current_cat, paper_id)
+    submit_with_progress(
+        get_app_backend(),
+        MODERATOR_RESULTS_COLLECTION,
+        format_mod_results_id(mod_name, current_cat, paper_id),
+        MODERATOR_PROGRESS_COLLECTION,
+        format_mod_queue_id(mod_name, current_cat),
+        encode_result(
+            mod_name, current_cat, paper_id, decision_p, decision_s, time.time()
+        ),
+        full_queue.index(paper_id),
+        len(full_queue),
+        queue_hash(full_queue),
+    )
+
+
+def show_write_status(mod_name: str) -> None:
+    """Show the moderator's pending and failed writes of moderation results."""
+    num_pending, num_failed = write_queue.status(mod_name)
+    if num_pending:
+        st.caption(f"Saving {num_pending} classification(s)...")
+    if num_failed:
+        st.error(f"{num_failed} classification(s) could not be saved.")
+        if st.button("Retry saving"):
+            write_queue.retry_failed(mod_name)
+            st.rerun()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_queue_sizes() -> dict[str, int]:
+    """Get the number of papers in each queue.
+
+    The queues do not change during an annotation campaign, so they are read
+    at most once an hour.
+
+    Returns:
+        dict mapping queue IDs to the number of papers in the queue
+
+    """
+    queues = get_app_backend().query(MODERATOR_QUEUE_COLLECTION)
+    return {queue_id: len(queue_doc.get("queue", [])) for queue_id, queue_doc in queues}
+
+
+@st.cache_data(ttl=ADMIN_REFRESH_INTERVAL, show_spinner=False)
+def load_campaign_status() -> dict:
+    """Read the progress of all queues and count the recent results.
+
+    Only the progress documents of the queues are read (see `progress.py`),
+    and the recent results are counted with aggregation queries, so the cost of
+    a refresh does not grow with the number of results.
+
+    Returns:
+        dict with the time of the status ("time"), the progress documents keyed
+        by queue ID ("progress") and the number of results submitted in each of
+        the THROUGHPUT_WINDOWS ("recent")
+
+    """
+    backend = get_app_backend()
+    now = time.time()
+    progress = dict(
+        backend.query(
+            MODERATOR_PROGRESS_COLLECTION,
+            fields=["num_completed", "queue_size", "counts"],
+        )
+    )
+    recent = {
+        hours: backend.count(
+            MODERATOR_RESULTS_COLLECTION, [("updated_at", ">=", now - hours * 3600)]
+        )
+        for hours in THROUGHPUT_WINDOWS
+    }
+    return {"time": now, "progress": progress, "recent": recent}
+
+
+@st.fragment(run_every=ADMIN_REFRESH_INTERVAL)
+def show_campaign_status(queue_sizes: dict[str, int]) -> None:
+    """Show the overall progress, the throughput and the progress of each queue.
+
+    Args:
+        queue_sizes (dict[str, int]): number of papers in each queue
+
+    """
+    status = load_campaign_status()
+    rows = []
+    for queue_id in sorted(queue_sizes.keys() | status["progress"].keys()):
+        progress = status["progress"].get(queue_id, {})
+        queue_size = queue_sizes.get(queue_id, progress.get("queue_size", 0))
+        num_completed = progress.get("num_completed", 0)
+        mod_name, category = queue_id.rsplit(":", 1)
+        rows.append(
+            {
+                "Moderator": mod_name,
+                "Category": category,
+                "Completed": num_completed,
+                "Queue size": queue_size,
+                "Progress": 100 * num_completed / queue_size if queue_size else 0.0,
+                **{
+                    decision.name: progress.get("counts", {}).get(decision.name, 0)
+                    for decision in PrimaryDecision
+                },
+            }
+        )
+    total_completed = sum(row["Completed"] for row in rows)
+    total_size = sum(row["Queue size"] for row in rows)
+    num_finished = sum(row["Completed"] >= row["Queue size"] > 0 for row in rows)
+
+    st.progress(total_completed / total_size if total_size else 0.0)
+    columns = st.columns(2 + len(THROUGHPUT_WINDOWS))
+    columns[0].metric("Papers completed", f"{total_completed} / {total_size}")
+    columns[1].metric("Queues finished", f"{num_finished} / {len(rows)}")
+    for column, hours in zip(columns[2:], THROUGHPUT_WINDOWS):
+        rate = status["recent"][hours] / hours
+        window = "last hour" if hours == 1 else f"last {hours} hours"
+        column.metric(f"Papers/hour ({window})", f"{rate:.1f}")
+    st.dataframe(
+        rows,
+        hide_index=True,
+        column_config={
+            "Progress": st.column_config.ProgressColumn(
+                "Progress", min_value=0, max_value=100, format="%.0f%%"
+            )
+        },
     )
-    mod_results_ref.set(
-        {
-            "name": mod_name,
-            "category": str(current_cat),
-            "paper_id": paper_id,
-            "primary_decision": decision_p.value,
-            "secondary_decision": decision_s.value if decision_s else None,
-        }
+    st.caption(
+        f"As of {time.strftime('%H:%M:%S', time.localtime(status['time']))}, "
+        f"refreshed every {ADMIN_REFRESH_INTERVAL} seconds"
     )
 
 
+def reload_pushed_collections() -> None:
+    """Drop the cached queues and paper info, e.g. after re-running a push script."""
+    num_entries = sum(
+        shared_cache.invalidate(collection)
+        for collection in [MODERATOR_QUEUE_COLLECTION, PAPER_INFO_COLLECTION]
+    )
+    load_queue_sizes.clear()
+    st.toast(f"Dropped {num_entries} cached documents")
+
+
+def show_admin_page() -> None:
+    """Show the progress dashboard of the annotation campaign."""
+    st.title("Moderation Progress")
+    st.button(
+        "Reload queues and paper info",
+        on_click=reload_pushed_collections,
+        help="Read the queues and paper info from the database again, "
+        "e.g. after re-running push_mod_queues.py or push_paper_info.py",
+    )
+    show_campaign_status(load_queue_sizes())
+
+
 def main() -> None:
     """Main function to run the Streamlit app."""
     st.title("ArXiv Paper Moderator")
-    mod_cats = pd.read_csv("data/mod_cats-2025-09-10.csv")
-    mod_cats["name"] = mod_cats["First name"] + " " + mod_cats["Last name"]
+    roster = load_roster(ROSTER_PATH)
 
     #
     # Step 1: Select moderation category
     #
     if "current_cat" not in st.session_state:
         st.header("Select Moderation Category")
-        current_cat = st.selectbox(
-            "Choose your category", mod_cats["Category"].unique().tolist()
-        )
+        current_cat = st.selectbox("Choose your category", roster.categories)
         _name = st.selectbox(
             'Select your name or "Other" then input your name below',
-            mod_cats[mod_cats["Category"] == current_cat]["name"].tolist() + ["Other"],
+            roster.moderators_by_category[current_cat] + ["Other"],
             placeholder="Johann Lee",
         )
         if _name == "Other":
@@ -212,11 +475,19 @@ def main() -> None:
         st.session_state.mod_name = _name if _name != "Other" else newName
 
         if st.button("Start Moderation"):
+            # make sure that results from a previous session are saved before
+            # computing the remaining papers
+            write_queue.flush(st.session_state.mod_name, timeout=30)
             st.session_state.current_cat = current_cat
             st.session_state.full_queue, st.session_state.remaining_queue = (
                 load_moderation_queue(st.session_state.mod_name, current_cat)
             )
             st.session_state.current_paper_idx = 0
+            # batch-fetch the first papers of the queue so that reruns only
+            # do in-memory lookups
+            st.session_state.paper_store = PaperStore(
+                st.session_state.remaining_queue, get_paper_infos
+            )
             st.rerun()
 
     #
@@ -238,7 +509,8 @@ def main() -> None:
 
         if current_paper_idx < len(remaining_queue):
             paper_id = remaining_queue[current_paper_idx]
-            if paper_info := get_paper_info(paper_id):
+            paper_store = st.session_state.paper_store
+            if paper_info := paper_store.get(current_paper_idx):
                 # NOTE: uncomment to reveal paper ID to moderator
                 logger.debug(f"Paper ID: {paper_id}")
                 st.write(f"**Title**: {paper_info['title']}")
@@ -334,12 +606,23 @@ def main() -> None:
                 with col1:
                     if st.button("Submit Classification"):
                         if is_valid_submission:
-                            submit_moderation_result(
-                                paper_id,
-                                current_cat,
+                            # save the result in the background so that the
+                            # next paper is shown right away
+                            write_queue.enqueue(
                                 st.session_state.mod_name,
-                                decision_p,
-                                decision_s,
+                                format_mod_results_id(
+                                    st.session_state.mod_name, current_cat, paper_id
+                                ),
+                                SUBMIT,
+                                partial(
+                                    submit_moderation_result,
+                                    paper_id,
+                                    current_cat,
+                                    st.session_state.mod_name,
+                                    decision_p,
+                                    decision_s,
+                                    full_queue,
+                                ),
                             )
                             st.session_state.current_paper_idx += 1
                             # remove radio buttons so that they are uninitialized for the next paper
@@ -354,10 +637,21 @@ def main() -> None:
                             # reverse the effects of the previous submission
                             previous_paper_idx = st.session_state.current_paper_idx - 1
                             paper_id_to_delete = remaining_queue[previous_paper_idx]
-                            delete_moderation_result(
-                                paper_id_to_delete,
-                                current_cat,
+                            write_queue.enqueue(
                                 st.session_state.mod_name,
+                                format_mod_results_id(
+                                    st.session_state.mod_name,
+                                    current_cat,
+                                    paper_id_to_delete,
+                                ),
+                                DELETE,
+                                partial(
+                                    delete_moderation_result,
+                                    paper_id_to_delete,
+                                    current_cat,
+                                    st.session_state.mod_name,
+                                    full_queue,
+                                ),
                             )
                             st.session_state.current_paper_idx -= 1
                             st.rerun()
@@ -371,6 +665,7 @@ def main() -> None:
                 st.write(
                     f"Currently finished moderating **{num_finished_papers}** papers out of a total of **{len(full_queue)}**"
                 )
+                show_write_status(st.session_state.mod_name)
 
             else:
                 st.error("Paper information not found.")
@@ -380,6 +675,7 @@ def main() -> None:
             # Step 3: Return to moderation category selection
             #
             st.success("You have completed all papers in this category!")
+            show_write_status(st.session_state.mod_name)
 
             if st.button("Moderate Another Category"):
                 del st.session_state.current_cat
@@ -387,4 +683,7 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    if st.query_params.get("page") == ADMIN_PAGE:
+        show_admin_page()
+    else:
+        main()
@@ -0,0 +1,169 @@
+"""Concurrent, rate-limited fetch of paper details from arXiv abstract pages.
+
+Only the title, authors and abstract are needed from a page, so the page is
+parsed with a `SoupStrainer` that keeps just these three elements (with the
+lxml parser if it is installed), instead of building the tree of the whole page.
+
+Example usage:
+```python
+fetcher = ArxivFetcher(max_workers=4, rate=4)
+details = fetcher.fetch_many(["2309.04535", "2309.01443"])
+```
+"""
+
+import logging
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bs4 import BeautifulSoup, SoupStrainer
+from tenacity import retry, stop_after_attempt, wait_exponential
+from tqdm import tqdm
+from http_utils import TIMEOUT, TokenBucket, make_session
+
+logger = logging.getLogger(__name__)
+
+ARXIV_ABS_URL = "https://export.arxiv.org/abs"
+# (tag, class, prefix) of the elements holding the details on the abstract page
+DETAILS_ELEMENTS = {
+    "title": ("h1", "title mathjax", "Title:"),
+    "authors": ("div", "authors", "Authors:"),
+    "abstract": ("blockquote", "abstract mathjax", "Abstract:"),
+}
+DETAILS_STRAINER = SoupStrainer(
+    [tag for tag, _, _ in DETAILS_ELEMENTS.values()],
+    class_=[cls for _, cls, _ in DETAILS_ELEMENTS.values()],
+)
+
+
+def _get_parser() -> str:
+    """Get the fastest installed parser of BeautifulSoup."""
+    try:
+        import lxml  # noqa: F401
+
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+PARSER = _get_parser()
+
+
+def parse_abs_page(
+    html: str, strainer: SoupStrainer | None = DETAILS_STRAINER, parser: str = PARSER
+) -> dict:
+    """Extract the details of a paper from its arXiv abstract page.
+
+    Args:
+        html (str): HTML of the abstract page
+        strainer (SoupStrainer | None): elements to parse, or None to parse the
+            whole page
+        parser (str): parser of BeautifulSoup
+    Returns:
+        dict: title, authors and abstract, None if not found on the page
+
+    """
+    soup = BeautifulSoup(html, parser, parse_only=strainer)
+    details = {}
+    for field, (tag, cls, prefix) in DETAILS_ELEMENTS.items():
+        element = soup.find(tag, class_=cls)
+        details[field] = (
+            element.get_text(strip=True).replace(prefix, "") if element else None
+        )
+    return details
+
+
+class ArxivFetcher:
+    """Fetch arXiv abstract pages with a thread pool sharing one connection pool.
+
+    Args:
+        base_url (str): URL under which the abstract pages are served
+        max_workers (int): number of concurrent requests
+        rate (float): maximum number of requests per second
+        max_attempts (int): number of attempts per paper before giving up
+        min_wait (float): minimum number of seconds to wait before retrying
+        timeout (float | tuple[float, float]): connect and read timeouts of a
+            request in seconds
+
+    """
+
+    def __init__(
+        self,
+        base_url: str = ARXIV_ABS_URL,
+        max_workers: int = 4,
+        rate: float = 4.0,
+        max_attempts: int = 3,
+        min_wait: float = 4,
+        timeout: float | tuple[float, float] = TIMEOUT,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = make_session(max_workers)
+        self.bucket = TokenBucket(rate)
+        self._fetch = retry(
+            stop=stop_after_attempt(max_attempts),
+            wait=wait_exponential(multiplier=1, min=min_wait, max=15),
+            reraise=True,
+        )(self._fetch_once)
+
+    def _fetch_once(self, paper_id: str) -> str:
+        self.bucket.acquire()
+        response = self.session.get(f"{self.base_url}/{paper_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def fetch_page(self, paper_id: str) -> str:
+        """Fetch the HTML of the abstract page of a paper.
+
+        Args:
+            paper_id (str): arXiv paper ID
+        Returns:
+            str: HTML of the page
+
+        """
+        return self._fetch(paper_id)
+
+    def fetch(self, paper_id: str) -> dict:
+        """Fetch the details of a paper.
+
+        Args:
+            paper_id (str): arXiv paper ID
+        Returns:
+            dict: title, authors and abstract, None if not found on the page
+
+        """
+        return parse_abs_page(self.fetch_page(paper_id))
+
+    def fetch_many(self, paper_ids: Iterable[str]) -> dict[str, dict | None]:
+        """Fetch the details of several papers concurrently.
+
+        Duplicate IDs are only fetched once.
+
+        Args:
+            paper_ids (Iterable[str]): arXiv paper IDs
+        Returns:
+            dict mapping each paper ID to its details (see `fetch`), or None if
+            the page could not be fetched
+
+        """
+        unique_ids = list(dict.fromkeys(paper_ids))
+        logger.info(
+            f"Fetching abstract pages of {len(unique_ids)} papers with {self.max_workers} workers"
+        )
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.fetch, paper_id): paper_id
+                for paper_id in unique_ids
+            }
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Fetching arXiv"
+            ):
+                paper_id = futures[future]
+                try:
+                    results[paper_id] = future.result()
+                except Exception as e:
+                    logger.warning(f"Could not fetch abstract page of {paper_id}: {e}")
+                    results[paper_id] = None
+        num_failed = sum(result is None for result in results.values())
+        logger.info(f"Fetched {len(results) - num_failed} / {len(results)} papers")
+        return results
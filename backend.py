@@ -0,0 +1,652 @@
+"""Storage backends for the app and the push scripts.
+
+The code only relies on the small set of document operations defined by
+`Backend`, which is implemented on top of Firestore (`FirestoreBackend`) and
+on top of a local SQLite file (`SQLiteBackend`). The local backend needs no
+credentials or network, which makes it suitable for offline development and
+for deterministic benchmarks.
+
+The backend is selected with the ARXIV_ANNOTATOR_BACKEND environment variable
+(`firestore` or `sqlite`, default: `firestore`) and the SQLite file with
+ARXIV_ANNOTATOR_SQLITE_PATH (default: `local.db`).
+
+Example usage:
+```bash
+ARXIV_ANNOTATOR_BACKEND=sqlite python push_mod_queues.py -dp data/mod-queue-all2023_v2-test-pos10-neg10.json
+ARXIV_ANNOTATOR_BACKEND=sqlite streamlit run arxiv-classifier-app.py
+```
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ENV = "ARXIV_ANNOTATOR_BACKEND"
+SQLITE_PATH_ENV = "ARXIV_ANNOTATOR_SQLITE_PATH"
+BACKENDS = ["firestore", "sqlite"]
+
+# (collection, document ID, data); data is None to delete the document
+Write = tuple[str, str, dict | None]
+# (field, operator, value), e.g. ("name", "==", "Jim Cline")
+Filter = tuple[str, str, Any]
+# pseudo-field to filter and order by document ID
+DOC_ID = "__name__"
+
+T = TypeVar("T")
+
+
+class Transaction(ABC):
+    """Reads and writes executed atomically by `Backend.transaction`.
+
+    All reads must happen before the first write.
+    """
+
+    @abstractmethod
+    def get(self, collection: str, doc_id: str) -> dict | None:
+        """Read a document, or return None if it does not exist."""
+
+    @abstractmethod
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        """Write a document, replacing any existing data."""
+
+    @abstractmethod
+    def delete(self, collection: str, doc_id: str) -> None:
+        """Delete a document."""
+
+
+class Backend(ABC):
+    """Document operations used by the app and the push scripts."""
+
+    @abstractmethod
+    def get(self, collection: str, doc_id: str) -> dict | None:
+        """Read a document.
+
+        Args:
+            collection (str): collection name
+            doc_id (str): document ID
+        Returns:
+            dict of the document data if found, otherwise None
+
+        """
+
+    @abstractmethod
+    def get_many(self, collection: str, doc_ids: list[str]) -> dict[str, dict | None]:
+        """Read several documents with a single batched read.
+
+        Args:
+            collection (str): collection name
+            doc_ids (list[str]): document IDs
+        Returns:
+            dict mapping each document ID to its data if found, otherwise None
+
+        """
+
+    @abstractmethod
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        """Write a document, replacing any existing data."""
+
+    @abstractmethod
+    def create(self, collection: str, doc_id: str, data: dict) -> bool:
+        """Write a document only if it does not exist yet.
+
+        Returns:
+            bool: True if the document was created, False if it already existed
+
+        """
+
+    @abstractmethod
+    def delete(self, collection: str, doc_id: str) -> None:
+        """Delete a document."""
+
+    @abstractmethod
+    def query(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        fields: list[str] | None = None,
+    ) -> list[tuple[str, dict]]:
+        """Find the documents of a collection matching all filters.
+
+        Args:
+            collection (str): collection name
+            filters (Iterable[Filter]): (field, operator, value) filters, where
+                operator is one of ==, !=, <, <=, >, >= and in; the field DOC_ID
+                filters by document ID
+            fields (list[str] | None): fields to return (projection), or None
+                to return all fields
+        Returns:
+            list of (document ID, data) tuples
+
+        """
+
+    @abstractmethod
+    def count(self, collection: str, filters: Iterable[Filter] = ()) -> int:
+        """Count the documents of a collection matching all filters.
+
+        The documents are counted by the storage backend without reading them,
+        so counting is much cheaper than a query.
+
+        Args:
+            collection (str): collection name
+            filters (Iterable[Filter]): filters as in `query`
+        Returns:
+            int: number of matching documents
+
+        """
+
+    @abstractmethod
+    def query_page(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        fields: list[str] | None = None,
+        order_by: str = DOC_ID,
+        start_after: tuple[str, dict] | None = None,
+        limit: int = 1000,
+    ) -> list[tuple[str, dict]]:
+        """Read one page of a query ordered by a field and then by document ID.
+
+        Pages are read with a cursor on the last document of the previous page,
+        so reading a page does not get slower with the number of previous pages.
+
+        Args:
+            collection (str): collection name
+            filters (Iterable[Filter]): filters as in `query`
+            fields (list[str] | None): fields to return (projection), or None
+                to return all fields; `order_by` is always returned
+            order_by (str): field to order by, or DOC_ID to order by document ID
+                only; documents without the field are not returned
+            start_after (tuple[str, dict] | None): last (document ID, data) tuple
+                of the previous page, or None for the first page
+            limit (int): maximum number of documents in the page
+        Returns:
+            list of (document ID, data) tuples
+
+        """
+
+    @abstractmethod
+    def partition(self, collection: str, num_partitions: int) -> list[str]:
+        """Split a collection into ranges of document IDs of similar size.
+
+        The ranges can be read in parallel with `query_page` and filters on
+        DOC_ID.
+
+        Args:
+            collection (str): collection name
+            num_partitions (int): desired number of ranges
+        Returns:
+            sorted list of at most `num_partitions - 1` document IDs, where each
+            ID starts a new range
+
+        """
+
+    @abstractmethod
+    def commit_batch(self, writes: list[Write]) -> None:
+        """Apply several writes atomically.
+
+        Args:
+            writes (list[Write]): (collection, document ID, data) tuples; data
+                is None to delete the document
+
+        """
+
+    @abstractmethod
+    def transaction(self, fn: Callable[[Transaction], T]) -> T:
+        """Run `fn` in a transaction, retrying it if there are conflicts.
+
+        Args:
+            fn (Callable): function receiving a `Transaction`
+        Returns:
+            the return value of `fn`
+
+        """
+
+
+#
+# Firestore
+#
+class _FirestoreTransaction(Transaction):
+    def __init__(self, client: Any, transaction: Any) -> None:
+        self.client = client
+        self.transaction = transaction
+
+    def get(self, collection: str, doc_id: str) -> dict | None:
+        doc = (
+            self.client.collection(collection)
+            .document(doc_id)
+            .get(transaction=self.transaction)
+        )
+        return doc.to_dict() if doc.exists else None
+
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        self.transaction.set(self.client.collection(collection).document(doc_id), data)
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        self.transaction.delete(self.client.collection(collection).document(doc_id))
+
+
+class FirestoreBackend(Backend):
+    """Backend storing documents in Firestore.
+
+    Args:
+        client (firestore.Client): Firestore client
+
+    """
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+
+    def get(self, collection: str, doc_id: str) -> dict | None:
+        """Read a document."""
+        doc = self.client.collection(collection).document(doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_many(self, collection: str, doc_ids: list[str]) -> dict[str, dict | None]:
+        """Read several documents with a single `get_all` call."""
+        refs = [self.client.collection(collection).document(i) for i in doc_ids]
+        return {
+            doc.id: doc.to_dict() if doc.exists else None
+            for doc in self.client.get_all(refs)
+        }
+
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        """Write a document, replacing any existing data."""
+        self.client.collection(collection).document(doc_id).set(data)
+
+    def create(self, collection: str, doc_id: str, data: dict) -> bool:
+        """Write a document only if it does not exist yet."""
+        from google.api_core.exceptions import Conflict
+
+        try:
+            self.client.collection(collection).document(doc_id).create(data)
+        except Conflict:
+            return False
+        return True
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        """Delete a document."""
+        self.client.collection(collection).document(doc_id).delete()
+
+    def query(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        fields: list[str] | None = None,
+    ) -> list[tuple[str, dict]]:
+        """Find the documents of a collection matching all filters."""
+        query = self._where(collection, filters)
+        if fields is not None:
+            query = query.select(fields)
+        return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+    def _where(self, collection: str, filters: Iterable[Filter]) -> Any:
+        """Build a query of a collection with filters."""
+        from firebase_admin.firestore import FieldFilter
+
+        collection_ref = self.client.collection(collection)
+        query = collection_ref
+        for field, op, value in filters:
+            if field == DOC_ID:
+                # document IDs are compared as document references
+                value = (
+                    [collection_ref.document(v) for v in value]
+                    if op == "in"
+                    else collection_ref.document(value)
+                )
+            query = query.where(filter=FieldFilter(field, op, value))
+        return query
+
+    def count(self, collection: str, filters: Iterable[Filter] = ()) -> int:
+        """Count the documents matching all filters with an aggregation query."""
+        # billed as one read per 1000 counted index entries
+        (result,) = self._where(collection, filters).count().get()
+        return int(result[0].value)
+
+    def query_page(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        fields: list[str] | None = None,
+        order_by: str = DOC_ID,
+        start_after: tuple[str, dict] | None = None,
+        limit: int = 1000,
+    ) -> list[tuple[str, dict]]:
+        """Read one page of a query ordered by a field and then by document ID."""
+        query = self._where(collection, filters)
+        if order_by != DOC_ID:
+            query = query.order_by(order_by)
+        query = query.order_by(DOC_ID)
+        if fields is not None:
+            query = query.select([f for f in {*fields, order_by} if f != DOC_ID])
+        if start_after is not None:
+            doc_id, data = start_after
+            cursor = {DOC_ID: doc_id}
+            if order_by != DOC_ID:
+                cursor[order_by] = data[order_by]
+            query = query.start_after(cursor)
+        return [(doc.id, doc.to_dict()) for doc in query.limit(limit).stream()]
+
+    def partition(self, collection: str, num_partitions: int) -> list[str]:
+        """Split a collection with a partition query of its collection group."""
+        if num_partitions <= 1:
+            return []
+        partitions = self.client.collection_group(collection).get_partitions(
+            num_partitions - 1
+        )
+        return sorted(p.end_at.id for p in partitions if p.end_at is not None)
+
+    def commit_batch(self, writes: list[Write]) -> None:
+        """Apply several writes atomically with a write batch."""
+        batch = self.client.batch()
+        for collection, doc_id, data in writes:
+            doc_ref = self.client.collection(collection).document(doc_id)
+            if data is None:
+                batch.delete(doc_ref)
+            else:
+                batch.set(doc_ref, data)
+        batch.commit()
+
+    def transaction(self, fn: Callable[[Transaction], T]) -> T:
+        """Run `fn` in a Firestore transaction, retrying it if there are conflicts."""
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def run(transaction: Any) -> T:
+            return fn(_FirestoreTransaction(self.client, transaction))
+
+        return run(self.client.transaction())
+
+
+#
+# SQLite
+#
+def _encode(data: dict) -> str:
+    """Serialize a document to JSON, encoding bytes values as base64."""
+
+    def default(value: Any) -> Any:
+        if isinstance(value, bytes):
+            return {"__bytes__": base64.b64encode(value).decode()}
+        raise TypeError(f"Cannot store value of type {type(value)}")
+
+    return json.dumps(data, default=default)
+
+
+def _decode(text: str) -> dict:
+    """Deserialize a document encoded with `_encode`."""
+
+    def object_hook(obj: dict) -> Any:
+        if len(obj) == 1 and "__bytes__" in obj:
+            return base64.b64decode(obj["__bytes__"])
+        return obj
+
+    return json.loads(text, object_hook=object_hook)
+
+
+_SQL_OPERATORS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+def _column(field: str) -> str:
+    """Get the SQL expression of a field of the documents."""
+    if field == DOC_ID:
+        return "doc_id"
+    return f"json_extract(data, '$.\"{field}\"')"
+
+
+class _SQLiteTransaction(Transaction):
+    def __init__(self, backend: "SQLiteBackend") -> None:
+        self.backend = backend
+
+    def get(self, collection: str, doc_id: str) -> dict | None:
+        return self.backend.get(collection, doc_id)
+
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        self.backend._write(collection, doc_id, data)
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        self.backend._write(collection, doc_id, None)
+
+
+class SQLiteBackend(Backend):
+    """Backend storing documents as JSON in a local SQLite file.
+
+    All operations of the process are serialized on one connection, and
+    transactions hold the database lock for their whole duration.
+
+    Args:
+        path (str): path to the SQLite file (":memory:" for an in-memory database)
+
+    """
+
+    # Maximum number of parameters in a single SQL statement
+    MAX_PARAMS = 500
+
+    def __init__(self, path: str = "local.db") -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "collection TEXT NOT NULL, doc_id TEXT NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (collection, doc_id))"
+            )
+
+    def _write(self, collection: str, doc_id: str, data: dict | None) -> None:
+        """Write or delete a document. The lock must be held by the caller."""
+        if data is None:
+            self._conn.execute(
+                "DELETE FROM documents WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            )
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                (collection, doc_id, _encode(data)),
+            )
+
+    def get(self, collection: str, doc_id: str) -> dict | None:
+        """Read a document."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            ).fetchone()
+        return _decode(row[0]) if row else None
+
+    def get_many(self, collection: str, doc_ids: list[str]) -> dict[str, dict | None]:
+        """Read several documents with a single batched read."""
+        found = dict.fromkeys(doc_ids)
+        for i in range(0, len(doc_ids), self.MAX_PARAMS):
+            chunk = doc_ids[i : i + self.MAX_PARAMS]
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT doc_id, data FROM documents WHERE collection = ? "
+                    f"AND doc_id IN ({', '.join('?' * len(chunk))})",
+                    (collection, *chunk),
+                ).fetchall()
+            for doc_id, data in rows:
+                found[doc_id] = _decode(data)
+        return found
+
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        """Write a document, replacing any existing data."""
+        with self._lock:
+            self._write(collection, doc_id, data)
+
+    def create(self, collection: str, doc_id: str, data: dict) -> bool:
+        """Write a document only if it does not exist yet."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO documents VALUES (?, ?, ?)",
+                (collection, doc_id, _encode(data)),
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        """Delete a document."""
+        with self._lock:
+            self._write(collection, doc_id, None)
+
+    def query(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        fields: list[str] | None = None,
+    ) -> list[tuple[str, dict]]:
+        """Find the documents of a collection matching all filters, ordered by ID."""
+        where, params = self._where(collection, filters)
+        return self._select(f"{where} ORDER BY doc_id", params, fields)
+
+    def _where(
+        self, collection: str, filters: Iterable[Filter]
+    ) -> tuple[str, list[Any]]:
+        """Build the WHERE clause selecting the documents matching all filters."""
+        sql = "WHERE collection = ?"
+        params: list[Any] = [collection]
+        for field, op, value in filters:
+            column = _column(field)
+            if op == "in":
+                sql += f" AND {column} IN ({', '.join('?' * len(value))})"
+                params.extend(value)
+            elif op in _SQL_OPERATORS:
+                sql += f" AND {column} {_SQL_OPERATORS[op]} ?"
+                params.append(value)
+            else:
+                raise ValueError(f"Unsupported operator: {op}")
+        return sql, params
+
+    def _select(
+        self, clauses: str, params: list[Any], fields: list[str] | None
+    ) -> list[tuple[str, dict]]:
+        """Select documents and project them onto `fields`."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_id, data FROM documents {clauses}", params
+            ).fetchall()
+        results = []
+        for doc_id, data in rows:
+            data = _decode(data)
+            if fields is not None:
+                data = {field: data[field] for field in fields if field in data}
+            results.append((doc_id, data))
+        return results
+
+    def count(self, collection: str, filters: Iterable[Filter] = ()) -> int:
+        """Count the documents matching all filters."""
+        where, params = self._where(collection, filters)
+        with self._lock:
+            (count,) = self._conn.execute(
+                f"SELECT COUNT(*) FROM documents {where}", params
+            ).fetchone()
+        return count
+
+    def query_page(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        fields: list[str] | None = None,
+        order_by: str = DOC_ID,
+        start_after: tuple[str, dict] | None = None,
+        limit: int = 1000,
+    ) -> list[tuple[str, dict]]:
+        """Read one page of a query ordered by a field and then by document ID."""
+        where, params = self._where(collection, filters)
+        column = _column(order_by)
+        if order_by != DOC_ID:
+            where += f" AND {column} IS NOT NULL"
+        if start_after is not None:
+            doc_id, data = start_after
+            if order_by == DOC_ID:
+                where += " AND doc_id > ?"
+                params.append(doc_id)
+            else:
+                where += f" AND ({column} > ? OR ({column} = ? AND doc_id > ?))"
+                params.extend([data[order_by], data[order_by], doc_id])
+        if fields is not None and order_by != DOC_ID:
+            fields = [*fields, order_by]
+        return self._select(
+            f"{where} ORDER BY {column}, doc_id LIMIT ?", [*params, limit], fields
+        )
+
+    def partition(self, collection: str, num_partitions: int) -> list[str]:
+        """Split a collection at evenly spaced ranks of the document IDs."""
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE collection = ?", (collection,)
+            ).fetchone()
+            split_points = set()
+            for i in range(1, num_partitions):
+                offset = i * count // num_partitions
+                if offset == 0:
+                    continue
+                (doc_id,) = self._conn.execute(
+                    "SELECT doc_id FROM documents WHERE collection = ? "
+                    "ORDER BY doc_id LIMIT 1 OFFSET ?",
+                    (collection, offset),
+                ).fetchone()
+                split_points.add(doc_id)
+        return sorted(split_points)
+
+    def commit_batch(self, writes: list[Write]) -> None:
+        """Apply several writes atomically."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for collection, doc_id, data in writes:
+                    self._write(collection, doc_id, data)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def transaction(self, fn: Callable[[Transaction], T]) -> T:
+        """Run `fn` while holding the database lock."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(_SQLiteTransaction(self))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return result
+
+
+def get_backend(kind: str | None = None, sqlite_path: str | None = None) -> Backend:
+    """Get the configured storage backend.
+
+    For the Firestore backend, the Firebase app is initialized with the
+    credentials from `utils.get_firestore` unless it is already initialized
+    (as done by the Streamlit app with its secrets).
+
+    Args:
+        kind (str | None): `firestore` or `sqlite`; defaults to the value of
+            the ARXIV_ANNOTATOR_BACKEND environment variable, or `firestore`
+        sqlite_path (str | None): path to the SQLite file; defaults to the value
+            of the ARXIV_ANNOTATOR_SQLITE_PATH environment variable, or `local.db`
+    Returns:
+        Backend: storage backend
+
+    """
+    kind = kind or os.environ.get(BACKEND_ENV, "firestore")
+    if kind == "firestore":
+        from utils import get_firestore
+
+        return FirestoreBackend(get_firestore())
+    if kind == "sqlite":
+        sqlite_path = sqlite_path or os.environ.get(SQLITE_PATH_ENV, "local.db")
+        logger.info(f"Using local SQLite backend at {sqlite_path}")
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"Unknown backend {kind!r}, expected one of {BACKENDS}")
@@ -0,0 +1,223 @@
+"""Chunked, concurrent and resumable batch writes to a storage backend.
+
+A Firestore write batch holds at most 500 writes and fails as a whole, so large
+pushes are split into chunks that are committed concurrently and retried
+individually. Chunks are built lazily from the writes, so the next chunk is
+prepared while previous ones are in flight. When Firestore answers with
+RESOURCE_EXHAUSTED, all commits back off together and speed up again as
+commits succeed. Committed chunks are recorded in a checkpoint file, so that a
+failed push can be restarted without re-committing them.
+
+NOTE: google-api-core is not imported by this module, so that pushes to the
+SQLite backend work without the Google libraries installed.
+
+Example usage:
+```python
+writer = ChunkedBatchWriter(backend, chunk_size=250, max_in_flight=4, checkpoint_path="checkpoint.json")
+writer.commit([(collection, doc_id, data), ...])
+```
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from backend import Backend, Write
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of writes in a Firestore batch
+MAX_BATCH_SIZE = 500
+# Bounds of the delay between commits after RESOURCE_EXHAUSTED errors
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+
+def is_resource_exhausted(error: Exception) -> bool:
+    """Check whether a commit failed with RESOURCE_EXHAUSTED.
+
+    Such an error can only be raised if google-api-core has been imported (by
+    the Firestore client), so the check does not import it.
+
+    Args:
+        error (Exception): error raised by the commit
+    Returns:
+        bool: True if the error is a `ResourceExhausted`
+
+    """
+    exceptions = sys.modules.get("google.api_core.exceptions")
+    return exceptions is not None and isinstance(error, exceptions.ResourceExhausted)
+
+
+def hash_chunk(chunk: list[Write]) -> str:
+    """Compute a fingerprint of a chunk of writes.
+
+    Args:
+        chunk (list[Write]): writes in the chunk
+    Returns:
+        str: hex digest identifying the content of the chunk
+
+    """
+    h = hashlib.sha1()
+    for write in chunk:
+        h.update(json.dumps(write, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class ChunkedBatchWriter:
+    """Commit writes in chunks with several commits in flight.
+
+    Args:
+        backend (Backend): storage backend
+        chunk_size (int): number of writes per batch (at most 500)
+        max_in_flight (int): maximum number of concurrent commits
+        max_attempts (int): number of attempts per chunk before giving up
+        checkpoint_path (str | None): path to the checkpoint file, or None to
+            disable checkpointing
+
+    """
+
+    def __init__(
+        self,
+        backend: Backend,
+        chunk_size: int = 250,
+        max_in_flight: int = 4,
+        max_attempts: int = 5,
+        checkpoint_path: str | None = None,
+    ) -> None:
+        if not 0 < chunk_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"chunk_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.checkpoint_path = checkpoint_path
+        self._lock = threading.Lock()
+        # shared backoff after RESOURCE_EXHAUSTED errors
+        self._backoff = 0.0
+        self._throttle_until = 0.0
+        # throughput metrics of the last call to commit()
+        self.num_writes = 0
+        self.elapsed = 0.0
+        # chunk index -> fingerprint of the committed chunk
+        self.committed: dict[str, str] = {}
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r") as f:
+                self.committed = json.load(f)
+            logger.info(
+                f"Loaded {len(self.committed)} committed chunks from {checkpoint_path}"
+            )
+
+    def _save_checkpoint(self) -> None:
+        """Atomically write the checkpoint file. The lock must be held by the caller."""
+        if self.checkpoint_path is None:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.committed, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _throttle(self) -> None:
+        """Wait until the shared backoff after RESOURCE_EXHAUSTED errors has passed."""
+        with self._lock:
+            wait = self._throttle_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _on_resource_exhausted(self) -> None:
+        """Double the shared backoff and delay all subsequent commits."""
+        with self._lock:
+            self._backoff = min(MAX_BACKOFF, max(MIN_BACKOFF, 2 * self._backoff))
+            self._throttle_until = time.monotonic() + self._backoff
+            logger.warning(f"Resource exhausted, backing off for {self._backoff}s")
+
+    def _on_success(self) -> None:
+        """Halve the shared backoff."""
+        with self._lock:
+            self._backoff = self._backoff / 2 if self._backoff > MIN_BACKOFF else 0.0
+
+    def _commit_chunk(self, idx: int, chunk: list[Write], fingerprint: str) -> None:
+        """Commit a chunk, retrying with exponential backoff."""
+        delay = 1.0
+        for attempt in range(1, self.max_attempts + 1):
+            self._throttle()
+            try:
+                self.backend.commit_batch(chunk)
+                self._on_success()
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    raise
+                if is_resource_exhausted(e):
+                    self._on_resource_exhausted()
+                    continue
+                logger.warning(
+                    f"Committing chunk {idx} failed (attempt {attempt}), retrying in {delay}s: {e}"
+                )
+                time.sleep(delay)
+                delay *= 2
+        with self._lock:
+            self.committed[str(idx)] = fingerprint
+            self._save_checkpoint()
+            self.num_writes += len(chunk)
+
+    def commit(self, writes: Iterable[Write]) -> int:
+        """Commit all writes, skipping chunks recorded in the checkpoint.
+
+        The checkpoint file is removed once all chunks have been committed.
+
+        Args:
+            writes (Iterable[Write]): (collection, document ID, data) tuples, in
+                the same order on every run so that chunks can be resumed
+        Returns:
+            int: number of committed chunks
+
+        """
+        start = time.monotonic()
+        self.num_writes = 0
+        logger.info(
+            f"Committing writes in chunks of {self.chunk_size} "
+            f"with up to {self.max_in_flight} commits in flight"
+        )
+        writes = iter(writes)
+        # bound the number of chunks that are built but not yet committed, so
+        # that the next chunk is built while the previous ones are in flight
+        slots = threading.Semaphore(self.max_in_flight)
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            idx = 0
+            while chunk := list(islice(writes, self.chunk_size)):
+                fingerprint = hash_chunk(chunk)
+                if self.committed.get(str(idx)) == fingerprint:
+                    logger.info(f"Skipping chunk {idx} committed in a previous run")
+                else:
+                    slots.acquire()
+                    future = executor.submit(
+                        self._commit_chunk, idx, chunk, fingerprint
+                    )
+                    future.add_done_callback(lambda _: slots.release())
+                    futures.append(future)
+                idx += 1
+        self.elapsed = time.monotonic() - start
+        logger.info(
+            f"Committed {self.num_writes} writes in {self.elapsed:.1f}s "
+            f"({self.throughput:.1f} docs/s)"
+        )
+        # re-raise the first error, if any
+        for future in futures:
+            future.result()
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.committed = {}
+        return len(futures)
+
+    @property
+    def throughput(self) -> float:
+        """Number of documents written per second in the last call to commit()."""
+        return self.num_writes / self.elapsed if self.elapsed > 0 else 0.0
@@ -0,0 +1,93 @@
+"""Benchmark the parsing of saved arXiv abstract pages.
+
+Each saved page is parsed with the full `html.parser` parse of the whole page
+(how `utils.get_arxiv_details_from_id` used to parse pages) and with the
+restricted parse of `arxiv_fetcher.parse_abs_page`. The script checks that
+both extract the same details and reports the time per page.
+
+Pages are saved as `<paper_id>.html` in --fixtures_dir, e.g. with --download
+(which needs network access).
+
+Example usage:
+```bash
+python benchmark_arxiv_parser.py --download 2309.04535 2309.01443 2310.08633
+python benchmark_arxiv_parser.py --repeats 20
+```
+"""
+
+import glob
+import os
+import statistics
+import time
+from argparse import ArgumentParser
+from arxiv_fetcher import PARSER, ArxivFetcher, parse_abs_page
+
+parser = ArgumentParser()
+parser.add_argument(
+    "--fixtures_dir",
+    type=str,
+    default="fixtures/arxiv-abs",
+    help="Directory of the saved abstract pages",
+)
+parser.add_argument(
+    "--download",
+    nargs="+",
+    default=None,
+    help="arXiv paper IDs whose abstract pages are saved to --fixtures_dir first",
+)
+parser.add_argument(
+    "--repeats", type=int, default=10, help="Number of parses of each page"
+)
+
+
+def time_parse(pages: list[str], strainer: bool, repeats: int) -> float:
+    """Get the median time to parse all pages, in milliseconds per page."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for html in pages:
+            if strainer:
+                parse_abs_page(html)
+            else:
+                parse_full_page(html)
+        times.append((time.perf_counter() - start) / len(pages))
+    return 1000 * statistics.median(times)
+
+
+def parse_full_page(html: str) -> dict:
+    """Parse the whole page with `html.parser`, as a baseline."""
+    return parse_abs_page(html, strainer=None, parser="html.parser")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.download:
+        os.makedirs(args.fixtures_dir, exist_ok=True)
+        fetcher = ArxivFetcher(max_workers=1)
+        for paper_id in args.download:
+            path = os.path.join(args.fixtures_dir, f"{paper_id}.html")
+            with open(path, "w") as f:
+                f.write(fetcher.fetch_page(paper_id))
+            print(f"Saved {path}")
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures_dir, "*.html")))
+    if not paths:
+        raise SystemExit(f"No pages in {args.fixtures_dir}, use --download first")
+    pages = []
+    for path in paths:
+        with open(path, "r") as f:
+            pages.append(f.read())
+
+    for path, html in zip(paths, pages):
+        if parse_abs_page(html) != parse_full_page(html):
+            raise SystemExit(f"The parsers disagree on {path}")
+    full = time_parse(pages, strainer=False, repeats=args.repeats)
+    strained = time_parse(pages, strainer=True, repeats=args.repeats)
+    print(
+        f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1000:.0f} kB per page"
+    )
+    print(f"full parse (html.parser):     {full:.2f} ms/page")
+    print(
+        f"restricted parse ({PARSER}): {strained:.2f} ms/page ({full / strained:.1f}x faster)"
+    )
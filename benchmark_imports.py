@@ -0,0 +1,159 @@
+"""Benchmark the import time of the entry points of the repo.
+
+Each target is imported in a fresh interpreter with `python -X importtime`, so
+the measurement is a cold start (apart from the OS file cache). A target is
+either a module name (e.g. `utils`) or the path to a script, of which only
+the top-level import statements are run (e.g. the Streamlit app, whose
+import cost is paid on every cold start of the server).
+
+Results can be appended to a JSON Lines history file to track the cold-start
+cost over time; the difference to the previous record is printed.
+
+Example usage:
+```bash
+python benchmark_imports.py
+python benchmark_imports.py --targets arxiv-classifier-app.py utils --repeats 10 --top 15
+python benchmark_imports.py --history import-times.jsonl
+```
+"""
+
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+parser = ArgumentParser()
+parser.add_argument(
+    "--targets",
+    nargs="+",
+    default=["arxiv-classifier-app.py", "utils", "push_mod_queues.py"],
+    help="Module names or paths to scripts to benchmark",
+)
+parser.add_argument(
+    "--repeats", type=int, default=5, help="Number of measurements per target"
+)
+parser.add_argument(
+    "--top", type=int, default=10, help="Number of slowest imports to show per target"
+)
+parser.add_argument(
+    "--history",
+    type=str,
+    default=None,
+    help="JSON Lines file to append the results to",
+)
+
+
+def get_import_code(target: str) -> str:
+    """Get the code importing a target.
+
+    Args:
+        target (str): module name or path to a script
+    Returns:
+        str: code importing the module, or the top-level imports of the script
+
+    """
+    if not target.endswith(".py"):
+        return f"import {target}"
+    with open(target, "r") as f:
+        tree = ast.parse(f.read())
+    imports = [
+        node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+    return ast.unparse(ast.Module(body=imports, type_ignores=[]))
+
+
+def measure(code: str) -> tuple[float, dict[str, float]]:
+    """Run code in a fresh interpreter and measure its imports.
+
+    Args:
+        code (str): code to run
+    Returns:
+        total (float): total import time in milliseconds
+        cumulative (dict[str, float]): cumulative import time in milliseconds
+            of each imported module, indented by its nesting level
+
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    total = 0.0
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        total += int(self_us) / 1000
+        # nested imports are indented by two spaces per level
+        cumulative[name[1:].rstrip()] = int(cumulative_us) / 1000
+    return total, cumulative
+
+
+def get_commit() -> str | None:
+    """Get the current git commit, if any."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_last_record(path: str) -> dict | None:
+    """Load the last record of a history file, if any."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.targets:
+        code = get_import_code(target)
+        runs = [measure(code) for _ in range(args.repeats)]
+        totals = [total for total, _ in runs]
+        median = statistics.median(totals)
+        # show the breakdown of the run closest to the median
+        _, cumulative = min(runs, key=lambda run: abs(run[0] - median))
+        results[target] = median
+        print(
+            f"\n{target}: {median:.1f} ms "
+            f"(min {min(totals):.1f} ms, max {max(totals):.1f} ms, {args.repeats} runs)"
+        )
+        # modules imported directly by the target
+        top_level = {
+            name: ms for name, ms in cumulative.items() if not name.startswith(" ")
+        }
+        slowest = sorted(top_level.items(), key=lambda item: -item[1])[: args.top]
+        for name, ms in slowest:
+            print(f"    {ms:>8.1f} ms  {name}")
+
+    if args.history is not None:
+        last = load_last_record(args.history)
+        if last is not None:
+            print(f"\nChange since {last['commit']} ({last['timestamp']}):")
+            for target, ms in results.items():
+                if target in last["results"]:
+                    print(f"    {target}: {ms - last['results'][target]:+.1f} ms")
+        with open(args.history, "a") as f:
+            record = {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "commit": get_commit(),
+                "python": sys.version.split()[0],
+                "results": results,
+            }
+            f.write(json.dumps(record) + "\n")
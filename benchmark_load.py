@@ -0,0 +1,578 @@
+"""Load test of the Streamlit app with many concurrent simulated moderators.
+
+Each simulated moderator drives its own session of the app with Streamlit's
+`AppTest`:
+1. open the app and select a (moderator, category) pair from the roster CSV
+2. press "Start Moderation", which loads the moderation queue
+3. submit random primary/secondary decisions for a number of papers and
+    occasionally press "Back"
+4. reopen the app and resume the queue, checking that the number of finished
+    papers matches the submissions
+
+All sessions run against a local SQLite backend seeded with the queues of
+--data_path and synthetic paper info, so no credentials or network access are
+needed. The latency of every step and the number of backend operations per
+session are reported at the end.
+
+NOTE: `AppTest` installs a process-global runtime on every run, so concurrent
+sessions run in separate worker processes (--concurrency), each running its
+sessions one after the other. Each worker therefore has its own shared cache
+and write queue, like a replica of the app, while all workers share the
+SQLite file.
+
+Example usage (from the root of the repository):
+```bash
+python benchmark_load.py -dp data/mod-queue-all2023_v2-test-pos10-neg10.json --num_moderators 230 --papers_per_session 10
+python benchmark_load.py --num_moderators 50 --concurrency 10 --output benchmark-load.json
+```
+"""
+
+import ast
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any
+from unittest import mock
+import numpy as np
+from streamlit import logger as streamlit_logger
+from streamlit.testing.v1 import AppTest
+import backend as backend_module
+from backend import BACKEND_ENV, DOC_ID, SQLITE_PATH_ENV, Backend, SQLiteBackend
+from batch_writer import ChunkedBatchWriter
+from queue_io import iter_queues
+from roster import load_roster
+from decisions import (
+    PrimaryDecision,
+    SecondaryDecisionUponGoodOK,
+    SecondaryDecisionUponBad,
+)
+from utils import parser
+
+parser.add_argument(
+    "--app", type=str, default="arxiv-classifier-app.py", help="Path to the app"
+)
+parser.add_argument(
+    "--roster",
+    type=str,
+    default="data/mod_cats-2025-09-10.csv",
+    help="CSV of moderators and their categories",
+)
+parser.add_argument(
+    "--num_moderators",
+    type=int,
+    default=50,
+    help="Number of simulated moderators (sampled from the roster)",
+)
+parser.add_argument(
+    "--concurrency",
+    type=int,
+    default=None,
+    help="Number of worker processes running sessions at once (default: number of CPUs)",
+)
+parser.add_argument(
+    "--papers_per_session",
+    type=int,
+    default=5,
+    help="Number of papers each moderator submits",
+)
+parser.add_argument(
+    "--back_prob",
+    type=float,
+    default=0.1,
+    help="Probability of pressing Back after a submission",
+)
+parser.add_argument("--seed", type=int, default=0, help="Random seed")
+parser.add_argument(
+    "--timeout",
+    type=float,
+    default=60,
+    help="Timeout in seconds of a single script run of the app",
+)
+parser.add_argument(
+    "--output", type=str, default=None, help="Save the report as json to this path"
+)
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+PERCENTILES = [50, 95, 99]
+# collections of the app that are seeded, see `seed_backend`
+REQUIRED_COLLECTIONS = ["MODERATOR_QUEUE_COLLECTION", "PAPER_INFO_COLLECTION"]
+
+# backend of the app in a worker process, see `init_worker`
+_counting_backend = None
+
+
+class CountingBackend(Backend):
+    """Wrap a backend to count its operations and measure their latency.
+
+    Args:
+        backend (Backend): wrapped backend
+
+    """
+
+    def __init__(self, backend: Backend) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+
+    def _call(self, op: str, fn: Callable, *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies[op].append(elapsed)
+
+    def get(self, collection: str, doc_id: str) -> dict | None:
+        """Read a document."""
+        return self._call("get", self.backend.get, collection, doc_id)
+
+    def get_many(self, collection: str, doc_ids: list[str]) -> dict[str, dict | None]:
+        """Read several documents with a single batched read."""
+        return self._call("get_many", self.backend.get_many, collection, doc_ids)
+
+    def set(self, collection: str, doc_id: str, data: dict) -> None:
+        """Write a document, replacing any existing data."""
+        return self._call("set", self.backend.set, collection, doc_id, data)
+
+    def create(self, collection: str, doc_id: str, data: dict) -> bool:
+        """Write a document only if it does not exist yet."""
+        return self._call("create", self.backend.create, collection, doc_id, data)
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        """Delete a document."""
+        return self._call("delete", self.backend.delete, collection, doc_id)
+
+    def query(
+        self, collection: str, filters: Any = (), fields: list[str] | None = None
+    ) -> list[tuple[str, dict]]:
+        """Find the documents of a collection matching all filters."""
+        return self._call("query", self.backend.query, collection, filters, fields)
+
+    def count(self, collection: str, filters: Any = ()) -> int:
+        """Count the documents of a collection matching all filters."""
+        return self._call("count", self.backend.count, collection, filters)
+
+    def query_page(
+        self,
+        collection: str,
+        filters: Any = (),
+        fields: list[str] | None = None,
+        order_by: str = DOC_ID,
+        start_after: tuple[str, dict] | None = None,
+        limit: int = 1000,
+    ) -> list[tuple[str, dict]]:
+        """Read one page of a query ordered by a field and then by document ID."""
+        return self._call(
+            "query_page",
+            self.backend.query_page,
+            collection,
+            filters,
+            fields,
+            order_by,
+            start_after,
+            limit,
+        )
+
+    def partition(self, collection: str, num_partitions: int) -> list[str]:
+        """Split a collection into ranges of document IDs of similar size."""
+        return self._call(
+            "partition", self.backend.partition, collection, num_partitions
+        )
+
+    def commit_batch(self, writes: list) -> None:
+        """Apply several writes atomically."""
+        return self._call("commit_batch", self.backend.commit_batch, writes)
+
+    def transaction(self, fn: Callable) -> Any:
+        """Run `fn` in a transaction."""
+        return self._call("transaction", self.backend.transaction, fn)
+
+
+def _module_assignments(body: list[ast.stmt]) -> Iterator[ast.Assign]:
+    """Yield the assignments run at module level, in order.
+
+    Only the branch taken by an `if` with a constant test (e.g. `if False:`) is
+    followed; both branches of any other `if` are.
+    """
+    for node in body:
+        if isinstance(node, ast.Assign):
+            yield node
+        elif isinstance(node, ast.If):
+            try:
+                taken = ast.literal_eval(node.test)
+            except ValueError:
+                branches = [node.body, node.orelse]
+            else:
+                branches = [node.body if taken else node.orelse]
+            for branch in branches:
+                yield from _module_assignments(branch)
+
+
+def get_app_collections(app_path: str) -> dict[str, str]:
+    """Read the names of the collections used by the app from its source.
+
+    Args:
+        app_path (str): path to the app
+    Returns:
+        dict mapping the names of the module-level `*_COLLECTION` constants to
+        their values
+
+    """
+    with open(app_path, "r") as f:
+        tree = ast.parse(f.read())
+    collections = {}
+    for node in _module_assignments(tree.body):
+        if isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id.endswith("_COLLECTION"):
+                    collections[target.id] = node.value.value
+    missing = [name for name in REQUIRED_COLLECTIONS if name not in collections]
+    if missing:
+        raise ValueError(f"{app_path} does not define {', '.join(missing)}")
+    return collections
+
+
+def seed_backend(
+    backend: Backend, collections: dict[str, str], queues: dict[str, list[str]]
+) -> None:
+    """Push the queues and synthetic paper info of all queued papers.
+
+    Args:
+        backend (Backend): storage backend
+        collections (dict[str, str]): collections used by the app
+        queues (dict[str, list[str]]): moderator queues
+
+    """
+    paper_ids = sorted({paper_id for queue in queues.values() for paper_id in queue})
+    writes = [
+        (collections["MODERATOR_QUEUE_COLLECTION"], queue_id, {"queue": queue})
+        for queue_id, queue in queues.items()
+    ] + [
+        (
+            collections["PAPER_INFO_COLLECTION"],
+            paper_id,
+            {
+                # roughly the size of real paper info
+                "title": f"Title of paper {paper_id}",
+                "authors": ", ".join(f"Author {i}" for i in range(8)),
+                "abstract": " ".join(["Lorem ipsum dolor sit amet."] * 40),
+                "url": f"https://ar5iv.org/html/{paper_id}",
+            },
+        )
+        for paper_id in paper_ids
+    ]
+    ChunkedBatchWriter(backend, chunk_size=500).commit(writes)
+    print(f"Seeded {len(queues)} queues and {len(paper_ids)} papers")
+
+
+def sample_moderators(
+    roster_path: str, queues: dict[str, list[str]], num_moderators: int, seed: int
+) -> list[tuple[str, str]]:
+    """Sample (moderator name, category) pairs that have a queue.
+
+    Pairs are sampled without replacement as long as the roster allows it.
+
+    Args:
+        roster_path (str): CSV of moderators and their categories
+        queues (dict[str, list[str]]): moderator queues
+        num_moderators (int): number of pairs to sample
+        seed (int): random seed
+    Returns:
+        list of (moderator name, category) pairs
+
+    """
+    roster = load_roster(roster_path)
+    pairs = [
+        (name, cat)
+        for cat, names in roster.moderators_by_category.items()
+        for name in names
+        if f"{name}:{cat.split(':')[0]}" in queues
+    ]
+    if not pairs:
+        raise ValueError(f"No moderator in {roster_path} has a queue")
+    rng = random.Random(seed)
+    sample = rng.sample(pairs, min(num_moderators, len(pairs)))
+    while len(sample) < num_moderators:
+        sample.append(rng.choice(pairs))
+    return sample
+
+
+class Session:
+    """A simulated moderator working through their queue in the app.
+
+    Args:
+        app_path (str): path to the app
+        mod_name (str): name of the moderator
+        current_cat (str): category
+        rng (random.Random): random number generator of the session
+        timeout (float): timeout in seconds of a single script run
+
+    """
+
+    def __init__(
+        self,
+        app_path: str,
+        mod_name: str,
+        current_cat: str,
+        rng: random.Random,
+        timeout: float,
+    ) -> None:
+        self.app_path = app_path
+        self.mod_name = mod_name
+        self.current_cat = current_cat
+        self.rng = rng
+        self.timeout = timeout
+        # step name -> latencies in seconds
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.num_submitted = 0
+
+    def _step(self, name: str, at: AppTest) -> AppTest:
+        """Run the app once and record the latency of the step."""
+        start = time.perf_counter()
+        at.run(timeout=self.timeout)
+        self.latencies[name].append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"{name} failed: {at.exception[0].message}")
+        return at
+
+    def _button(self, at: AppTest, label: str) -> Any:
+        return next(button for button in at.button if button.label == label)
+
+    def _finished(self, at: AppTest) -> int | None:
+        """Get the number of finished papers shown on the moderation page."""
+        for markdown in at.markdown:
+            if markdown.value.startswith("Currently finished moderating"):
+                return int(markdown.value.split("**")[1])
+        return None
+
+    def _start(self, prefix: str) -> AppTest:
+        """Open the app, select the moderator and category and start moderating."""
+        at = AppTest.from_file(self.app_path, default_timeout=self.timeout)
+        self._step(f"{prefix}open", at)
+        at.selectbox[0].set_value(self.current_cat)
+        self._step(f"{prefix}select", at)
+        at.selectbox[1].set_value(self.mod_name)
+        self._step(f"{prefix}select", at)
+        self._button(at, "Start Moderation").click()
+        return self._step(f"{prefix}start", at)
+
+    def _decide(self, at: AppTest) -> None:
+        """Select random primary and, if needed, secondary decisions."""
+        decision_p = self.rng.choice(list(PrimaryDecision))
+        at.radio[0].set_value(decision_p)
+        if decision_p == PrimaryDecision.GREAT_FIT:
+            return
+        # show the secondary decision
+        self._step("decide", at)
+        options = (
+            SecondaryDecisionUponBad
+            if decision_p == PrimaryDecision.BAD_FIT
+            else SecondaryDecisionUponGoodOK
+        )
+        at.radio[1].set_value(
+            self.rng.choice([option for option in options if option.name != "N_A"])
+        )
+
+    def run(self, num_papers: int, back_prob: float) -> None:
+        """Submit `num_papers` papers, then resume the queue in a new session.
+
+        Args:
+            num_papers (int): number of papers to submit
+            back_prob (float): probability of pressing Back after a submission
+
+        """
+        at = self._start("")
+        initial = self._finished(at)
+        for _ in range(num_papers):
+            if self._finished(at) is None:
+                # the queue is completed
+                break
+            self._decide(at)
+            self._button(at, "Submit Classification").click()
+            self._step("submit", at)
+            self.num_submitted += 1
+            if self._finished(at) is not None and self.rng.random() < back_prob:
+                self._button(at, "Back").click()
+                self._step("back", at)
+                self.num_submitted -= 1
+        # Start Moderation waits for the pending writes of the moderator
+        at = self._start("resume_")
+        finished = self._finished(at)
+        if initial is not None and finished is not None:
+            if finished != initial + self.num_submitted:
+                raise RuntimeError(
+                    f"Expected {initial + self.num_submitted} finished papers "
+                    f"after resuming, found {finished}"
+                )
+
+
+def init_worker(sqlite_path: str) -> None:
+    """Make the app of a worker process use a counting SQLite backend."""
+    global _counting_backend
+    # the app logs every submission and Streamlit warns about its empty radio labels
+    logging.getLogger().setLevel(logging.ERROR)
+    streamlit_logger.set_log_level("error")
+    os.environ[BACKEND_ENV] = "sqlite"
+    os.environ[SQLITE_PATH_ENV] = sqlite_path
+    _counting_backend = CountingBackend(SQLiteBackend(sqlite_path))
+    # the app gets its backend from backend.get_backend once per process
+    mock.patch.object(
+        backend_module, "get_backend", lambda *args: _counting_backend
+    ).start()
+
+
+def run_session(
+    session: Session, num_papers: int, back_prob: float
+) -> tuple[dict[str, list[float]], dict[str, list[float]]]:
+    """Run a session in a worker process.
+
+    Sessions of a worker run one after the other and wait for their writes
+    when resuming, so the backend operations during the session are the ones
+    caused by the session.
+
+    Args:
+        session (Session): simulated moderator
+        num_papers (int): number of papers to submit
+        back_prob (float): probability of pressing Back after a submission
+    Returns:
+        step_latencies (dict[str, list[float]]): latencies of the steps of the session
+        op_latencies (dict[str, list[float]]): latencies of the backend operations
+
+    """
+    with _counting_backend._lock:
+        _counting_backend.latencies = defaultdict(list)
+    # AppTest runs the app as the __main__ module, which is restored so that
+    # the next session sent to the worker can be unpickled
+    main_module = sys.modules["__main__"]
+    try:
+        session.run(num_papers, back_prob)
+    finally:
+        sys.modules["__main__"] = main_module
+    with _counting_backend._lock:
+        return dict(session.latencies), dict(_counting_backend.latencies)
+
+
+def summarize(latencies: dict[str, list[float]]) -> dict[str, dict[str, float]]:
+    """Compute the count and latency percentiles in milliseconds of each step."""
+    summary = {}
+    for name, values in latencies.items():
+        values = np.array(values) * 1000
+        summary[name] = {
+            "count": len(values),
+            **{f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES},
+            "max": float(values.max()),
+        }
+    return summary
+
+
+def print_table(title: str, summary: dict[str, dict[str, float]]) -> None:
+    """Print a summary computed by `summarize` as a table."""
+    print(f"\n{title}")
+    columns = ["count", *[f"p{p}" for p in PERCENTILES], "max"]
+    print(f"{'':<16}" + "".join(f"{column:>10}" for column in columns))
+    for name, row in sorted(summary.items()):
+        print(
+            f"{name:<16}{row['count']:>10}"
+            + "".join(f"{row[column]:>10.1f}" for column in columns[1:])
+        )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    collections = get_app_collections(args.app)
+    queues = dict(iter_queues(args.data_path))
+    moderators = sample_moderators(args.roster, queues, args.num_moderators, args.seed)
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    sqlite_path = args.sqlite_path or os.path.join(tmp_dir.name, "load-test.db")
+    seed_backend(SQLiteBackend(sqlite_path), collections, queues)
+
+    concurrency = args.concurrency or os.cpu_count()
+    print(
+        f"Running {len(moderators)} sessions ({concurrency} at once) "
+        f"with {args.papers_per_session} papers each"
+    )
+    rng = random.Random(args.seed)
+    sessions = [
+        Session(
+            os.path.abspath(args.app),
+            mod_name,
+            current_cat,
+            random.Random(rng.random()),
+            args.timeout,
+        )
+        for mod_name, current_cat in moderators
+    ]
+    step_latencies = defaultdict(list)
+    op_latencies = defaultdict(list)
+    num_failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=concurrency,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(sqlite_path,),
+    ) as executor:
+        futures = {
+            executor.submit(
+                run_session, session, args.papers_per_session, args.back_prob
+            ): session
+            for session in sessions
+        }
+        for future in as_completed(futures):
+            try:
+                session_steps, session_ops = future.result()
+            except Exception as e:
+                session = futures[future]
+                logger.error(
+                    f"Session of {session.mod_name} for {session.current_cat} failed: {e}"
+                )
+                num_failed += 1
+                continue
+            for name, values in session_steps.items():
+                step_latencies[name].extend(values)
+            for op, values in session_ops.items():
+                op_latencies[op].extend(values)
+    elapsed = time.perf_counter() - start
+
+    num_succeeded = len(sessions) - num_failed
+    steps = summarize(step_latencies)
+    ops = summarize(op_latencies)
+    ops_per_session = {
+        op: len(values) / max(num_succeeded, 1) for op, values in op_latencies.items()
+    }
+    print_table("Latency per step (ms)", steps)
+    print_table("Latency per backend operation (ms)", ops)
+    print("\nBackend operations per session")
+    for op, count in sorted(ops_per_session.items()):
+        print(f"{op:<16}{count:>10.1f}")
+    print(f"\n{num_succeeded} / {len(sessions)} sessions succeeded in {elapsed:.1f}s")
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "args": vars(args),
+                    "elapsed": elapsed,
+                    "num_sessions": len(sessions),
+                    "num_failed": num_failed,
+                    "steps": steps,
+                    "backend_ops": ops,
+                    "backend_ops_per_session": ops_per_session,
+                },
+                f,
+                indent=4,
+            )
+    tmp_dir.cleanup()
@@ -0,0 +1,302 @@
+"""Build the moderator queues from the roster and a split of the arxiv-classifier dataset.
+
+For each category of the roster, `--num_pos` positive papers (whose primary
+category is the category) and `--num_neg` negative papers (whose primary
+category is another category) are sampled without replacement. A fraction
+(`--shared_fraction`) of the positive and of the negative papers is shared by
+all moderators of the category, to measure their agreement, and the other
+papers are split evenly between them. Each queue is then shuffled.
+
+Sampling is vectorized over the papers of the split and is deterministic: the
+generator of each category is seeded with `--seed` and the category code, and
+the papers are sorted by ID before sampling. With `--max_queues_per_paper`,
+papers that already appear in that many queues are not sampled again, so
+categories are filled in the order of the roster. A category with more
+moderators than `--max_queues_per_paper` gets no shared papers, which is logged
+as a warning.
+
+The queues are saved in any format of `queue_io.py` and the positive and
+negative papers of each category are saved to a labels file for
+`analytics.py --labels`. Existing files are not overwritten unless `--force`
+is given.
+
+Example usage:
+```bash
+python build_queues.py --num_pos 50 --num_neg 50 --seed 0
+python build_queues.py --num_pos 100 --num_neg 100 --max_queues_per_paper 4 --output data/mod-queue-all2023_v2-test-pos100-neg100-built.queues
+```
+"""
+
+import json
+import logging
+import os
+import time
+import zlib
+from argparse import ArgumentParser
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from queue_io import write_queues
+from roster import Roster, load_roster
+from schema import category_code
+
+parser = ArgumentParser()
+parser.add_argument(
+    "--roster",
+    type=str,
+    default="data/mod_cats-2025-09-10.csv",
+    help="CSV of moderators and their categories",
+)
+parser.add_argument(
+    "--name", type=str, default="all2023_v2", help="Config of the HF dataset"
+)
+parser.add_argument("--split", type=str, default="test", help="Split of the HF dataset")
+parser.add_argument(
+    "--primary_column",
+    type=str,
+    default="primary_category",
+    help="Column of the dataset with the primary category code of each paper",
+)
+parser.add_argument(
+    "--num_pos", type=int, default=50, help="Number of positive papers per category"
+)
+parser.add_argument(
+    "--num_neg", type=int, default=50, help="Number of negative papers per category"
+)
+parser.add_argument(
+    "--shared_fraction",
+    type=float,
+    default=0.25,
+    help="Fraction of the papers of a category in the queues of all its moderators",
+)
+parser.add_argument(
+    "--max_queues_per_paper",
+    type=int,
+    default=None,
+    help="Maximum number of queues any paper appears in (default: no limit)",
+)
+parser.add_argument("--seed", type=int, default=0, help="Seed of the sampling")
+parser.add_argument(
+    "--output",
+    type=str,
+    default=None,
+    help="Queue file to save (.json, .jsonl or .queues, "
+    "default: data/mod-queue-NAME-SPLIT-posNUM_POS-negNUM_NEG-built.json)",
+)
+parser.add_argument(
+    "--labels_output",
+    type=str,
+    default=None,
+    help="JSON file to save the labels to (default: OUTPUT without extension + -labels.json)",
+)
+parser.add_argument(
+    "--force",
+    action="store_true",
+    help="Overwrite the output and labels files if they exist",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def load_categories(
+    name: str, split: str, primary_column: str
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Load the primary category of each paper of a split.
+
+    Args:
+        name (str): dataset config
+        split (str): dataset split
+        primary_column (str): column of the primary category codes
+    Returns:
+        paper_ids (np.ndarray): sorted paper IDs
+        primary (np.ndarray): index into `categories` of the primary category
+            of each paper
+        categories (np.ndarray): unique category codes
+
+    """
+    # NOTE: imported here so that the sampling can be used without `datasets`
+    from hf_data import load_table
+
+    table = load_table(name, split, ["paper_id", primary_column])
+    paper_ids = pc.cast(table["paper_id"], pa.string()).to_numpy(zero_copy_only=False)
+    encoded = pc.dictionary_encode(table[primary_column]).combine_chunks()
+    order = np.argsort(paper_ids.astype(str), kind="stable")
+    return (
+        paper_ids[order].astype(str),
+        encoded.indices.to_numpy(zero_copy_only=False)[order].astype(np.int32),
+        np.asarray(encoded.dictionary.to_pylist(), dtype=str),
+    )
+
+
+def category_rng(seed: int, code: str) -> np.random.Generator:
+    """Get the generator of a category, independent of the other categories."""
+    return np.random.default_rng([seed, zlib.crc32(code.encode())])
+
+
+def sample_papers(
+    rng: np.random.Generator,
+    candidates: np.ndarray,
+    usage: np.ndarray,
+    size: int,
+    num_shared: int,
+    num_moderators: int,
+    max_queues: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Sample the shared and the split papers of a category.
+
+    Args:
+        rng (np.random.Generator): generator of the category
+        candidates (np.ndarray): indices of the papers to sample from
+        usage (np.ndarray): number of queues each paper is already in, updated
+            in place
+        size (int): number of papers to sample
+        num_shared (int): number of sampled papers shared by all moderators
+        num_moderators (int): number of moderators of the category
+        max_queues (int): maximum number of queues of each paper
+    Returns:
+        shared (np.ndarray): indices of the papers shared by all moderators
+        split (np.ndarray): indices of the papers split between the moderators
+
+    """
+    pool = candidates[usage[candidates] + num_moderators <= max_queues]
+    shared = rng.choice(pool, size=min(num_shared, len(pool)), replace=False)
+    usage[shared] += num_moderators
+    pool = candidates[usage[candidates] < max_queues]
+    pool = pool[~np.isin(pool, shared)]
+    split = rng.choice(pool, size=min(size - len(shared), len(pool)), replace=False)
+    usage[split] += 1
+    return shared, split
+
+
+def build_queues(
+    roster: Roster,
+    paper_ids: np.ndarray,
+    primary: np.ndarray,
+    categories: np.ndarray,
+    num_pos: int,
+    num_neg: int,
+    shared_fraction: float = 0.25,
+    max_queues: int | None = None,
+    seed: int = 0,
+) -> tuple[dict[str, list[str]], dict[str, dict[str, list[str]]]]:
+    """Sample the queue of each moderator and category of the roster.
+
+    Args:
+        roster (Roster): moderators and their categories
+        paper_ids (np.ndarray): sorted paper IDs (see `load_categories`)
+        primary (np.ndarray): index into `categories` of the primary category
+            of each paper
+        categories (np.ndarray): unique category codes
+        num_pos (int): number of positive papers per category
+        num_neg (int): number of negative papers per category
+        shared_fraction (float): fraction of the positive and of the negative
+            papers shared by all moderators of a category
+        max_queues (int | None): maximum number of queues of each paper, or
+            None for no limit
+        seed (int): seed of the sampling
+    Returns:
+        queues (dict[str, list[str]]): paper IDs of each `name:category` queue,
+            in the order of the roster
+        labels (dict[str, dict[str, list[str]]]): positive and negative paper
+            IDs of each category code
+
+    """
+    max_queues = np.iinfo(np.int32).max if max_queues is None else max_queues
+    usage = np.zeros(len(paper_ids), dtype=np.int32)
+    # indices of the papers of each category, as contiguous slices of `order`
+    order = np.argsort(primary, kind="stable")
+    bounds = np.searchsorted(primary[order], np.arange(len(categories) + 1))
+    category_index = {code: i for i, code in enumerate(categories)}
+
+    queues, labels = {}, {}
+    for category in roster.categories:
+        code = category_code(category)
+        names = roster.moderators_by_category[category]
+        rng = category_rng(seed, code)
+        i = category_index.get(code)
+        if i is None:
+            logger.warning(f"No papers of {code} in the dataset")
+            pos_candidates = np.zeros(0, dtype=np.int64)
+            neg_candidates = np.arange(len(paper_ids))
+        else:
+            pos_candidates = order[bounds[i] : bounds[i + 1]]
+            neg_candidates = np.flatnonzero(primary != i)
+
+        if len(names) > 1 and len(names) > max_queues:
+            logger.warning(
+                f"{code} has {len(names)} moderators but papers can be in at most "
+                f"{max_queues} queues, so no papers are shared by its moderators"
+            )
+        sampled = []
+        for candidates, size in [(pos_candidates, num_pos), (neg_candidates, num_neg)]:
+            num_shared = int(shared_fraction * size) if len(names) > 1 else 0
+            sampled.append(
+                sample_papers(
+                    rng, candidates, usage, size, num_shared, len(names), max_queues
+                )
+            )
+        (pos_shared, pos_split), (neg_shared, neg_split) = sampled
+        if len(pos_shared) + len(pos_split) < num_pos:
+            logger.warning(
+                f"Only {len(pos_shared) + len(pos_split)} / {num_pos} positive papers for {code}"
+            )
+        labels[code] = {
+            "pos": paper_ids[np.sort(np.concatenate([pos_shared, pos_split]))].tolist(),
+            "neg": paper_ids[np.sort(np.concatenate([neg_shared, neg_split]))].tolist(),
+        }
+        pos_parts = np.array_split(pos_split, len(names))
+        neg_parts = np.array_split(neg_split, len(names))
+        for name, pos_part, neg_part in zip(names, pos_parts, neg_parts):
+            queue = np.concatenate([pos_shared, pos_part, neg_shared, neg_part])
+            queues[f"{name}:{code}"] = paper_ids[rng.permutation(queue)].tolist()
+    return queues, labels
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parser.parse_args()
+    output = args.output or (
+        f"data/mod-queue-{args.name}-{args.split}-pos{args.num_pos}-neg{args.num_neg}-built.json"
+    )
+    labels_output = (
+        args.labels_output or f"{os.path.splitext(output.rstrip('/'))[0]}-labels.json"
+    )
+    if not args.force:
+        for path in [output, labels_output]:
+            if os.path.exists(path):
+                parser.error(f"{path} already exists, pass --force to overwrite it")
+
+    roster = load_roster(args.roster)
+    start = time.time()
+    paper_ids, primary, categories = load_categories(
+        args.name, args.split, args.primary_column
+    )
+    logger.info(
+        f"Loaded {len(paper_ids)} papers in {len(categories)} categories "
+        f"in {time.time() - start:.1f}s"
+    )
+
+    start = time.time()
+    queues, labels = build_queues(
+        roster,
+        paper_ids,
+        primary,
+        categories,
+        args.num_pos,
+        args.num_neg,
+        shared_fraction=args.shared_fraction,
+        max_queues=args.max_queues_per_paper,
+        seed=args.seed,
+    )
+    num_entries = sum(len(queue) for queue in queues.values())
+    num_papers = len({paper_id for queue in queues.values() for paper_id in queue})
+    logger.info(
+        f"Built {len(queues)} queues with {num_entries} entries of {num_papers} "
+        f"papers in {time.time() - start:.1f}s"
+    )
+
+    write_queues(output, queues.items())
+    logger.info(f"Saved queues to {output}")
+    with open(labels_output, "w") as f:
+        json.dump(labels, f, indent=4)
+    logger.info(f"Saved labels to {labels_output}")
@@ -0,0 +1,187 @@
+"""Process-wide cache for immutable Firestore documents.
+
+The app is served from a single process to all moderators, so documents that
+never change after being pushed (paper_info and mod_queues) only need to be
+read from Firestore once per process instead of once per session.
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Default bounds, sized for ~25k paper_info documents plus all moderator queues
+MAX_ENTRIES = 50_000
+MAX_BYTES = 256 * 1024 * 1024
+TTL_SECONDS = 6 * 60 * 60
+# Missing documents may be pushed at any time, so they are only cached briefly
+NEGATIVE_TTL_SECONDS = 60
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate the memory footprint of a document in bytes."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            _sizeof(k) + _sizeof(v) for k, v in value.items()
+        )
+    if isinstance(value, list | tuple | set):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SharedCache:
+    """Thread-safe LRU cache with a TTL, bounded by entry count and bytes.
+
+    Entries are keyed by (collection, document ID) so that all documents of a
+    collection can be invalidated at once, e.g. after re-running a push script.
+    Missing documents can be cached as None, with a shorter TTL so that
+    documents pushed after the first read are picked up quickly.
+
+    Args:
+        max_entries (int): maximum number of cached documents
+        max_bytes (int): maximum approximate size of cached documents in bytes
+        ttl (float): number of seconds after which an entry expires
+        negative_ttl (float): number of seconds after which a missing document
+            (None) expires
+
+    """
+
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        max_bytes: int = MAX_BYTES,
+        ttl: float = TTL_SECONDS,
+        negative_ttl: float = NEGATIVE_TTL_SECONDS,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # (collection, key) -> (expiry time, size in bytes, value)
+        self._entries: OrderedDict[tuple[str, str], tuple[float, int, Any]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pop(self, entry_key: tuple[str, str]) -> None:
+        """Remove an entry. The lock must be held by the caller."""
+        _, size, _ = self._entries.pop(entry_key)
+        self.num_bytes -= size
+
+    def _lookup(self, entry_key: tuple[str, str], now: float) -> tuple[bool, Any]:
+        """Look up an entry. The lock must be held by the caller."""
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        expiry, _, value = entry
+        if expiry < now:
+            self._pop(entry_key)
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(entry_key)
+        self.hits += 1
+        return True, value
+
+    def get(self, collection: str, key: str) -> tuple[bool, Any]:
+        """Get a cached document.
+
+        Args:
+            collection (str): Firestore collection
+            key (str): document ID
+        Returns:
+            found (bool): whether the document is cached
+            value: the cached document (None if not found)
+
+        """
+        with self._lock:
+            return self._lookup((collection, key), time.monotonic())
+
+    def get_many(self, collection: str, keys: list[str]) -> dict[str, Any]:
+        """Get several cached documents.
+
+        Args:
+            collection (str): Firestore collection
+            keys (list[str]): document IDs
+        Returns:
+            dict mapping each cached document ID to its value; uncached IDs are omitted
+
+        """
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                is_cached, value = self._lookup((collection, key), now)
+                if is_cached:
+                    found[key] = value
+        return found
+
+    def set(self, collection: str, key: str, value: Any) -> None:
+        """Cache a document, evicting the least recently used entries if needed.
+
+        Args:
+            collection (str): Firestore collection
+            key (str): document ID
+            value: document to cache (None for missing documents)
+
+        """
+        entry_key = (collection, key)
+        size = _sizeof(key) + _sizeof(value)
+        if size > self.max_bytes:
+            logger.warning(f"Not caching {entry_key=} of {size} bytes")
+            return
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            if entry_key in self._entries:
+                self._pop(entry_key)
+            self._entries[entry_key] = (time.monotonic() + ttl, size, value)
+            self.num_bytes += size
+            while (
+                len(self._entries) > self.max_entries or self.num_bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, collection: str | None = None) -> int:
+        """Drop all cached documents of a collection.
+
+        Args:
+            collection (str | None): Firestore collection, or None to clear the whole cache
+        Returns:
+            int: number of dropped entries
+
+        """
+        with self._lock:
+            entry_keys = [
+                entry_key
+                for entry_key in self._entries
+                if collection is None or entry_key[0] == collection
+            ]
+            for entry_key in entry_keys:
+                self._pop(entry_key)
+        logger.info(f"Invalidated {len(entry_keys)} cache entries for {collection=}")
+        return len(entry_keys)
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache counters.
+
+        Returns:
+            dict with the number of hits, misses, evictions, entries and bytes
+
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.num_bytes,
+            }
@@ -0,0 +1,43 @@
+"""Decision options of the moderators.
+
+This module has no dependencies so that the app can import the decisions
+without the network and scraping code of `utils`.
+"""
+
+from enum import Enum
+
+
+class PrimaryDecision(Enum):
+    """Enum for primary category decision options."""
+
+    GREAT_FIT = "Great fit (no other category would be better)"
+    GOOD_FIT = "Good fit (category is fine, but other categories may be better)"
+    OK_FIT = "OK fit (category is ok, but it is very likely that some other category would be better)"
+    BAD_FIT = "Bad fit (category should definitely not be primary)"
+
+    def __str__(self):
+        return self.value
+
+
+class SecondaryDecisionUponGoodOK(Enum):
+    """Enum for secondary category decision options conditional on the primary category being good or ok."""
+
+    GOOD_FIT = "Good Fit (category should definitely be secondary if it is not primary)"
+    OK_FIT = "OK Fit (I have no objection to listing the category as secondary)"
+    BAD_FIT = "Bad Fit (category should definitely not be secondary)"
+    N_A = "N/A"
+
+    def __str__(self):
+        return self.value
+
+
+class SecondaryDecisionUponBad(Enum):
+    """Enum for secondary category decision options conditional on the primary category being bad."""
+
+    GREAT_FIT = "Great Fit (category should definitely be secondary)"
+    OK_FIT = "OK Fit (I have no objection to listing the category as secondary)"
+    BAD_FIT = "Bad Fit (category should definitely not be secondary)"
+    N_A = "N/A"
+
+    def __str__(self):
+        return self.value
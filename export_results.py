@@ -0,0 +1,284 @@
+"""Script to export the moderation results to Parquet files for analysis.
+
+The results collection is read page by page with cursors in parallel
+partitions, and each page is appended to the Parquet file of its partition,
+so memory stays flat regardless of the size of the collection. Results of all
+schema versions (see `schema.py`) are normalized: the decisions to the names
+of the `PrimaryDecision` and `SecondaryDecisionUponGoodOK`/
+`SecondaryDecisionUponBad` enums and the categories to category codes. The
+name, category and decision columns are dictionary-encoded.
+
+The first export (or an export with --full) reads the whole collection,
+partitioned into ranges of document IDs. Later exports only read results
+updated since the previous export (see `updated_at` in the results), split
+into time windows, and add new files to --output_dir. A result that was
+updated appears in several files, so use `read_export` to get the latest
+version of each result.
+
+NOTE: results deleted with "Back" after they were exported remain in the
+export until the next export with --full.
+
+Example usage:
+```bash
+python export_results.py --results_collection mod_results-all2023_v2-test-pos50-neg50-ar5iv-1001
+python export_results.py --results_collection mod_results-all2023_v2-test-pos50-neg50-ar5iv-1001 --full --num_partitions 16
+```
+"""
+
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from backend import DOC_ID, Backend, Filter, get_backend
+from schema import decode_result
+from utils import parser, MODERATOR_RESULTS_COLLECTION
+
+parser.add_argument(
+    "--results_collection",
+    "-mrc",
+    type=str,
+    default=MODERATOR_RESULTS_COLLECTION,
+    help="Firestore collection of the moderation results",
+)
+parser.add_argument(
+    "--output_dir",
+    type=str,
+    default=None,
+    help="Directory of the export (default: exports/<results_collection>)",
+)
+parser.add_argument(
+    "--num_partitions",
+    type=int,
+    default=8,
+    help="Number of partitions read in parallel",
+)
+parser.add_argument(
+    "--page_size", type=int, default=1000, help="Number of results per page"
+)
+parser.add_argument(
+    "--full",
+    action="store_true",
+    help="Export all results and replace the existing export",
+)
+parser.add_argument(
+    "--overlap",
+    type=float,
+    default=300,
+    help="Seconds before the last export from which results are exported again, "
+    "to catch results that were written while the last export was running",
+)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "_checkpoint.json"
+RESULT_FIELDS = [
+    "name",
+    "category",
+    "paper_id",
+    "primary_decision",
+    "secondary_decision",
+    "updated_at",
+]
+SCHEMA = pa.schema(
+    [
+        ("doc_id", pa.string()),
+        ("name", pa.dictionary(pa.int32(), pa.string())),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("paper_id", pa.string()),
+        ("primary_decision", pa.dictionary(pa.int32(), pa.string())),
+        ("secondary_decision", pa.dictionary(pa.int32(), pa.string())),
+        ("updated_at", pa.timestamp("ms", tz="UTC")),
+    ]
+)
+
+
+def to_record_batch(page: list[tuple[str, dict]]) -> pa.RecordBatch:
+    """Convert a page of results to a record batch with the export schema."""
+    columns = {field: [] for field in SCHEMA.names}
+    for doc_id, data in page:
+        result = decode_result(data)
+        decision_s = result["secondary_decision"]
+        updated_at = result["updated_at"]
+        columns["doc_id"].append(doc_id)
+        columns["name"].append(result["name"])
+        columns["category"].append(result["category"])
+        columns["paper_id"].append(result["paper_id"])
+        columns["primary_decision"].append(result["primary_decision"].name)
+        columns["secondary_decision"].append(decision_s.name if decision_s else None)
+        columns["updated_at"].append(
+            None if updated_at is None else int(updated_at * 1000)
+        )
+    arrays = []
+    for field in SCHEMA:
+        if pa.types.is_dictionary(field.type):
+            array = pa.array(columns[field.name], pa.string()).dictionary_encode()
+        elif pa.types.is_timestamp(field.type):
+            array = pa.array(columns[field.name], pa.int64()).cast(field.type)
+        else:
+            array = pa.array(columns[field.name], field.type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+
+def export_partition(
+    backend: Backend,
+    collection: str,
+    filters: list[Filter],
+    order_by: str,
+    path: str,
+    page_size: int,
+) -> int:
+    """Export the results of one partition to a Parquet file.
+
+    No file is written if the partition is empty.
+
+    Args:
+        backend (Backend): storage backend
+        collection (str): results collection
+        filters (list[Filter]): filters selecting the partition
+        order_by (str): field to page through the partition by
+        path (str): path to the Parquet file
+        page_size (int): number of results per page
+    Returns:
+        int: number of exported results
+
+    """
+    num_rows = 0
+    writer = None
+    start_after = None
+    try:
+        while True:
+            page = backend.query_page(
+                collection, filters, RESULT_FIELDS, order_by, start_after, page_size
+            )
+            if not page:
+                break
+            if writer is None:
+                writer = pq.ParquetWriter(f"{path}.tmp", SCHEMA)
+            writer.write_batch(to_record_batch(page))
+            num_rows += len(page)
+            start_after = page[-1]
+            if len(page) < page_size:
+                break
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(f"{path}.tmp", path)
+    return num_rows
+
+
+def read_export(output_dir: str) -> pd.DataFrame:
+    """Read an export, keeping the latest version of each result.
+
+    Args:
+        output_dir (str): directory of the export
+    Returns:
+        pd.DataFrame: one row per result
+
+    """
+    paths = sorted(glob.glob(os.path.join(output_dir, "part-*.parquet")))
+    if not paths:
+        return SCHEMA.empty_table().to_pandas()
+    table = pa.concat_tables([pq.read_table(path) for path in paths])
+    df = table.unify_dictionaries().to_pandas()
+    # files are sorted by export time, so the last version of a result is the latest
+    return df[~df["doc_id"].duplicated(keep="last")].reset_index(drop=True)
+
+
+def load_checkpoint(output_dir: str) -> dict | None:
+    """Load the checkpoint of the last export, if any."""
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_checkpoint(output_dir: str, checkpoint: dict) -> None:
+    """Atomically save the checkpoint of an export."""
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join("exports", args.results_collection)
+    os.makedirs(output_dir, exist_ok=True)
+    backend = get_backend(args.backend, args.sqlite_path)
+    checkpoint = None if args.full else load_checkpoint(output_dir)
+
+    start = time.time()
+    if checkpoint is None:
+        logger.info(f"Exporting all results of {args.results_collection}")
+        split_points = backend.partition(args.results_collection, args.num_partitions)
+        bounds = [None, *split_points, None]
+        partitions = [
+            ([(DOC_ID, ">=", lo)] if lo is not None else [])
+            + ([(DOC_ID, "<", hi)] if hi is not None else [])
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        ]
+        order_by = DOC_ID
+    else:
+        since = checkpoint["updated_at"] - args.overlap
+        logger.info(
+            f"Exporting results of {args.results_collection} updated since "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(since))}"
+        )
+        edges = [
+            since + (start - since) * i / args.num_partitions
+            for i in range(args.num_partitions + 1)
+        ]
+        partitions = [
+            [("updated_at", ">", lo), ("updated_at", "<=", hi)]
+            for lo, hi in zip(edges[:-1], edges[1:])
+        ]
+        order_by = "updated_at"
+
+    run_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime(start))
+    paths = [
+        os.path.join(output_dir, f"part-{run_id}-{i:03d}.parquet")
+        for i in range(len(partitions))
+    ]
+    try:
+        with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+            num_rows = sum(
+                executor.map(
+                    lambda partition, path: export_partition(
+                        backend,
+                        args.results_collection,
+                        partition,
+                        order_by,
+                        path,
+                        args.page_size,
+                    ),
+                    partitions,
+                    paths,
+                )
+            )
+    except BaseException:
+        # leave the export as it was before this run
+        for path in paths:
+            for tmp_path in [path, f"{path}.tmp"]:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        raise
+    if checkpoint is None:
+        # replace the files of previous exports
+        for path in glob.glob(os.path.join(output_dir, "part-*.parquet")):
+            if path not in paths:
+                os.remove(path)
+    save_checkpoint(output_dir, {"updated_at": start, "run_id": run_id})
+    logger.info(
+        f"Exported {num_rows} results to {output_dir} in {time.time() - start:.1f}s "
+        f"({len(partitions)} partitions)"
+    )
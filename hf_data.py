@@ -0,0 +1,65 @@
+"""Helpers for reading the arxiv-classifier dataset from Hugging Face."""
+
+import logging
+from collections.abc import Iterable
+import pyarrow as pa
+import pyarrow.compute as pc
+from datasets import load_dataset
+
+logger = logging.getLogger(__name__)
+
+HF_DATASET = "kilian-group/arxiv-classifier"
+PAPER_INFO_COLUMNS = ["paper_id", "title", "authors", "abstract"]
+
+
+def load_table(
+    name: str = "all2023_v2", split: str = "test", columns: list[str] | None = None
+) -> pa.Table:
+    """Load a split of the dataset as an Arrow table.
+
+    The table is backed by the memory-mapped cache files of the dataset and
+    only the requested columns are selected, so no rows are converted to Python
+    objects and unused columns are never read.
+
+    Args:
+        name (str): dataset config
+        split (str): dataset split
+        columns (list[str] | None): columns to select, or None for all columns
+    Returns:
+        pa.Table: dataset split
+
+    """
+    logger.info(f"Loading {name=} {split=} from {HF_DATASET}")
+    ds = load_dataset(HF_DATASET, name=name, split=split)
+    # NOTE: a freshly loaded dataset has no indices mapping, so its rows are
+    # exactly the rows of the underlying table
+    table = ds.data.table
+    return table if columns is None else table.select(columns)
+
+
+def load_papers(
+    paper_ids: Iterable[str],
+    name: str = "all2023_v2",
+    split: str = "test",
+    columns: list[str] = PAPER_INFO_COLUMNS,
+) -> dict[str, dict]:
+    """Load the given columns of the given papers from the dataset.
+
+    The table is filtered to the requested papers with a vectorized `is_in`
+    before converting rows to Python dicts, so memory is proportional to the
+    number of requested papers.
+
+    Args:
+        paper_ids (Iterable[str]): arXiv paper IDs
+        name (str): dataset config
+        split (str): dataset split
+        columns (list[str]): columns to load, must include `paper_id`
+    Returns:
+        dict mapping each paper ID found in the dataset to its columns
+
+    """
+    table = load_table(name, split, columns)
+    value_set = pa.array(list(paper_ids), type=table.schema.field("paper_id").type)
+    table = table.filter(pc.is_in(table["paper_id"], value_set=value_set))
+    logger.info(f"Found {table.num_rows} / {len(value_set)} papers in the dataset")
+    return {row["paper_id"]: row for row in table.to_pylist()}
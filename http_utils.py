@@ -0,0 +1,63 @@
+"""Helpers for making many HTTP requests to arXiv services politely."""
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+# (connect, read) timeouts of a request in seconds, so that a stalled
+# connection fails and is retried instead of hanging
+TIMEOUT = (5.0, 30.0)
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """Create a session whose connection pool can be shared by `pool_size` threads.
+
+    Args:
+        pool_size (int): maximum number of connections kept alive per host
+    Returns:
+        requests.Session: session with keep-alive connections
+
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    Args:
+        rate (float): number of tokens added per second
+        capacity (float | None): maximum number of tokens, i.e. the burst size.
+            Defaults to `rate`.
+
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take a token, sleeping until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # reserve the token even if it is not available yet, so that
+            # waiting threads are served in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
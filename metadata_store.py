@@ -0,0 +1,438 @@
+"""Local store of the paper metadata fetched from arXiv and ar5iv.
+
+The title, authors and abstract of a paper (from its arXiv abstract page) and
+whether it has an ar5iv page are stored in one SQLite file, keyed by paper ID,
+together with the time they were fetched. `utils.get_arxiv_details_from_id`,
+`utils.get_arxiv_details_many`, `utils.has_ar5iv_page` and
+`utils.has_ar5iv_pages` read through the store, so repeated pushes and checks
+of the same papers are local lookups instead of HTTP requests.
+
+Entries older than `details_max_age` are stale: they are not returned, so
+they are fetched again and overwritten. The same holds for ar5iv checks, with
+a much shorter `ar5iv_negative_max_age` for papers without an ar5iv page, since
+ar5iv pages of recent papers appear later. The store holds at most
+`max_papers` papers; when it grows larger, the papers fetched longest ago are
+evicted.
+
+The layout of the store is versioned (STORE_VERSION); a store of another
+version is discarded and rebuilt. A warmed store can be exported to a JSON
+Lines file and imported on another machine (e.g. the deploy host), where the
+most recently fetched version of each entry is kept.
+
+The store is selected with the ARXIV_METADATA_STORE_PATH environment variable
+(default: `paper-metadata.db`).
+
+Example usage:
+```python
+store = get_metadata_store()
+store.put_details("2309.04535", {"title": ..., "authors": ..., "abstract": ...})
+store.get_details_many(["2309.04535", "2309.01443"])  # only the fresh entries
+```
+```bash
+python metadata_store.py export paper-metadata.jsonl
+python metadata_store.py import paper-metadata.jsonl
+python metadata_store.py import-ar5iv-table ar5iv-status.json
+python metadata_store.py stats
+```
+"""
+
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from argparse import ArgumentParser
+from collections.abc import Iterable
+from functools import cache
+
+logger = logging.getLogger(__name__)
+
+METADATA_STORE_PATH_ENV = "ARXIV_METADATA_STORE_PATH"
+DEFAULT_PATH = "paper-metadata.db"
+# NOTE: bump when the layout of the store changes
+STORE_VERSION = 1
+DETAILS_FIELDS = ["title", "authors", "abstract"]
+COLUMNS = [
+    "paper_id",
+    *DETAILS_FIELDS,
+    "details_fetched_at",
+    "has_ar5iv",
+    "ar5iv_checked_at",
+    "fetched_at",
+]
+# Default staleness and size bounds
+DAY = 24 * 3600
+DETAILS_MAX_AGE = 90 * DAY
+AR5IV_MAX_AGE = 90 * DAY
+AR5IV_NEGATIVE_MAX_AGE = 3 * DAY
+MAX_PAPERS = 500_000
+
+
+class MetadataStore:
+    """SQLite store of paper details and ar5iv availability.
+
+    All operations of the process are serialized on one connection.
+
+    Args:
+        path (str): path to the SQLite file (":memory:" for an in-memory store)
+        details_max_age (float): seconds after which details are stale
+        ar5iv_max_age (float): seconds after which a positive ar5iv check is stale
+        ar5iv_negative_max_age (float): seconds after which a negative ar5iv
+            check is stale
+        max_papers (int): maximum number of papers in the store
+
+    """
+
+    # Maximum number of parameters in a single SQL statement
+    MAX_PARAMS = 500
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        details_max_age: float = DETAILS_MAX_AGE,
+        ar5iv_max_age: float = AR5IV_MAX_AGE,
+        ar5iv_negative_max_age: float = AR5IV_NEGATIVE_MAX_AGE,
+        max_papers: int = MAX_PAPERS,
+    ) -> None:
+        self.path = path
+        self.details_max_age = details_max_age
+        self.ar5iv_max_age = ar5iv_max_age
+        self.ar5iv_negative_max_age = ar5iv_negative_max_age
+        self.max_papers = max_papers
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+            if version != STORE_VERSION:
+                if version != 0:
+                    logger.warning(
+                        f"Discarding the metadata store at {path} of version "
+                        f"{version} (current version: {STORE_VERSION})"
+                    )
+                self._conn.execute("DROP TABLE IF EXISTS papers")
+                self._conn.execute(f"PRAGMA user_version = {STORE_VERSION}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS papers ("
+                "paper_id TEXT PRIMARY KEY, "
+                "title TEXT, authors TEXT, abstract TEXT, details_fetched_at REAL, "
+                "has_ar5iv INTEGER, ar5iv_checked_at REAL, "
+                # time of the latest fetch, by which papers are evicted
+                "fetched_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS papers_fetched_at ON papers (fetched_at)"
+            )
+
+    def _select(
+        self, columns: str, fresh: str, params: list, paper_ids: list[str]
+    ) -> list[tuple]:
+        """Select the fresh rows of the given papers, in chunks of MAX_PARAMS IDs.
+
+        Args:
+            columns (str): selected columns, after the paper ID
+            fresh (str): condition on the fetch times of fresh rows
+            params (list): parameters of the condition
+            paper_ids (list[str]): arXiv paper IDs
+        Returns:
+            list of (paper ID, *columns) tuples
+
+        """
+        rows = []
+        with self._lock:
+            for start in range(0, len(paper_ids), self.MAX_PARAMS):
+                chunk = paper_ids[start : start + self.MAX_PARAMS]
+                rows += self._conn.execute(
+                    f"SELECT paper_id, {columns} FROM papers WHERE {fresh} "
+                    f"AND paper_id IN ({', '.join('?' * len(chunk))})",
+                    [*params, *chunk],
+                ).fetchall()
+        return rows
+
+    def _upsert(self, columns: list[str], rows: list[tuple]) -> None:
+        """Insert or update some columns of several papers, then evict if needed.
+
+        Args:
+            columns (list[str]): updated columns, after the paper ID
+            rows (list[tuple]): (paper ID, *values) tuples
+
+        """
+        now = time.time()
+        placeholders = ", ".join("?" * (len(columns) + 2))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+        self._write_many(
+            f"INSERT INTO papers (paper_id, {', '.join(columns)}, fetched_at) "
+            f"VALUES ({placeholders}) "
+            f"ON CONFLICT (paper_id) DO UPDATE SET {updates}, "
+            "fetched_at = excluded.fetched_at",
+            [(*row, now) for row in rows],
+        )
+
+    def _write_many(self, sql: str, rows: list[tuple]) -> None:
+        """Run a statement for each row in one transaction, then evict if needed."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(sql, rows)
+                self._evict()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _evict(self) -> None:
+        """Delete the papers fetched longest ago beyond `max_papers`.
+
+        A tenth of the store is evicted at once, so that the store is not
+        trimmed again on every write once it is full.
+        """
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()
+        if count <= self.max_papers:
+            return
+        num_evicted = count - self.max_papers + self.max_papers // 10
+        self._conn.execute(
+            "DELETE FROM papers WHERE paper_id IN ("
+            "SELECT paper_id FROM papers ORDER BY fetched_at LIMIT ?)",
+            (num_evicted,),
+        )
+        logger.info(f"Evicted {num_evicted} papers from the metadata store")
+
+    def get_details_many(self, paper_ids: Iterable[str]) -> dict[str, dict]:
+        """Get the fresh details of several papers.
+
+        Args:
+            paper_ids (Iterable[str]): arXiv paper IDs
+        Returns:
+            dict mapping the paper IDs with fresh details to their title,
+            authors and abstract
+
+        """
+        rows = self._select(
+            ", ".join(DETAILS_FIELDS),
+            "details_fetched_at >= ?",
+            [time.time() - self.details_max_age],
+            list(dict.fromkeys(paper_ids)),
+        )
+        return {row[0]: dict(zip(DETAILS_FIELDS, row[1:])) for row in rows}
+
+    def get_details(self, paper_id: str) -> dict | None:
+        """Get the fresh details of a paper, or None if there are none."""
+        return self.get_details_many([paper_id]).get(paper_id)
+
+    def put_details_many(self, details: dict[str, dict]) -> None:
+        """Store the details of several papers.
+
+        Args:
+            details (dict[str, dict]): title, authors and abstract of each paper
+
+        """
+        now = time.time()
+        self._upsert(
+            [*DETAILS_FIELDS, "details_fetched_at"],
+            [
+                (paper_id, *(paper[field] for field in DETAILS_FIELDS), now)
+                for paper_id, paper in details.items()
+            ],
+        )
+
+    def put_details(self, paper_id: str, details: dict) -> None:
+        """Store the details of a paper."""
+        self.put_details_many({paper_id: details})
+
+    def get_ar5iv_many(self, paper_ids: Iterable[str]) -> dict[str, bool]:
+        """Get the fresh ar5iv checks of several papers.
+
+        Args:
+            paper_ids (Iterable[str]): arXiv paper IDs
+        Returns:
+            dict mapping the paper IDs with a fresh check to whether they have
+            an ar5iv page
+
+        """
+        now = time.time()
+        rows = self._select(
+            "has_ar5iv",
+            "ar5iv_checked_at >= CASE WHEN has_ar5iv THEN ? ELSE ? END",
+            [now - self.ar5iv_max_age, now - self.ar5iv_negative_max_age],
+            list(dict.fromkeys(paper_ids)),
+        )
+        return {paper_id: bool(has_ar5iv) for paper_id, has_ar5iv in rows}
+
+    def get_ar5iv(self, paper_id: str) -> bool | None:
+        """Get the fresh ar5iv check of a paper, or None if there is none."""
+        return self.get_ar5iv_many([paper_id]).get(paper_id)
+
+    def put_ar5iv_many(self, checks: dict[str, bool]) -> None:
+        """Store the ar5iv checks of several papers.
+
+        Args:
+            checks (dict[str, bool]): whether each paper has an ar5iv page
+
+        """
+        now = time.time()
+        self._upsert(
+            ["has_ar5iv", "ar5iv_checked_at"],
+            [(paper_id, int(has_ar5iv), now) for paper_id, has_ar5iv in checks.items()],
+        )
+
+    def put_ar5iv(self, paper_id: str, has_ar5iv: bool) -> None:
+        """Store the ar5iv check of a paper."""
+        self.put_ar5iv_many({paper_id: has_ar5iv})
+
+    def export(self, path: str) -> int:
+        """Export the store to a JSON Lines file.
+
+        The first line holds the version of the store, and each following line
+        the columns of one paper.
+
+        Args:
+            path (str): path to the JSON Lines file
+        Returns:
+            int: number of exported papers
+
+        """
+        num_papers = 0
+        with self._lock, open(f"{path}.tmp", "w") as f:
+            f.write(json.dumps({"version": STORE_VERSION}) + "\n")
+            for row in self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM papers"):
+                f.write(json.dumps(dict(zip(COLUMNS, row))) + "\n")
+                num_papers += 1
+        os.replace(f"{path}.tmp", path)
+        return num_papers
+
+    def import_(self, path: str, batch_size: int = 10_000) -> int:
+        """Import an export of a store, keeping the most recently fetched entries.
+
+        Args:
+            path (str): path to the JSON Lines file written by `export`
+            batch_size (int): number of papers written per transaction
+        Returns:
+            int: number of imported papers
+
+        """
+        # details and ar5iv checks are only replaced by more recent ones
+        newer_details = (
+            "excluded.details_fetched_at > COALESCE(papers.details_fetched_at, 0)"
+        )
+        newer_ar5iv = "excluded.ar5iv_checked_at > COALESCE(papers.ar5iv_checked_at, 0)"
+        updates = [
+            f"{column} = CASE WHEN {newer_details} THEN excluded.{column} ELSE papers.{column} END"
+            for column in [*DETAILS_FIELDS, "details_fetched_at"]
+        ] + [
+            f"{column} = CASE WHEN {newer_ar5iv} THEN excluded.{column} ELSE papers.{column} END"
+            for column in ["has_ar5iv", "ar5iv_checked_at"]
+        ]
+        sql = (
+            f"INSERT INTO papers ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(COLUMNS))}) "
+            f"ON CONFLICT (paper_id) DO UPDATE SET {', '.join(updates)}, "
+            "fetched_at = MAX(papers.fetched_at, excluded.fetched_at)"
+        )
+        num_papers = 0
+        with open(path, "r") as f:
+            header = json.loads(next(f))
+            if header.get("version") != STORE_VERSION:
+                raise ValueError(
+                    f"{path} is an export of version {header.get('version')}, "
+                    f"expected version {STORE_VERSION}"
+                )
+            while True:
+                rows = [
+                    tuple(paper.get(column) for column in COLUMNS)
+                    for paper in map(json.loads, itertools.islice(f, batch_size))
+                ]
+                if not rows:
+                    break
+                self._write_many(sql, rows)
+                num_papers += len(rows)
+        return num_papers
+
+    def stats(self) -> dict[str, int]:
+        """Count the papers with details and with positive and negative ar5iv checks."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COUNT(details_fetched_at), "
+                "COALESCE(SUM(has_ar5iv = 1), 0), COALESCE(SUM(has_ar5iv = 0), 0) "
+                "FROM papers"
+            ).fetchone()
+        return dict(zip(["papers", "details", "ar5iv", "no_ar5iv"], row))
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()
+        return count
+
+
+@cache
+def get_metadata_store(path: str | None = None) -> MetadataStore:
+    """Get the metadata store of the process.
+
+    Args:
+        path (str | None): path to the SQLite file, defaults to the value of
+            the ARXIV_METADATA_STORE_PATH environment variable, or
+            `paper-metadata.db`
+    Returns:
+        MetadataStore: metadata store, shared by all callers with the same path
+
+    """
+    path = path or os.environ.get(METADATA_STORE_PATH_ENV, DEFAULT_PATH)
+    logger.info(f"Using the paper metadata store at {path}")
+    return MetadataStore(path)
+
+
+def import_ar5iv_table(store: MetadataStore, path: str) -> int:
+    """Import a JSON table of ar5iv checks, as written by older push scripts.
+
+    The checks are imported as if they were made now.
+
+    Args:
+        store (MetadataStore): metadata store
+        path (str): path to the JSON file mapping paper IDs to whether they
+            have an ar5iv page
+    Returns:
+        int: number of imported checks
+
+    """
+    with open(path, "r") as f:
+        table = json.load(f)
+    store.put_ar5iv_many({paper_id: bool(value) for paper_id, value in table.items()})
+    return len(table)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "command",
+        choices=["export", "import", "import-ar5iv-table", "stats"],
+        help="export the store, import an export or a JSON table of ar5iv "
+        "checks, or count the papers in the store",
+    )
+    parser.add_argument("path", nargs="?", help="Path to the file to export or import")
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="Path to the store (default: $ARXIV_METADATA_STORE_PATH or paper-metadata.db)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command != "stats" and args.path is None:
+        parser.error(f"{args.command} needs a path")
+
+    store = get_metadata_store(args.store)
+    start = time.time()
+    if args.command == "export":
+        num_papers = store.export(args.path)
+        logger.info(f"Exported {num_papers} papers to {args.path}")
+    elif args.command == "import":
+        num_papers = store.import_(args.path)
+        logger.info(f"Imported {num_papers} papers from {args.path}")
+    elif args.command == "import-ar5iv-table":
+        num_papers = import_ar5iv_table(store, args.path)
+        logger.info(f"Imported {num_papers} ar5iv checks from {args.path}")
+    logger.info(f"Store: {store.stats()} ({time.time() - start:.1f}s)")
@@ -0,0 +1,135 @@
+"""Script to convert the moderation results to the current schema version.
+
+Results of older schema versions (see `schema.py`) are read page by page,
+converted with `migrate_result` and written back in chunked batches. Results
+that are already in the current version are left untouched, so the script can
+be run again after a failure.
+
+NOTE: run the migration while no moderator is using the app: a result written
+by the app between reading and writing a page would be overwritten with its
+previous version.
+
+Example usage:
+```bash
+python migrate_results.py --results_collection mod_results-all2023_v2-test-pos50-neg50-ar5iv-1001 --dry_run
+python migrate_results.py --results_collection mod_results-all2023_v2-test-pos50-neg50-ar5iv-1001
+```
+"""
+
+import json
+import logging
+from collections.abc import Iterator
+from backend import Backend, Write, get_backend
+from batch_writer import ChunkedBatchWriter
+from schema import SCHEMA_VERSION, migrate_result
+from utils import parser, MODERATOR_RESULTS_COLLECTION
+
+parser.add_argument(
+    "--results_collection",
+    "-mrc",
+    type=str,
+    default=MODERATOR_RESULTS_COLLECTION,
+    help="Firestore collection of the moderation results",
+)
+parser.add_argument(
+    "--target_collection",
+    type=str,
+    default=None,
+    help="Collection to write the migrated results to (default: migrate in place)",
+)
+parser.add_argument(
+    "--page_size", type=int, default=1000, help="Number of results per page"
+)
+parser.add_argument(
+    "--chunk_size",
+    type=int,
+    default=250,
+    help="Number of results per Firestore write batch (at most 500)",
+)
+parser.add_argument(
+    "--max_in_flight",
+    type=int,
+    default=4,
+    help="Maximum number of concurrent batch commits",
+)
+parser.add_argument(
+    "--dry_run",
+    action="store_true",
+    help="Only report the number and size of the results to migrate",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def doc_size(data: dict) -> int:
+    """Approximate the stored size of a document by the length of its JSON."""
+    return len(json.dumps(data, default=str).encode())
+
+
+def iter_migrations(
+    backend: Backend,
+    collection: str,
+    target_collection: str,
+    page_size: int,
+    stats: dict[str, int],
+) -> Iterator[Write]:
+    """Read the results page by page and yield the writes migrating them.
+
+    Args:
+        backend (Backend): storage backend
+        collection (str): results collection
+        target_collection (str): collection to write the migrated results to
+        page_size (int): number of results per page
+        stats (dict[str, int]): counters updated with the number of read and
+            migrated results and their size before and after the migration
+    Returns:
+        Iterator[Write]: writes of the migrated results
+
+    """
+    start_after = None
+    while True:
+        page = backend.query_page(collection, start_after=start_after, limit=page_size)
+        for doc_id, data in page:
+            stats["read"] += 1
+            if data.get("schema_version") == SCHEMA_VERSION:
+                if target_collection != collection:
+                    yield (target_collection, doc_id, data)
+                continue
+            migrated = migrate_result(data)
+            stats["migrated"] += 1
+            stats["bytes_before"] += doc_size(data)
+            stats["bytes_after"] += doc_size(migrated)
+            yield (target_collection, doc_id, migrated)
+        if len(page) < page_size:
+            break
+        start_after = page[-1]
+        logger.info(f"Read {stats['read']} results")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend, args.sqlite_path)
+    target_collection = args.target_collection or args.results_collection
+    stats = {"read": 0, "migrated": 0, "bytes_before": 0, "bytes_after": 0}
+    writes = iter_migrations(
+        backend, args.results_collection, target_collection, args.page_size, stats
+    )
+    if args.dry_run:
+        for _ in writes:
+            pass
+    else:
+        writer = ChunkedBatchWriter(
+            backend, chunk_size=args.chunk_size, max_in_flight=args.max_in_flight
+        )
+        writer.commit(writes)
+
+    action = "Would migrate" if args.dry_run else "Migrated"
+    saved = 1 - stats["bytes_after"] / stats["bytes_before"] if stats["migrated"] else 0
+    logger.info(
+        f"{action} {stats['migrated']} of {stats['read']} results in "
+        f"{args.results_collection} to schema version {SCHEMA_VERSION}: "
+        f"{stats['bytes_before'] / 1e6:.2f} MB -> {stats['bytes_after'] / 1e6:.2f} MB "
+        f"({saved:.0%} smaller)"
+    )
@@ -0,0 +1,77 @@
+"""Session-level store of paper information with batched prefetching."""
+
+import logging
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+# Number of papers fetched when the store is created
+INITIAL_PREFETCH = 50
+# Number of papers kept loaded ahead of the current paper
+PREFETCH_WINDOW = 50
+
+
+class PaperStore:
+    """In-memory store of paper_info documents for one moderation session.
+
+    The first `initial` papers of the queue are fetched with a single batched
+    read. Afterwards, whenever fewer than half of the `window` papers ahead of
+    the current position are loaded, the missing papers of the window are
+    fetched in one batch. Reruns of the app therefore only do in-memory
+    lookups, and the number of reads per session is O(len(queue) / window).
+
+    Args:
+        queue (list[str]): list of paper IDs in the order they are shown
+        fetch_many (Callable): function mapping a list of paper IDs to a dict
+            of paper ID -> paper information (or None if not found)
+        initial (int): number of papers to fetch up front
+        window (int): number of papers to keep loaded ahead of the current paper
+
+    """
+
+    def __init__(
+        self,
+        queue: list[str],
+        fetch_many: Callable[[list[str]], dict[str, dict | None]],
+        initial: int = INITIAL_PREFETCH,
+        window: int = PREFETCH_WINDOW,
+    ) -> None:
+        self.queue = queue
+        self.fetch_many = fetch_many
+        self.window = window
+        self.papers: dict[str, dict | None] = {}
+        self._fetch(queue[:initial])
+
+    def _fetch(self, paper_ids: list[str]) -> None:
+        """Fetch the given papers with one batched read and store them."""
+        missing = [paper_id for paper_id in paper_ids if paper_id not in self.papers]
+        if not missing:
+            return
+        logger.info(f"Prefetching {len(missing)} papers")
+        found = self.fetch_many(missing)
+        for paper_id in missing:
+            self.papers[paper_id] = found.get(paper_id)
+
+    def prefetch(self, idx: int) -> None:
+        """Refill the window of papers ahead of position `idx` if it is running low.
+
+        Args:
+            idx (int): position of the current paper in the queue
+
+        """
+        ahead = self.queue[idx : idx + self.window]
+        num_loaded = sum(paper_id in self.papers for paper_id in ahead)
+        if (ahead and ahead[0] not in self.papers) or num_loaded < len(ahead) / 2:
+            self._fetch(ahead)
+
+    def get(self, idx: int) -> dict | None:
+        """Get the paper information for the paper at position `idx` in the queue.
+
+        Args:
+            idx (int): position of the paper in the queue
+        Returns:
+            dict of paper information if found, otherwise None
+
+        """
+        self.prefetch(idx)
+        return self.papers.get(self.queue[idx])
@@ -0,0 +1,238 @@
+"""Per-moderator progress documents maintained alongside moderation results.
+
+For each `name:category` queue, a compact summary document is kept in the
+progress collection:
+- `queue_size`: number of papers in the queue
+- `queue_hash`: hash of the paper IDs of the queue (see `queue_hash`), to
+  detect a queue re-pushed with other papers or in another order
+- `completed`: bitset over the queue positions of the annotated papers
+- `num_completed`: number of annotated papers
+- `counts`: number of results per `PrimaryDecision` (keyed by enum name)
+
+The summary is updated in the same transaction as the result document it
+describes, so resuming a session or reporting progress is a single read
+instead of a scan of the results collection.
+"""
+
+import hashlib
+import logging
+from backend import Backend, Transaction
+from decisions import PrimaryDecision
+from schema import category_code, category_filter, decode_primary
+
+logger = logging.getLogger(__name__)
+
+
+def queue_hash(full_queue: list[str]) -> str:
+    """Compute the hash of the paper IDs of a queue, in the order of the queue.
+
+    Args:
+        full_queue (list[str]): full list of papers in the queue
+    Returns:
+        str: hex digest of the queue
+
+    """
+    return hashlib.sha1("\n".join(full_queue).encode()).hexdigest()[:16]
+
+
+def empty_progress(
+    mod_name: str, current_cat: str, queue_size: int, queue_hash: str
+) -> dict:
+    """Create the progress document of a queue without any results.
+
+    Args:
+        mod_name (str): name of the moderator
+        current_cat (str): category
+        queue_size (int): number of papers in the queue
+        queue_hash (str): hash of the queue, computed by `queue_hash`
+    Returns:
+        dict: progress document
+
+    """
+    return {
+        "name": mod_name,
+        "category": category_code(current_cat),
+        "queue_size": queue_size,
+        "queue_hash": queue_hash,
+        "completed": bytes((queue_size + 7) // 8),
+        "num_completed": 0,
+        "counts": {decision.name: 0 for decision in PrimaryDecision},
+    }
+
+
+def is_completed(progress: dict, position: int) -> bool:
+    """Check whether the paper at the given queue position has been annotated."""
+    return bool(progress["completed"][position // 8] & (1 << (position % 8)))
+
+
+def completed_positions(progress: dict) -> list[int]:
+    """Get the queue positions of the annotated papers.
+
+    Args:
+        progress (dict): progress document
+    Returns:
+        list[int]: sorted queue positions
+
+    """
+    return [
+        position
+        for position in range(progress["queue_size"])
+        if is_completed(progress, position)
+    ]
+
+
+def _mark(
+    progress: dict, position: int, primary_decision: int | str, done: bool
+) -> None:
+    """Set or clear a queue position and update the counts in place.
+
+    Args:
+        progress (dict): progress document
+        position (int): queue position of the paper
+        primary_decision (int | str): stored primary decision of the result
+        done (bool): True to mark the paper as annotated, False to unmark it
+
+    """
+    if is_completed(progress, position) == done:
+        return
+    completed = bytearray(progress["completed"])
+    completed[position // 8] ^= 1 << (position % 8)
+    progress["completed"] = bytes(completed)
+    delta = 1 if done else -1
+    progress["num_completed"] += delta
+    counts = progress["counts"]
+    name = decode_primary(primary_decision).name
+    counts[name] = counts.get(name, 0) + delta
+
+
+def submit_with_progress(
+    backend: Backend,
+    results_collection: str,
+    result_id: str,
+    progress_collection: str,
+    progress_id: str,
+    result: dict,
+    position: int,
+    queue_size: int,
+    queue_hash: str,
+) -> None:
+    """Write a result document and update the progress document in one transaction.
+
+    Args:
+        backend (Backend): storage backend
+        results_collection (str): collection of moderation results
+        result_id (str): ID of the result document
+        progress_collection (str): collection of progress documents
+        progress_id (str): ID of the progress document of the queue
+        result (dict): result to write
+        position (int): position of the paper in the full queue
+        queue_size (int): number of papers in the full queue
+        queue_hash (str): hash of the full queue, computed by `queue_hash`
+
+    """
+
+    def submit(transaction: Transaction) -> None:
+        old_result = transaction.get(results_collection, result_id)
+        progress = transaction.get(progress_collection, progress_id)
+        if progress is None:
+            progress = empty_progress(
+                result["name"], result["category"], queue_size, queue_hash
+            )
+        if old_result is not None:
+            # the result is overwritten, so the old decision no longer counts
+            _mark(progress, position, old_result["primary_decision"], done=False)
+        _mark(progress, position, result["primary_decision"], done=True)
+        transaction.set(results_collection, result_id, result)
+        transaction.set(progress_collection, progress_id, progress)
+
+    backend.transaction(submit)
+
+
+def delete_with_progress(
+    backend: Backend,
+    results_collection: str,
+    result_id: str,
+    progress_collection: str,
+    progress_id: str,
+    position: int,
+) -> None:
+    """Delete a result document and update the progress document in one transaction.
+
+    Args:
+        backend (Backend): storage backend
+        results_collection (str): collection of moderation results
+        result_id (str): ID of the result document
+        progress_collection (str): collection of progress documents
+        progress_id (str): ID of the progress document of the queue
+        position (int): position of the paper in the full queue
+
+    """
+
+    def delete(transaction: Transaction) -> None:
+        old_result = transaction.get(results_collection, result_id)
+        progress = transaction.get(progress_collection, progress_id)
+        transaction.delete(results_collection, result_id)
+        if old_result is not None and progress is not None:
+            _mark(progress, position, old_result["primary_decision"], done=False)
+            transaction.set(progress_collection, progress_id, progress)
+
+    backend.transaction(delete)
+
+
+def rebuild_progress(
+    backend: Backend,
+    results_collection: str,
+    progress_collection: str,
+    progress_id: str,
+    mod_name: str,
+    current_cat: str,
+    full_queue: list[str],
+    overwrite: bool = False,
+) -> dict:
+    """Build the progress document of a queue from a scan of its results.
+
+    This is only needed once per queue for results submitted before progress
+    documents were introduced, or after the queue has changed. Unless
+    `overwrite` is True, the document is only created if it does not exist
+    yet, so that concurrent submissions are not overwritten.
+
+    Args:
+        backend (Backend): storage backend
+        results_collection (str): collection of moderation results
+        progress_collection (str): collection of progress documents
+        progress_id (str): ID of the progress document of the queue
+        mod_name (str): name of the moderator
+        current_cat (str): category
+        full_queue (list[str]): full list of papers in the queue
+        overwrite (bool): whether to overwrite an existing progress document
+    Returns:
+        dict: progress document
+
+    """
+    positions = {}
+    for position, paper_id in enumerate(full_queue):
+        positions.setdefault(paper_id, position)
+    results = backend.query(
+        results_collection,
+        [("name", "==", mod_name), category_filter(current_cat)],
+        fields=["paper_id", "primary_decision"],
+    )
+    progress = empty_progress(
+        mod_name, current_cat, len(full_queue), queue_hash(full_queue)
+    )
+    for result_id, result in results:
+        position = positions.get(result["paper_id"])
+        if position is None:
+            logger.warning(f"Result {result_id} is not in the queue, skipping...")
+            continue
+        _mark(progress, position, result["primary_decision"], done=True)
+    logger.info(
+        f"Rebuilt progress for {progress_id} with {progress['num_completed']} results"
+    )
+    if overwrite:
+        backend.set(progress_collection, progress_id, progress)
+    elif not backend.create(progress_collection, progress_id, progress):
+        # another session created the document in the meantime
+        logger.warning(f"Progress document {progress_id} already exists")
+        return backend.get(progress_collection, progress_id)
+    return progress
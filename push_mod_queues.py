@@ -1,6 +1,12 @@
 """Script to update the mod_queues collection on Firestore with the data from the json file.
 
-NOTE: we only push papers with ar5iv pages to the mod_queues collection.
+The queue file (`.json`, `.jsonl` or `.queues`, see `queue_io.py`) is streamed one queue at a
+time, and the queues are pushed and saved as they are read.
+
+NOTE: with --check_ar5iv, we only push papers with ar5iv pages to the mod_queues collection.
+Each unique paper is checked once and the results are saved to the local
+metadata store (see `metadata_store.py`), so that later pushes only check
+papers without a fresh check.
 
 To check that the data has been loaded correctly into the firestore database, go to the following website:
 https://console.firebase.google.com/project/arxiv-website/firestore/databases/-default-/data/
@@ -8,14 +14,22 @@ https://console.firebase.google.com/project/arxiv-website/firestore/databases/-d
 Example usage:
 ```bash
 python push_mod_queues.py -dp data/mod-queue-all2023_v2-test-pos10-neg10.json
+python push_mod_queues.py -dp data/mod-queue-all2023_v2-test-pos10-neg10.json --check_ar5iv --ar5iv_workers 16 --ar5iv_rate 20
+python push_mod_queues.py -dp data/mod-queue-all2023_v2-test-pos10-neg10.json --sync
 ```
 """
 
 import logging
 import json
+from collections.abc import Iterator
 from tqdm import tqdm
 import os
-from utils import parser, get_firestore, MODERATOR_QUEUE_COLLECTION, has_ar5iv_page
+from utils import parser, has_ar5iv_pages, MODERATOR_QUEUE_COLLECTION
+from ar5iv_checker import AR5IV_URL
+from backend import get_backend
+from batch_writer import ChunkedBatchWriter
+from sync import push_collection, sync_collection
+from queue_io import QueueFileWriter, iter_queues
 
 parser.add_argument(
     "--mod_queue_collection",
@@ -24,27 +38,70 @@ parser.add_argument(
     default=MODERATOR_QUEUE_COLLECTION,
     help="Firestore collection to update",
 )
+parser.add_argument(
+    "--check_ar5iv",
+    action="store_true",
+    help="Remove papers without an ar5iv page from the queues",
+)
+parser.add_argument(
+    "--ar5iv_workers",
+    type=int,
+    default=16,
+    help="Number of concurrent requests when checking ar5iv pages",
+)
+parser.add_argument(
+    "--ar5iv_rate",
+    type=float,
+    default=20.0,
+    help="Maximum number of requests per second when checking ar5iv pages",
+)
+parser.add_argument(
+    "--ar5iv_url",
+    type=str,
+    default=AR5IV_URL,
+    help="URL under which the ar5iv pages are served",
+)
+parser.add_argument(
+    "--chunk_size",
+    type=int,
+    default=100,
+    help="Number of queues per Firestore write batch (at most 500)",
+)
+parser.add_argument(
+    "--max_in_flight",
+    type=int,
+    default=4,
+    help="Maximum number of concurrent batch commits",
+)
+parser.add_argument(
+    "--checkpoint",
+    type=str,
+    default=None,
+    help="Path to the checkpoint file used to resume a failed push "
+    "(default: checkpoint-MOD_QUEUE_COLLECTION.json)",
+)
+parser.add_argument(
+    "--sync",
+    action="store_true",
+    help="Only write added or changed documents and delete removed ones, "
+    "based on the manifest of content hashes stored alongside the collection",
+)
+parser.add_argument(
+    "--dry_run",
+    action="store_true",
+    help="With --sync, only report the changes without writing them",
+)
 args = parser.parse_args()
 data_path = args.data_path
 mod_queue_collection = args.mod_queue_collection
 
-basename = os.path.basename(data_path)
+basename = os.path.basename(data_path.rstrip("/"))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-logger.info(f"Loading data from {data_path}")
-with open(data_path, "r") as f:
-    queues = json.load(f)
-
-logger.info(f"Updating Firestore with {len(queues)} queues")
-db = get_firestore()
-# Create a write batch
-batch = db.batch()
-queues_with_ar5iv_pages = {}
-queues_without_ar5iv_pages = {}
 # NOTE: some papers throw a 503 error when fetching the ar5iv page
-IGNORE = [
+IGNORE = {
     "2308.16495",
     "2308.10736",
     "2308.07589",
@@ -52,48 +109,89 @@ IGNORE = [
     "2308.06232",
     "2307.08856",
     "2310.17336",
-]
-for name, queue in tqdm(list(queues.items())):
-    logger.info(f"Processing queue for {name}...")
-    filtered_queue = []
-    for paper_id in queue:
-        if False:
-            if paper_id in IGNORE:
-                logger.warning(f"Paper {paper_id} is in the ignore list, skipping...")
-                continue
-            if has_ar5iv_page(paper_id):
-                filtered_queue.append(paper_id)
-            else:
-                logger.warning(
-                    f"Paper {paper_id} does not have an ar5iv page, removing from queue"
-                )
+}
+
+#
+# Phase 1: resolve the availability of each unique paper once
+#
+if args.check_ar5iv:
+    # the queues are streamed from the file, so only the unique paper ids are
+    # kept in memory
+    logger.info(f"Collecting the unique paper ids of {data_path}")
+    paper_ids = {}
+    num_queues = num_entries = 0
+    for _, queue in iter_queues(data_path):
+        paper_ids.update(dict.fromkeys(queue))
+        num_queues += 1
+        num_entries += len(queue)
+    logger.info(
+        f"Found {len(paper_ids)} unique papers in {num_entries} entries of {num_queues} queues"
+    )
+    ar5iv_checks = has_ar5iv_pages(
+        [paper_id for paper_id in paper_ids if paper_id not in IGNORE],
+        base_url=args.ar5iv_url,
+        max_workers=args.ar5iv_workers,
+        rate=args.ar5iv_rate,
+    )
+    available_ids = {
+        paper_id for paper_id, has_ar5iv_page in ar5iv_checks.items() if has_ar5iv_page
+    }
+    logger.info(f"Papers with ar5iv pages: {len(available_ids)} / {len(paper_ids)}")
+    del paper_ids
+else:
+    available_ids = None
+
+
+#
+# Phase 2: project the availability back onto each queue, one queue at a time
+#
+def iter_queue_docs(
+    with_ar5iv: QueueFileWriter, without_ar5iv: QueueFileWriter
+) -> Iterator[tuple[str, dict]]:
+    """Stream the filtered queues from the file, saving them along the way."""
+    for name, queue in tqdm(iter_queues(data_path), desc="Queues"):
+        if available_ids is None:
+            filtered_queue, removed = queue, []
         else:
-            filtered_queue.append(paper_id)
-    logger.info(f"Papers with ar5iv pages: {len(filtered_queue)} / {len(queue)}")
-    queues_with_ar5iv_pages[name] = filtered_queue
-    queues_without_ar5iv_pages[name] = [
-        paper_id for paper_id in queue if paper_id not in filtered_queue
-    ]
-    doc_ref = db.collection(mod_queue_collection).document(name)
-    # NOTE: any existing data will be overwritten by the new data
-    # to update the data instead of overwriting it, use the update method
-    batch.set(doc_ref, {"queue": filtered_queue})
-
-batch.commit()
-
-save_path = f"ar5iv-{basename}"
-logger.info(f"Saving queues with ar5iv pages to {save_path}...")
-with open(save_path, "w") as f:
-    json.dump(queues_with_ar5iv_pages, f, indent=4)
+            filtered_queue = [
+                paper_id for paper_id in queue if paper_id in available_ids
+            ]
+            removed = [paper_id for paper_id in queue if paper_id not in available_ids]
+        logger.info(
+            f"Papers with ar5iv pages for {name}: {len(filtered_queue)} / {len(queue)}"
+        )
+        with_ar5iv.write(name, filtered_queue)
+        without_ar5iv.write(name, removed)
+        yield name, {"queue": filtered_queue}
 
-save_path = f"no-ar5iv-{basename}"
-logger.info(f"Saving queues without ar5iv pages to {save_path}...")
-with open(save_path, "w") as f:
-    json.dump(queues_without_ar5iv_pages, f, indent=4)
 
-save_path = f"ignore-{basename}"
+logger.info(f"Updating Firestore with the queues of {data_path}")
+backend = get_backend(args.backend, args.sqlite_path)
+writer = ChunkedBatchWriter(
+    backend,
+    chunk_size=args.chunk_size,
+    max_in_flight=args.max_in_flight,
+    checkpoint_path=args.checkpoint or f"checkpoint-{mod_queue_collection}.json",
+)
+with (
+    QueueFileWriter(f"ar5iv-{basename}") as with_ar5iv,
+    QueueFileWriter(f"no-ar5iv-{basename}") as without_ar5iv,
+):
+    docs = iter_queue_docs(with_ar5iv, without_ar5iv)
+    if args.sync:
+        sync_collection(
+            backend, mod_queue_collection, docs, writer, dry_run=args.dry_run
+        )
+    else:
+        # NOTE: any existing data will be overwritten by the new data
+        # to update the data instead of overwriting it, use the update method
+        push_collection(backend, mod_queue_collection, docs, writer)
+logger.info(f"Saved queues with ar5iv pages to {with_ar5iv.path}")
+logger.info(f"Saved queues without ar5iv pages to {without_ar5iv.path}")
+
+save_path = f"ignore-{os.path.splitext(basename)[0]}.json"
 logger.info(f"Saving ignore list to {save_path}...")
 with open(save_path, "w") as f:
-    json.dump(IGNORE, f, indent=4)
+    json.dump(sorted(IGNORE), f, indent=4)
 
 logger.info("Done!")
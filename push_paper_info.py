@@ -3,14 +3,18 @@
 Example usage:
 ```bash
 python push_paper_info.py -dp data/mod-queue-all2023_v2-test-pos10-neg10.json
+python push_paper_info.py -dp data/mod-queue-all2023_v2-test-pos10-neg10.json --sync
 ```
 """
 
-import json
 from tqdm import tqdm
 import logging
-from datasets import load_dataset
-from utils import parser, get_firestore, PAPER_INFO_COLLECTION
+from hf_data import load_papers
+from utils import parser, PAPER_INFO_COLLECTION
+from backend import get_backend
+from batch_writer import ChunkedBatchWriter
+from sync import push_collection, sync_collection
+from queue_io import iter_queues
 
 parser.add_argument(
     "--paper_info_collection",
@@ -19,6 +23,30 @@ parser.add_argument(
     default=PAPER_INFO_COLLECTION,
     help="Firestore collection to update",
 )
+parser.add_argument(
+    "--max_in_flight",
+    type=int,
+    default=8,
+    help="Maximum number of concurrent batch commits",
+)
+parser.add_argument(
+    "--checkpoint",
+    type=str,
+    default=None,
+    help="Path to the checkpoint file used to resume a failed push "
+    "(default: checkpoint-PAPER_INFO_COLLECTION.json)",
+)
+parser.add_argument(
+    "--sync",
+    action="store_true",
+    help="Only write added or changed documents and delete removed ones, "
+    "based on the manifest of content hashes stored alongside the collection",
+)
+parser.add_argument(
+    "--dry_run",
+    action="store_true",
+    help="With --sync, only report the changes without writing them",
+)
 args, _ = parser.parse_known_args()
 data_path = args.data_path
 paper_info_collection = args.paper_info_collection
@@ -26,10 +54,6 @@ paper_info_collection = args.paper_info_collection
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-logger.info("Loading data from HF")
-ds = load_dataset("kilian-group/arxiv-classifier", name="all2023_v2", split="test")
-map = {x["paper_id"]: x for x in tqdm(ds, desc="Constructing lookup table")}
-
 
 def get_arxiv_details_from_id_hf(paper_id: str) -> dict:
     """Get the paper info from the HF dataset.
@@ -41,7 +65,7 @@ def get_arxiv_details_from_id_hf(paper_id: str) -> dict:
 
     """
     # import pdb; pdb.set_trace()
-    paper = map.get(paper_id, None)
+    paper = papers.get(paper_id, None)
     if paper is None:
         raise ValueError(f"Paper not found for id {paper_id}")
     return {
@@ -52,37 +76,52 @@ def get_arxiv_details_from_id_hf(paper_id: str) -> dict:
     }
 
 
-logger.info(f"Loading data from {data_path}")
-with open(data_path, "r") as f:
-    queues = json.load(f)
-
-logger.info("Getting all paper ids in queues")
+logger.info(f"Getting all paper ids in the queues of {data_path}")
 paper_ids = set()
-for queue in queues.values():
+# the queues are streamed from the file, so only the paper ids are kept in memory
+for _, queue in iter_queues(data_path):
     paper_ids.update(queue)
-papers_ids = list(paper_ids)
+# sort the paper ids so that batches are the same across runs and can be resumed
+papers_ids = sorted(paper_ids)
+
+logger.info("Loading data from HF")
+# only load the uploaded columns of the queued papers
+papers = load_papers(papers_ids, name="all2023_v2", split="test")
 
 logger.info(f"Updating collection: {paper_info_collection}")
-db = get_firestore()
+backend = get_backend(args.backend, args.sqlite_path)
 
 # Define a reasonable batch size (e.g., 250 documents per batch)
 BATCH_SIZE = 250
 
-for i in range(0, len(papers_ids), BATCH_SIZE):
-    # Create a new batch for each chunk
-    batch = db.batch()
-
-    # Get the current chunk of paper_ids
-    chunk = papers_ids[i : i + BATCH_SIZE]
-
-    # Process each paper in the current chunk
-    for paper_id in tqdm(chunk, desc=f"Processing batch {i // BATCH_SIZE + 1}"):
-        doc_ref = db.collection(paper_info_collection).document(paper_id)
-        paper_info = get_arxiv_details_from_id_hf(paper_id)
-        batch.set(doc_ref, paper_info)
-
-    # Commit the current batch
-    logger.info(f"Committing batch {i // BATCH_SIZE + 1}")
-    batch.commit()
+writer = ChunkedBatchWriter(
+    backend,
+    chunk_size=BATCH_SIZE,
+    max_in_flight=args.max_in_flight,
+    checkpoint_path=args.checkpoint or f"checkpoint-{paper_info_collection}.json",
+)
+if args.sync:
+    sync_collection(
+        backend,
+        paper_info_collection,
+        (
+            (paper_id, get_arxiv_details_from_id_hf(paper_id))
+            for paper_id in tqdm(papers_ids, desc="Processing papers")
+        ),
+        writer,
+        dry_run=args.dry_run,
+    )
+else:
+    # the writes are generated lazily, so the next batch is built while the
+    # previous ones are being committed
+    push_collection(
+        backend,
+        paper_info_collection,
+        (
+            (paper_id, get_arxiv_details_from_id_hf(paper_id))
+            for paper_id in tqdm(papers_ids, desc="Processing papers")
+        ),
+        writer,
+    )
 
 logger.info("Done!")
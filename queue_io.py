@@ -0,0 +1,499 @@
+"""Streaming reading and writing of moderator queue files.
+
+Queue files map each `name:category` queue to its list of paper IDs, in one
+of three formats, chosen by the extension of the path:
+- `.json`: a JSON object of lists, `{"name:category": ["2309.04535", ...], ...}`
+  (the format produced by our evaluation protocol)
+- `.jsonl`: JSON Lines with one queue per line, `{"name": "name:category", "queue": [...]}`
+- `.queues`: a directory of NumPy arrays (see `PackedQueues`), in which each
+  unique paper ID is stored once, packed into an integer
+
+The JSON formats are read one queue at a time, so memory is bounded by the
+largest queue instead of the size of the file. The arrays of the packed
+format are memory-mapped.
+
+Example usage:
+```python
+for name, queue in iter_queues("data/mod-queue-all2023_v2-test-pos10-neg10.json"):
+    ...
+```
+```bash
+python queue_io.py data/mod-queue-all2023_v2-test-pos10-neg10.json data/mod-queue-all2023_v2-test-pos10-neg10.jsonl
+python queue_io.py data/mod-queue-all2023_v2-test-pos10-neg10.json data/mod-queue-all2023_v2-test-pos10-neg10.queues
+```
+"""
+
+import json
+import logging
+import os
+import shutil
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, TextIO
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Number of characters read from the file at a time
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+# Extension of the directories of packed queues
+PACKED_EXTENSION = ".queues"
+PACKED_VERSION = 1
+# Maximum number of elements of the incidence matrices of `overlap_matrix`
+MAX_INCIDENCE_SIZE = 1 << 24
+
+
+def pack_paper_ids(paper_ids: Sequence[str], extra_ids: dict[str, int]) -> np.ndarray:
+    """Pack arXiv paper IDs into integers.
+
+    An ID `yymm.number` is packed into `(yymm * 10 + len(number)) * 100000 + number`,
+    so that IDs whose number lost its trailing zeros (e.g. `2310.08`) are kept
+    as they are. Other IDs (e.g. old-style `math/0501001`) are interned in
+    `extra_ids` and packed into negative integers.
+
+    Args:
+        paper_ids (Sequence[str]): arXiv paper IDs
+        extra_ids (dict[str, int]): index of the IDs that are not `yymm.number`,
+            updated in place
+    Returns:
+        np.ndarray: int64 code of each paper ID
+
+    """
+    ids = np.asarray(paper_ids, dtype=str).reshape(-1)
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.int64)
+    yymm, dot, number = np.strings.partition(ids, ".")
+    length = np.strings.str_len(number)
+    valid = (
+        (np.strings.str_len(yymm) == 4)
+        & np.strings.isdigit(yymm)
+        & (dot == ".")
+        & (length <= 5)
+        & np.strings.isdigit(number)
+    )
+    codes = np.empty(len(ids), dtype=np.int64)
+    codes[valid] = (
+        yymm[valid].astype(np.int64) * 10 + length[valid]
+    ) * 100000 + number[valid].astype(np.int64)
+    for i in np.flatnonzero(~valid):
+        codes[i] = -1 - extra_ids.setdefault(str(ids[i]), len(extra_ids))
+    return codes
+
+
+def unpack_paper_ids(codes: np.ndarray, extra_ids: Sequence[str]) -> np.ndarray:
+    """Unpack integers packed by `pack_paper_ids` into arXiv paper IDs.
+
+    Args:
+        codes (np.ndarray): int64 codes
+        extra_ids (Sequence[str]): IDs that are not `yymm.number`, in the order
+            of their index
+    Returns:
+        np.ndarray: paper ID of each code, as a NumPy string array
+
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    packed = codes >= 0
+    if packed.any():
+        number = codes[packed] % 100000
+        length = codes[packed] // 100000 % 10
+        yymm = codes[packed] // 1000000
+        new_ids = np.strings.add(
+            np.strings.add(np.strings.zfill(yymm.astype(str), 4), "."),
+            np.strings.zfill(number.astype(str), length),
+        )
+    else:
+        # np.strings.zfill cannot take an empty array of widths
+        new_ids = np.empty(0, dtype=str)
+    other_ids = np.asarray(extra_ids, dtype=str)[-1 - codes[~packed]]
+    width = max(new_ids.dtype.itemsize, other_ids.dtype.itemsize) // 4
+    paper_ids = np.empty(len(codes), dtype=f"<U{max(width, 1)}")
+    paper_ids[packed] = new_ids
+    paper_ids[~packed] = other_ids
+    return paper_ids
+
+
+@dataclass(frozen=True)
+class PackedQueues:
+    """Queues as integer arrays over a table of the unique paper IDs.
+
+    The queues are concatenated into `entries`, and queue `i` is
+    `entries[offsets[i] : offsets[i + 1]]`. Each entry is the index of the
+    paper in `ids`, the sorted codes of the unique paper IDs (see
+    `pack_paper_ids`), so set operations and overlap statistics between
+    queues are computed on small integers.
+
+    On disk, the arrays are saved as `ids.npy`, `entries.npy` and `offsets.npy`
+    in a `.queues` directory, with the queue names and the IDs that could not
+    be packed in `meta.json`.
+
+    Args:
+        names (list[str]): name of each queue
+        offsets (np.ndarray): start of each queue in `entries`, followed by the
+            number of entries
+        entries (np.ndarray): index into `ids` of each entry of the queues
+        ids (np.ndarray): sorted int64 codes of the unique paper IDs
+        extra_ids (list[str]): paper IDs that could not be packed
+
+    """
+
+    names: list[str]
+    offsets: np.ndarray
+    entries: np.ndarray
+    ids: np.ndarray
+    extra_ids: list[str]
+
+    @classmethod
+    def from_codes(
+        cls, names: list[str], queues: list[np.ndarray], extra_ids: dict[str, int]
+    ) -> "PackedQueues":
+        """Build the packed queues from the packed paper IDs of each queue."""
+        lengths = np.array([len(queue) for queue in queues], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        codes = np.concatenate(queues) if queues else np.empty(0, dtype=np.int64)
+        ids, entries = np.unique(codes, return_inverse=True)
+        return cls(
+            names=list(names),
+            offsets=offsets,
+            entries=entries.astype(np.min_scalar_type(max(len(ids) - 1, 0))),
+            ids=ids,
+            extra_ids=list(extra_ids),
+        )
+
+    @classmethod
+    def from_queues(cls, queues: Iterable[tuple[str, list[str]]]) -> "PackedQueues":
+        """Pack (queue name, paper IDs) tuples, e.g. from `iter_queues`."""
+        names, codes, extra_ids = [], [], {}
+        for name, queue in queues:
+            names.append(name)
+            codes.append(pack_paper_ids(queue, extra_ids))
+        return cls.from_codes(names, codes, extra_ids)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "PackedQueues":
+        """Load packed queues saved by `save`, memory-mapping the arrays by default."""
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        if meta["version"] != PACKED_VERSION:
+            raise ValueError(
+                f"{path} has version {meta['version']} instead of {PACKED_VERSION}"
+            )
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ["offsets", "entries", "ids"]
+        }
+        return cls(names=meta["names"], extra_ids=meta["extra_ids"], **arrays)
+
+    def save(self, path: str) -> None:
+        """Save the queues to a `.queues` directory, replacing any existing one."""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ["offsets", "entries", "ids"]:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "version": PACKED_VERSION,
+                    "names": self.names,
+                    "extra_ids": self.extra_ids,
+                },
+                f,
+            )
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[tuple[str, list[str]]]:
+        for i, name in enumerate(self.names):
+            yield name, self.decode(self.queue(i))
+
+    @cached_property
+    def paper_ids(self) -> np.ndarray:
+        """Paper ID of each code of `ids`."""
+        return unpack_paper_ids(self.ids, self.extra_ids)
+
+    @cached_property
+    def queue_of_entry(self) -> np.ndarray:
+        """Index of the queue of each entry."""
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.offsets))
+
+    def index(self, name: str) -> int:
+        """Get the index of a queue from its name."""
+        return self.names.index(name)
+
+    def queue(self, i: int) -> np.ndarray:
+        """Get the paper indices (into `ids`) of queue `i`."""
+        return self.entries[self.offsets[i] : self.offsets[i + 1]]
+
+    def decode(self, indices: np.ndarray) -> list[str]:
+        """Get the paper IDs of paper indices, e.g. of a set operation between queues."""
+        return self.paper_ids[indices].tolist()
+
+    def encode(self, paper_ids: Sequence[str]) -> np.ndarray:
+        """Get the paper indices of paper IDs, -1 for papers in no queue."""
+        extra_ids = {paper_id: i for i, paper_id in enumerate(self.extra_ids)}
+        num_extra = len(extra_ids)
+        codes = pack_paper_ids(paper_ids, extra_ids)
+        if len(self.ids) == 0:
+            return np.full(len(codes), -1)
+        indices = np.searchsorted(self.ids, codes).clip(max=len(self.ids) - 1)
+        found = (self.ids[indices] == codes) & (codes >= -num_extra)
+        return np.where(found, indices, -1)
+
+    def intersection(self, i: int, j: int) -> np.ndarray:
+        """Get the paper indices of the papers in both queue `i` and queue `j`."""
+        return np.intersect1d(self.queue(i), self.queue(j))
+
+    def union(self, i: int, j: int) -> np.ndarray:
+        """Get the paper indices of the papers in queue `i` or queue `j`."""
+        return np.union1d(self.queue(i), self.queue(j))
+
+    def difference(self, i: int, j: int) -> np.ndarray:
+        """Get the paper indices of the papers in queue `i` but not in queue `j`."""
+        return np.setdiff1d(self.queue(i), self.queue(j))
+
+    def paper_counts(self) -> np.ndarray:
+        """Count the number of queues each paper of `ids` is in."""
+        return np.bincount(self.entries, minlength=len(self.ids))
+
+    def overlap_matrix(self) -> np.ndarray:
+        """Count the papers shared by each pair of queues.
+
+        The counts are the products of queue-by-paper incidence matrices, built
+        over slices of the papers so that each matrix stays below
+        `MAX_INCIDENCE_SIZE` elements.
+
+        Returns:
+            np.ndarray: (queues, queues) matrix of the number of shared papers,
+                with the size of each queue on the diagonal
+
+        """
+        num_queues = len(self)
+        order = np.argsort(self.entries, kind="stable")
+        papers = self.entries[order]
+        queues = self.queue_of_entry[order]
+        # the slices are no wider than the number of papers
+        step = max(min(MAX_INCIDENCE_SIZE // max(num_queues, 1), len(self.ids)), 1)
+        bounds = np.searchsorted(papers, np.arange(0, len(self.ids) + step, step))
+        overlap = np.zeros((num_queues, num_queues), dtype=np.int64)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if start == end:
+                continue
+            first_paper = papers[start]
+            incidence = np.zeros((num_queues, step), dtype=np.float32)
+            incidence[queues[start:end], papers[start:end] - first_paper] = 1
+            # float32 products are exact below 2**24 papers per slice
+            overlap += (incidence @ incidence.T).astype(np.int64)
+        return overlap
+
+
+class _JSONObjectReader:
+    """Read the members of a top-level JSON object one at a time.
+
+    Args:
+        f (TextIO): file containing a JSON object
+        chunk_size (int): number of characters read at a time
+
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Read more of the file into the buffer. Returns False at the end of the file."""
+        if self.eof:
+            return False
+        # read at least as much as is buffered, so that a long value is
+        # decoded in a logarithmic number of attempts
+        chunk = self.f.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def _peek(self) -> str:
+        """Skip whitespace and get the next character ("" at the end of the file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def _expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of `chars`."""
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} but found {char!r} in "
+                f"{getattr(self.f, 'name', 'the stream')}"
+            )
+        self.pos += 1
+        return char
+
+    def _decode(self) -> Any:
+        """Decode the next JSON value, reading more of the file as needed."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer may continue in the file
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def __iter__(self) -> Iterator[tuple[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._decode()
+            self._expect(":")
+            yield key, self._decode()
+            if self._expect(",}") == "}":
+                return
+
+
+def iter_queues(path: str) -> Iterator[tuple[str, list[str]]]:
+    """Read the queues of a queue file one at a time.
+
+    Args:
+        path (str): path to a `.json`, `.jsonl` or `.queues` queue file
+    Returns:
+        Iterator of (queue name, paper IDs) tuples, in the order of the file
+
+    """
+    if path.rstrip("/").endswith(PACKED_EXTENSION):
+        yield from PackedQueues.load(path)
+        return
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    queue = json.loads(line)
+                    yield queue["name"], queue["queue"]
+        else:
+            yield from _JSONObjectReader(f)
+
+
+def load_packed_queues(path: str) -> PackedQueues:
+    """Load a queue file of any format as packed queues.
+
+    Args:
+        path (str): path to a `.json`, `.jsonl` or `.queues` queue file
+    Returns:
+        PackedQueues: queues of the file (memory-mapped for a `.queues` file)
+
+    """
+    if path.rstrip("/").endswith(PACKED_EXTENSION):
+        return PackedQueues.load(path)
+    return PackedQueues.from_queues(iter_queues(path))
+
+
+class QueueFileWriter:
+    """Write a queue file one queue at a time.
+
+    The file is written to a temporary path and moved into place when the
+    writer is closed, so a failed write does not leave a truncated file.
+    Packed queues are saved when the writer is closed, and only the packed
+    paper IDs are kept in memory until then.
+
+    Args:
+        path (str): path to a `.json`, `.jsonl` or `.queues` queue file
+
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path.rstrip("/")
+        self.jsonl = path.endswith(".jsonl")
+        self.packed = self.path.endswith(PACKED_EXTENSION)
+        self.num_queues = 0
+        if self.packed:
+            self._names, self._codes, self._extra_ids = [], [], {}
+            return
+        self._f = open(f"{path}.tmp", "w")
+        if not self.jsonl:
+            self._f.write("{")
+
+    def write(self, name: str, queue: list[str]) -> None:
+        """Append a queue to the file."""
+        if self.packed:
+            self._names.append(name)
+            self._codes.append(pack_paper_ids(queue, self._extra_ids))
+        elif self.jsonl:
+            self._f.write(json.dumps({"name": name, "queue": queue}) + "\n")
+        else:
+            # same layout as json.dump(queues, f, indent=4)
+            separator = "," if self.num_queues else ""
+            value = json.dumps(queue, indent=4).replace("\n", "\n    ")
+            self._f.write(f"{separator}\n    {json.dumps(name)}: {value}")
+        self.num_queues += 1
+
+    def close(self) -> None:
+        """Finish the file and move it into place."""
+        if self.packed:
+            PackedQueues.from_codes(self._names, self._codes, self._extra_ids).save(
+                self.path
+            )
+            return
+        if not self.jsonl:
+            self._f.write("\n}" if self.num_queues else "}")
+        self._f.close()
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def __enter__(self) -> "QueueFileWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self.close()
+        elif not self.packed:
+            self._f.close()
+            os.remove(f"{self.path}.tmp")
+
+
+def write_queues(path: str, queues: Iterable[tuple[str, list[str]]]) -> int:
+    """Write queues to a queue file.
+
+    Args:
+        path (str): path to a `.json`, `.jsonl` or `.queues` queue file
+        queues (Iterable[tuple[str, list[str]]]): (queue name, paper IDs) tuples
+    Returns:
+        int: number of written queues
+
+    """
+    with QueueFileWriter(path) as writer:
+        for name, queue in queues:
+            writer.write(name, queue)
+    return writer.num_queues
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Convert a queue file to another format")
+    parser.add_argument("source", type=str, help="Path to the queue file to convert")
+    parser.add_argument(
+        "destination", type=str, help="Path to the converted queue file"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    num_queues = write_queues(args.destination, iter_queues(args.source))
+    logger.info(
+        f"Converted {num_queues} queues from {args.source} to {args.destination}"
+    )
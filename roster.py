@@ -0,0 +1,71 @@
+"""Index of the moderators and their categories from the roster CSV.
+
+The CSV is parsed once per process and only parsed again when its
+modification time changes, so reruns of the app only do dict lookups.
+
+Example usage:
+```python
+roster = load_roster("data/mod_cats-2025-09-10.csv")
+roster.categories  # categories in the order of the CSV
+roster.moderators_by_category["astro-ph.CO: Cosmology and Nongalactic Astrophysics"]
+```
+"""
+
+import csv
+import logging
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Roster:
+    """Moderators and their categories.
+
+    Args:
+        categories (list[str]): categories in the order of their first appearance in the CSV
+        moderators_by_category (dict[str, list[str]]): sorted moderator names of each category
+        categories_by_moderator (dict[str, list[str]]): categories of each moderator
+
+    """
+
+    categories: list[str]
+    moderators_by_category: dict[str, list[str]]
+    categories_by_moderator: dict[str, list[str]]
+
+
+@lru_cache(maxsize=8)
+def _load_roster(path: str, mtime_ns: int) -> Roster:
+    """Parse the roster CSV. Cached per path and modification time."""
+    logger.info(f"Loading roster from {path}")
+    moderators_by_category: dict[str, list[str]] = {}
+    categories_by_moderator: dict[str, list[str]] = {}
+    with open(path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            name = f"{row['First name']} {row['Last name']}"
+            category = row["Category"]
+            moderators_by_category.setdefault(category, []).append(name)
+            categories_by_moderator.setdefault(name, []).append(category)
+    return Roster(
+        categories=list(moderators_by_category),
+        moderators_by_category={
+            category: sorted(names)
+            for category, names in moderators_by_category.items()
+        },
+        categories_by_moderator=categories_by_moderator,
+    )
+
+
+def load_roster(path: str) -> Roster:
+    """Load the roster, parsing the CSV only if it changed since the last call.
+
+    Args:
+        path (str): path to the roster CSV with the columns
+            "First name", "Last name" and "Category"
+    Returns:
+        Roster: index of the moderators and their categories
+
+    """
+    return _load_roster(path, os.stat(path).st_mtime_ns)
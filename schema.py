@@ -0,0 +1,201 @@
+"""Compact, versioned encoding of moderation results.
+
+Version 1 results store the values of the decision enums (full sentences)
+and the full category ("astro-ph.CO: Cosmology and Nongalactic Astrophysics").
+Version 2 results are marked with `schema_version: 2` and store small integer
+codes for the decisions and only the category code ("astro-ph.CO"). The field
+names are the same in both versions, so results can be decoded and queried
+regardless of their version (see `decode_result` and `category_filter`).
+
+Use `migrate_results.py` to convert the results of a collection to the
+current version.
+"""
+
+from decisions import (
+    PrimaryDecision,
+    SecondaryDecisionUponGoodOK,
+    SecondaryDecisionUponBad,
+)
+
+SCHEMA_VERSION = 2
+
+# NOTE: the codes are stored in the results, so they must never be changed or reused
+PRIMARY_CODES = {
+    PrimaryDecision.GREAT_FIT: 0,
+    PrimaryDecision.GOOD_FIT: 1,
+    PrimaryDecision.OK_FIT: 2,
+    PrimaryDecision.BAD_FIT: 3,
+}
+SECONDARY_UPON_GOOD_OK_CODES = {
+    SecondaryDecisionUponGoodOK.GOOD_FIT: 0,
+    SecondaryDecisionUponGoodOK.OK_FIT: 1,
+    SecondaryDecisionUponGoodOK.BAD_FIT: 2,
+    SecondaryDecisionUponGoodOK.N_A: 3,
+}
+SECONDARY_UPON_BAD_CODES = {
+    SecondaryDecisionUponBad.GREAT_FIT: 0,
+    SecondaryDecisionUponBad.OK_FIT: 1,
+    SecondaryDecisionUponBad.BAD_FIT: 2,
+    SecondaryDecisionUponBad.N_A: 3,
+}
+# decoder tables: code -> decision
+PRIMARY_DECISIONS = {code: decision for decision, code in PRIMARY_CODES.items()}
+SECONDARY_UPON_GOOD_OK_DECISIONS = {
+    code: decision for decision, code in SECONDARY_UPON_GOOD_OK_CODES.items()
+}
+SECONDARY_UPON_BAD_DECISIONS = {
+    code: decision for decision, code in SECONDARY_UPON_BAD_CODES.items()
+}
+
+SecondaryDecision = SecondaryDecisionUponGoodOK | SecondaryDecisionUponBad
+
+
+def category_code(category: str) -> str:
+    """Get the code of a category, e.g. "astro-ph.CO" for "astro-ph.CO: Cosmology...".
+
+    Args:
+        category (str): category with or without its description
+    Returns:
+        str: category code
+
+    """
+    return category.split(":")[0]
+
+
+def category_filter(category: str) -> tuple[str, str, str | list[str]]:
+    """Get the filter matching the results of a category in either schema version.
+
+    Args:
+        category (str): category with or without its description
+    Returns:
+        Filter: filter on the `category` field
+
+    """
+    code = category_code(category)
+    if code == category:
+        return ("category", "==", code)
+    return ("category", "in", [code, category])
+
+
+def encode_result(
+    mod_name: str,
+    current_cat: str,
+    paper_id: str,
+    decision_p: PrimaryDecision,
+    decision_s: SecondaryDecision | None,
+    updated_at: float,
+) -> dict:
+    """Encode a moderation result in the current schema version.
+
+    Args:
+        mod_name (str): name of the moderator
+        current_cat (str): category
+        paper_id (str): arXiv paper ID
+        decision_p (PrimaryDecision): primary decision
+        decision_s (SecondaryDecisionUponGoodOK | SecondaryDecisionUponBad | None): secondary decision
+        updated_at (float): time of the result in seconds since the epoch
+    Returns:
+        dict: result document
+
+    """
+    if decision_s is None:
+        code_s = None
+    elif isinstance(decision_s, SecondaryDecisionUponBad):
+        code_s = SECONDARY_UPON_BAD_CODES[decision_s]
+    else:
+        code_s = SECONDARY_UPON_GOOD_OK_CODES[decision_s]
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "name": mod_name,
+        "category": category_code(current_cat),
+        "paper_id": paper_id,
+        "primary_decision": PRIMARY_CODES[decision_p],
+        "secondary_decision": code_s,
+        "updated_at": updated_at,
+    }
+
+
+def decode_primary(value: int | str) -> PrimaryDecision:
+    """Decode a stored primary decision of either schema version.
+
+    Args:
+        value (int | str): code, or enum value for version 1 results
+    Returns:
+        PrimaryDecision: primary decision
+
+    """
+    if isinstance(value, str):
+        return PrimaryDecision(value)
+    return PRIMARY_DECISIONS[value]
+
+
+def decode_secondary(
+    value: int | str | None, decision_p: PrimaryDecision
+) -> SecondaryDecision | None:
+    """Decode a stored secondary decision of either schema version.
+
+    The secondary decision options depend on the primary decision.
+
+    Args:
+        value (int | str | None): code, enum value for version 1 results, or None
+        decision_p (PrimaryDecision): primary decision of the result
+    Returns:
+        SecondaryDecisionUponGoodOK | SecondaryDecisionUponBad | None: secondary decision
+
+    """
+    if value is None:
+        return None
+    upon_bad = decision_p == PrimaryDecision.BAD_FIT
+    if isinstance(value, str):
+        enum = SecondaryDecisionUponBad if upon_bad else SecondaryDecisionUponGoodOK
+        return enum(value)
+    decisions = (
+        SECONDARY_UPON_BAD_DECISIONS if upon_bad else SECONDARY_UPON_GOOD_OK_DECISIONS
+    )
+    return decisions[value]
+
+
+def decode_result(data: dict) -> dict:
+    """Decode a result document of either schema version.
+
+    Args:
+        data (dict): result document
+    Returns:
+        dict with the name, category code, paper_id, primary and secondary
+        decisions (as enums) and updated_at (None for old results) of the result
+
+    """
+    decision_p = decode_primary(data["primary_decision"])
+    return {
+        "name": data["name"],
+        "category": category_code(data["category"]),
+        "paper_id": data["paper_id"],
+        "primary_decision": decision_p,
+        "secondary_decision": decode_secondary(
+            data.get("secondary_decision"), decision_p
+        ),
+        "updated_at": data.get("updated_at"),
+    }
+
+
+def migrate_result(data: dict) -> dict:
+    """Convert a result document to the current schema version.
+
+    Args:
+        data (dict): result document of any schema version
+    Returns:
+        dict: result document in the current schema version
+
+    """
+    result = decode_result(data)
+    encoded = encode_result(
+        result["name"],
+        result["category"],
+        result["paper_id"],
+        result["primary_decision"],
+        result["secondary_decision"],
+        result["updated_at"],
+    )
+    if result["updated_at"] is None:
+        del encoded["updated_at"]
+    return encoded
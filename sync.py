@@ -0,0 +1,224 @@
+"""Differential push of documents to a collection.
+
+A manifest of content hashes of the pushed documents is stored alongside each
+collection (in the `<collection>__manifest` collection, sharded over a few
+documents to stay below Firestore's document size limit). When pushing again,
+only documents whose hash changed are written and documents that are no longer
+pushed are deleted.
+
+A plain (non-differential) push with `push_collection` keeps the manifest up
+to date as well, so that a later differential push does not trust the hashes
+of documents it overwrote.
+"""
+
+import hashlib
+import json
+import logging
+import zlib
+from collections.abc import Iterable, Iterator, Mapping
+from backend import Backend, Write
+from batch_writer import ChunkedBatchWriter
+
+logger = logging.getLogger(__name__)
+
+# Number of documents the manifest of a collection is split into
+NUM_MANIFEST_SHARDS = 16
+
+
+def hash_doc(data: dict) -> str:
+    """Compute the content hash of a document.
+
+    Args:
+        data (dict): document
+    Returns:
+        str: hex digest of the document
+
+    """
+    return hashlib.sha1(
+        json.dumps(data, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+
+
+def manifest_collection(collection: str) -> str:
+    """Get the name of the collection storing the manifest of `collection`."""
+    return f"{collection}__manifest"
+
+
+def _shard(doc_id: str) -> str:
+    """Get the manifest shard of a document ID."""
+    digest = hashlib.sha1(doc_id.encode()).digest()
+    return f"shard-{digest[0] % NUM_MANIFEST_SHARDS:02d}"
+
+
+def load_manifest(backend: Backend, collection: str) -> dict[str, str] | None:
+    """Load the manifest of a collection.
+
+    Args:
+        backend (Backend): storage backend
+        collection (str): collection name
+    Returns:
+        dict mapping document IDs to content hashes, or None if there is no manifest
+
+    """
+    shards = backend.query(manifest_collection(collection))
+    if not shards:
+        return None
+    manifest = {}
+    for _, shard in shards:
+        manifest.update(json.loads(zlib.decompress(shard["hashes"])))
+    return manifest
+
+
+def save_manifest(backend: Backend, collection: str, manifest: dict[str, str]) -> None:
+    """Save the manifest of a collection, replacing the existing one.
+
+    Args:
+        backend (Backend): storage backend
+        collection (str): collection name
+        manifest (dict[str, str]): mapping of document IDs to content hashes
+
+    """
+    shards = {f"shard-{i:02d}": {} for i in range(NUM_MANIFEST_SHARDS)}
+    for doc_id, doc_hash in manifest.items():
+        shards[_shard(doc_id)][doc_id] = doc_hash
+    backend.commit_batch(
+        [
+            (
+                manifest_collection(collection),
+                shard_id,
+                {"hashes": zlib.compress(json.dumps(hashes).encode())},
+            )
+            for shard_id, hashes in shards.items()
+        ]
+    )
+
+
+def delete_manifest(backend: Backend, collection: str) -> None:
+    """Delete the manifest of a collection, so the next sync compares all documents."""
+    backend.commit_batch(
+        [
+            (manifest_collection(collection), f"shard-{i:02d}", None)
+            for i in range(NUM_MANIFEST_SHARDS)
+        ]
+    )
+
+
+def list_doc_ids(backend: Backend, collection: str) -> list[str]:
+    """List the IDs of all documents of a collection without reading their fields."""
+    return [doc_id for doc_id, _ in backend.query(collection, fields=[])]
+
+
+def sync_collection(
+    backend: Backend,
+    collection: str,
+    docs: Mapping[str, dict] | Iterable[tuple[str, dict]],
+    writer: ChunkedBatchWriter,
+    delete_removed: bool = True,
+    dry_run: bool = False,
+) -> tuple[int, int]:
+    """Write only the added or changed documents and delete the removed ones.
+
+    Without a manifest (e.g. the first differential push to an existing
+    collection), all documents are written and the removed documents are found
+    by listing the document IDs of the collection.
+
+    The documents are hashed and written as they are read from `docs`, so only
+    their hashes are kept in memory when `docs` is a generator.
+
+    Args:
+        backend (Backend): storage backend
+        collection (str): collection name
+        docs (Mapping[str, dict] | Iterable[tuple[str, dict]]): all documents
+            that should be in the collection, or (document ID, document) tuples
+        writer (ChunkedBatchWriter): writer used to commit the changes
+        delete_removed (bool): whether to delete documents not in `docs`
+        dry_run (bool): only report the changes without writing them
+    Returns:
+        num_written (int): number of added or changed documents
+        num_deleted (int): number of deleted documents
+
+    """
+    manifest = load_manifest(backend, collection)
+    if manifest is None:
+        logger.warning(f"No manifest found for {collection}, writing all documents")
+        manifest = {}
+        existing_ids = list_doc_ids(backend, collection) if delete_removed else []
+    else:
+        existing_ids = list(manifest)
+
+    hashes = {}
+    changed_ids = []
+    removed_ids = []
+
+    def iter_changes() -> Iterator[Write]:
+        items = docs.items() if isinstance(docs, Mapping) else docs
+        for doc_id, data in items:
+            doc_hash = hashes[doc_id] = hash_doc(data)
+            if manifest.get(doc_id) != doc_hash:
+                changed_ids.append(doc_id)
+                yield collection, doc_id, data
+        # the removed documents are only known once all documents are read
+        if delete_removed:
+            removed_ids.extend(
+                doc_id for doc_id in existing_ids if doc_id not in hashes
+            )
+        for doc_id in removed_ids:
+            yield collection, doc_id, None
+
+    if dry_run:
+        for _ in iter_changes():
+            pass
+    else:
+        writer.commit(iter_changes())
+    logger.info(
+        f"{collection}: {len(changed_ids)} added or changed, {len(removed_ids)} removed, "
+        f"{len(hashes) - len(changed_ids)} unchanged"
+    )
+    if dry_run:
+        return len(changed_ids), len(removed_ids)
+    if not delete_removed:
+        # keep the hashes of documents that were left in place
+        hashes = {**manifest, **hashes}
+    save_manifest(backend, collection, hashes)
+    return len(changed_ids), len(removed_ids)
+
+
+def push_collection(
+    backend: Backend,
+    collection: str,
+    docs: Mapping[str, dict] | Iterable[tuple[str, dict]],
+    writer: ChunkedBatchWriter,
+) -> int:
+    """Write all documents, overwriting existing ones, and update the manifest.
+
+    The manifest is deleted before writing and saved again once all documents
+    are written, with the hashes of the written documents replacing the old
+    ones. A failed push therefore leaves no manifest, and the next sync falls
+    back to comparing all documents. Without an existing manifest, none is
+    saved, since the hashes of the documents that were not pushed are unknown.
+
+    Args:
+        backend (Backend): storage backend
+        collection (str): collection name
+        docs (Mapping[str, dict] | Iterable[tuple[str, dict]]): documents to
+            write, or (document ID, document) tuples
+        writer (ChunkedBatchWriter): writer used to commit the documents
+    Returns:
+        int: number of written documents
+
+    """
+    manifest = load_manifest(backend, collection)
+    if manifest is not None:
+        delete_manifest(backend, collection)
+    hashes = {}
+
+    def iter_writes() -> Iterator[Write]:
+        items = docs.items() if isinstance(docs, Mapping) else docs
+        for doc_id, data in items:
+            hashes[doc_id] = hash_doc(data)
+            yield collection, doc_id, data
+
+    writer.commit(iter_writes())
+    if manifest is not None:
+        save_manifest(backend, collection, {**manifest, **hashes})
+    return len(hashes)
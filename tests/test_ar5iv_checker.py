@@ -0,0 +1,131 @@
+"""Tests of `Ar5ivChecker` against a local stub ar5iv server.
+
+The stub server answers according to the prefix of the requested paper ID:
+- `ok-*`: 200
+- `redirect-*`: 302 (ar5iv redirects to arXiv when it has no page)
+- `missing-*`: 404
+- `flaky-*`: 503 on the first request, then 200
+- `down-*`: always 503
+- `stalled-*`: answers after `STALL_SECONDS`
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ar5iv_checker import Ar5ivChecker
+
+STATUS_CODES = {"ok": 200, "redirect": 302, "missing": 404, "down": 503}
+STALL_SECONDS = 1.0
+
+
+class StubAr5ivHandler(BaseHTTPRequestHandler):
+    """Answer `GET /html/<paper_id>` according to the prefix of the paper ID."""
+
+    def do_GET(self) -> None:
+        """Answer a request and record its time."""
+        paper_id = self.path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            self.server.requests[paper_id] += 1
+            self.server.times.append(time.monotonic())
+            num_requests = self.server.requests[paper_id]
+        prefix = paper_id.split("-")[0]
+        if prefix == "flaky":
+            status = 503 if num_requests == 1 else 200
+        elif prefix == "stalled":
+            time.sleep(STALL_SECONDS)
+            status = 200
+        else:
+            status = STATUS_CODES[prefix]
+        self.send_response(status)
+        if status == 302:
+            self.send_header("Location", f"https://arxiv.org/abs/{paper_id}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: object) -> None:
+        """Silence the log of each request."""
+
+
+class Ar5ivCheckerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Start the stub server in a thread."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubAr5ivHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = Counter()
+        self.server.times = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/html"
+
+    def tearDown(self) -> None:
+        """Stop the stub server."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def make_checker(self, **kwargs: object) -> Ar5ivChecker:
+        """Create a checker of the stub server that retries without waiting."""
+        return Ar5ivChecker(base_url=self.base_url, max_workers=4, min_wait=0, **kwargs)
+
+    def test_status_codes(self) -> None:
+        """A 200 is available, a redirect or a 404 is not."""
+        checker = self.make_checker(rate=100)
+        self.assertTrue(checker.check("ok-1"))
+        self.assertFalse(checker.check("redirect-1"))
+        self.assertFalse(checker.check("missing-1"))
+
+    def test_5xx_is_retried(self) -> None:
+        """A 503 is retried until the attempts run out."""
+        checker = self.make_checker(rate=100, max_attempts=2)
+        self.assertTrue(checker.check("flaky-1"))
+        self.assertEqual(self.server.requests["flaky-1"], 2)
+        # a page that keeps failing is reported as a failed check
+        self.assertEqual(checker.check_many(["down-1"]), {"down-1": None})
+        self.assertEqual(self.server.requests["down-1"], 2)
+
+    def test_stalled_request_times_out(self) -> None:
+        """A request that gets no answer fails after the timeout."""
+        checker = self.make_checker(rate=100, max_attempts=1, timeout=0.2)
+        start = time.monotonic()
+        self.assertEqual(checker.check_many(["stalled-1"]), {"stalled-1": None})
+        self.assertLess(time.monotonic() - start, STALL_SECONDS)
+
+    def test_duplicates_are_requested_once(self) -> None:
+        """Each unique paper is requested once."""
+        checker = self.make_checker(rate=100)
+        paper_ids = ["ok-1", "redirect-1", "ok-1", "missing-1", "ok-1", "redirect-1"]
+        results = checker.check_many(paper_ids)
+        self.assertEqual(
+            results, {"ok-1": True, "redirect-1": False, "missing-1": False}
+        )
+        self.assertEqual(
+            self.server.requests, Counter({"ok-1": 1, "redirect-1": 1, "missing-1": 1})
+        )
+
+    def test_rate_is_capped(self) -> None:
+        """The token bucket caps the request rate after the initial burst."""
+        rate = 20
+        num_papers = 2 * rate
+        checker = self.make_checker(rate=rate)
+        start = time.monotonic()
+        checker.check_many([f"ok-{i}" for i in range(num_papers)])
+        # the first `rate` requests are a burst, the others are spaced by 1 / rate
+        self.assertGreaterEqual(
+            time.monotonic() - start, 0.9 * (num_papers - rate) / rate
+        )
+        times = sorted(self.server.times)
+        # after the burst, the requests arrive at no more than `rate` per second
+        self.assertGreaterEqual(
+            times[-1] - times[rate], 0.9 * (num_papers - 1 - rate) / rate
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+"""Tests of `ChunkedBatchWriter` against an in-memory `SQLiteBackend`.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from backend import SQLiteBackend, Write
+from batch_writer import ChunkedBatchWriter
+
+try:
+    from google.api_core.exceptions import ResourceExhausted
+except ImportError:
+    ResourceExhausted = None
+
+COLLECTION = "paper_info"
+
+
+class FlakyBackend(SQLiteBackend):
+    """Backend whose commits of the chunk at `fail_index` raise `error`.
+
+    Args:
+        fail_index (int | None): index of the failing commit, or None
+        error (Exception | None): error raised by the failing commit
+        num_failures (int): number of times the failing commit raises
+
+    """
+
+    def __init__(
+        self,
+        fail_index: int | None = None,
+        error: Exception | None = None,
+        num_failures: int = 1,
+    ) -> None:
+        super().__init__(":memory:")
+        self.fail_index = fail_index
+        self.error = error
+        self.num_failures = num_failures
+        # first document ID of each committed chunk, in the order of the commits
+        self.commits: list[str] = []
+        self.attempts = 0
+
+    def commit_batch(self, writes: list[Write]) -> None:
+        """Commit a batch, failing on the configured chunk."""
+        failing = (
+            self.fail_index is not None and writes[0][1] == f"doc-{self.fail_index:03d}"
+        )
+        if failing and self.num_failures > 0:
+            self.attempts += 1
+            self.num_failures -= 1
+            raise self.error
+        super().commit_batch(writes)
+        self.commits.append(writes[0][1])
+
+
+def make_writes(num_docs: int, version: int = 0) -> list[Write]:
+    """Make writes of `num_docs` documents."""
+    return [
+        (COLLECTION, f"doc-{i:03d}", {"i": i, "version": version})
+        for i in range(num_docs)
+    ]
+
+
+class ChunkedBatchWriterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a temporary directory for the checkpoint file."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.tmp_dir.name, "checkpoint.json")
+
+    def tearDown(self) -> None:
+        """Remove the temporary directory."""
+        self.tmp_dir.cleanup()
+
+    def test_all_writes_are_committed(self) -> None:
+        """Writes are committed in chunks of at most `chunk_size`."""
+        backend = FlakyBackend()
+        writer = ChunkedBatchWriter(backend, chunk_size=10, max_in_flight=3)
+        self.assertEqual(writer.commit(make_writes(95)), 10)
+        self.assertEqual(writer.num_writes, 95)
+        self.assertEqual(backend.count(COLLECTION), 95)
+
+    def test_resume_from_checkpoint(self) -> None:
+        """A failed push resumes after the chunks recorded in the checkpoint."""
+        backend = FlakyBackend(fail_index=30, error=RuntimeError("unavailable"))
+        writer = ChunkedBatchWriter(
+            backend,
+            chunk_size=10,
+            max_in_flight=1,
+            max_attempts=1,
+            checkpoint_path=self.checkpoint_path,
+        )
+        with self.assertRaises(RuntimeError):
+            writer.commit(make_writes(50))
+        with open(self.checkpoint_path) as f:
+            self.assertEqual(set(json.load(f)), {"0", "1", "2", "4"})
+
+        backend.commits = []
+        writer = ChunkedBatchWriter(
+            backend, chunk_size=10, checkpoint_path=self.checkpoint_path
+        )
+        self.assertEqual(writer.commit(make_writes(50)), 1)
+        self.assertEqual(backend.commits, ["doc-030"])
+        self.assertEqual(backend.count(COLLECTION), 50)
+        # the checkpoint is removed once all chunks are committed
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_changed_chunk_is_committed_again(self) -> None:
+        """A chunk whose writes changed since the checkpoint is not skipped."""
+        backend = FlakyBackend(fail_index=10, error=RuntimeError("unavailable"))
+        writer = ChunkedBatchWriter(
+            backend,
+            chunk_size=10,
+            max_in_flight=1,
+            max_attempts=1,
+            checkpoint_path=self.checkpoint_path,
+        )
+        with self.assertRaises(RuntimeError):
+            writer.commit(make_writes(20))
+
+        backend.commits = []
+        writer = ChunkedBatchWriter(
+            backend,
+            chunk_size=10,
+            max_in_flight=1,
+            checkpoint_path=self.checkpoint_path,
+        )
+        writer.commit(make_writes(20, version=1))
+        self.assertEqual(backend.commits, ["doc-000", "doc-010"])
+        self.assertEqual(backend.get(COLLECTION, "doc-000"), {"i": 0, "version": 1})
+
+    @unittest.skipIf(ResourceExhausted is None, "google-api-core is not installed")
+    @mock.patch("batch_writer.MIN_BACKOFF", 0.2)
+    def test_resource_exhausted_backs_off(self) -> None:
+        """RESOURCE_EXHAUSTED delays the retry by the shared backoff."""
+        backend = FlakyBackend(
+            fail_index=0, error=ResourceExhausted("quota"), num_failures=2
+        )
+        writer = ChunkedBatchWriter(backend, chunk_size=10, max_in_flight=1)
+        start = time.monotonic()
+        writer.commit(make_writes(10))
+        # the backoff doubles after each error: 0.2s, then 0.4s
+        self.assertGreaterEqual(time.monotonic() - start, 0.55)
+        self.assertEqual(backend.attempts, 2)
+        self.assertEqual(backend.count(COLLECTION), 10)
+        # successful commits speed up again
+        self.assertLess(writer._backoff, 0.4)
+
+    @unittest.skipIf(ResourceExhausted is None, "google-api-core is not installed")
+    @mock.patch("batch_writer.MIN_BACKOFF", 0.01)
+    def test_resource_exhausted_gives_up(self) -> None:
+        """RESOURCE_EXHAUSTED is re-raised once the attempts run out."""
+        backend = FlakyBackend(
+            fail_index=0, error=ResourceExhausted("quota"), num_failures=3
+        )
+        writer = ChunkedBatchWriter(
+            backend, chunk_size=10, max_in_flight=1, max_attempts=3
+        )
+        with self.assertRaises(ResourceExhausted):
+            writer.commit(make_writes(10))
+        self.assertEqual(backend.attempts, 3)
+
+    def test_google_is_not_imported(self) -> None:
+        """Committing to the SQLite backend does not import google-api-core."""
+        code = (
+            "import sys; from backend import SQLiteBackend; "
+            "from batch_writer import ChunkedBatchWriter; "
+            "ChunkedBatchWriter(SQLiteBackend(':memory:')).commit([('c', 'd', {})]); "
+            "assert not any(m.startswith('google') for m in sys.modules)"
+        )
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Tests of `build_queues` on a synthetic split and the committed roster.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import os
+import unittest
+from collections import Counter
+import numpy as np
+from build_queues import build_queues
+from roster import load_roster
+from schema import category_code
+
+ROSTER_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "mod_cats-2025-09-10.csv",
+)
+PAPERS_PER_CATEGORY = 60
+NUM_POS = 8
+NUM_NEG = 8
+SHARED_FRACTION = 0.25
+MAX_QUEUES = 4
+
+
+class BuildQueuesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Build a split with the categories of the roster and one more."""
+        cls.roster = load_roster(ROSTER_PATH)
+        codes = [category_code(category) for category in cls.roster.categories]
+        cls.categories = np.array(sorted(codes + ["other.XX"]))
+        num_papers = PAPERS_PER_CATEGORY * len(cls.categories)
+        cls.paper_ids = np.array([f"2309.{i:05d}" for i in range(num_papers)])
+        rng = np.random.default_rng(0)
+        cls.primary = rng.permutation(
+            np.repeat(
+                np.arange(len(cls.categories), dtype=np.int32), PAPERS_PER_CATEGORY
+            )
+        )
+        cls.primary_of = dict(zip(cls.paper_ids, cls.categories[cls.primary]))
+
+    def build(self, seed: int = 0) -> tuple[dict, dict]:
+        """Build the queues of the roster."""
+        return build_queues(
+            self.roster,
+            self.paper_ids,
+            self.primary,
+            self.categories,
+            NUM_POS,
+            NUM_NEG,
+            shared_fraction=SHARED_FRACTION,
+            max_queues=MAX_QUEUES,
+            seed=seed,
+        )
+
+    def category_queues(self, queues: dict, category: str) -> list[list[str]]:
+        """Get the queues of the moderators of a category."""
+        code = category_code(category)
+        return [
+            queues[f"{name}:{code}"]
+            for name in self.roster.moderators_by_category[category]
+        ]
+
+    def test_reproducible(self) -> None:
+        """The same arguments give the same queues and labels."""
+        with self.assertLogs("build_queues", level="WARNING"):
+            first = self.build()
+            second = self.build()
+        self.assertEqual(first, second)
+        # in the same order as well
+        self.assertEqual(list(first[0]), list(second[0]))
+        self.assertEqual(list(first[0].values()), list(second[0].values()))
+        self.assertNotEqual(self.build(seed=1)[0], first[0])
+
+    def test_max_queues_per_paper(self) -> None:
+        """No paper is in more than `max_queues` queues."""
+        with self.assertLogs("build_queues", level="WARNING"):
+            queues, _ = self.build()
+        self.assertEqual(
+            len(queues),
+            sum(len(names) for names in self.roster.moderators_by_category.values()),
+        )
+        usage = Counter(paper_id for queue in queues.values() for paper_id in queue)
+        self.assertLessEqual(max(usage.values()), MAX_QUEUES)
+        for queue in queues.values():
+            self.assertEqual(len(queue), len(set(queue)))
+
+    def test_labels(self) -> None:
+        """The positives of the queues of a category are its labelled positives."""
+        with self.assertLogs("build_queues", level="WARNING"):
+            queues, labels = self.build()
+        for category in self.roster.categories:
+            code = category_code(category)
+            pos, neg = set(labels[code]["pos"]), set(labels[code]["neg"])
+            self.assertEqual(len(pos), NUM_POS)
+            self.assertEqual(len(neg), NUM_NEG)
+            self.assertTrue(all(self.primary_of[paper_id] == code for paper_id in pos))
+            self.assertTrue(all(self.primary_of[paper_id] != code for paper_id in neg))
+            category_queues = self.category_queues(queues, category)
+            for queue in category_queues:
+                positives = {p for p in queue if self.primary_of[p] == code}
+                self.assertEqual(positives, pos & set(queue))
+                self.assertTrue(set(queue) <= pos | neg)
+            # together, the moderators of the category see all labelled papers
+            self.assertEqual(set().union(*category_queues), pos | neg)
+            if len(category_queues) == 1:
+                self.assertEqual(
+                    {p for p in category_queues[0] if self.primary_of[p] == code}, pos
+                )
+
+    def test_shared_papers(self) -> None:
+        """The shared papers are in the queue of every moderator of the category."""
+        with self.assertLogs("build_queues", level="WARNING") as logs:
+            queues, _ = self.build()
+        num_shared = int(SHARED_FRACTION * NUM_POS) + int(SHARED_FRACTION * NUM_NEG)
+        for category in self.roster.categories:
+            category_queues = self.category_queues(queues, category)
+            if len(category_queues) == 1:
+                continue
+            shared = set.intersection(*map(set, category_queues))
+            counts = Counter(p for queue in category_queues for p in queue)
+            if len(category_queues) > MAX_QUEUES:
+                # the papers cannot be in every queue, which is warned about
+                self.assertEqual(shared, set())
+                self.assertTrue(
+                    any(category_code(category) in line for line in logs.output)
+                )
+            else:
+                self.assertEqual(len(shared), num_shared)
+            # the other papers are split between the moderators
+            self.assertTrue(all(counts[p] == 1 for p in counts if p not in shared))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""Tests of `MetadataStore` on an in-memory store and exports in a temporary directory.
+
+The clock of the store is replaced so that staleness is tested without waiting.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from metadata_store import DAY, STORE_VERSION, MetadataStore
+
+NOW = 1_700_000_000.0
+
+
+def make_details(title: str) -> dict:
+    """Make the details of a paper."""
+    return {"title": title, "authors": "Jim Cline", "abstract": "An abstract."}
+
+
+class MetadataStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Replace the clock of the store and create a temporary directory."""
+        self.now = NOW
+        patcher = mock.patch("metadata_store.time")
+        self.addCleanup(patcher.stop)
+        patcher.start().time.side_effect = lambda: self.now
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def make_store(self, path: str = ":memory:", **kwargs: object) -> MetadataStore:
+        """Create a store whose negative ar5iv checks are stale after a day, the rest after 10."""
+        return MetadataStore(
+            path,
+            details_max_age=10 * DAY,
+            ar5iv_max_age=10 * DAY,
+            ar5iv_negative_max_age=DAY,
+            **kwargs,
+        )
+
+    def test_negative_ar5iv_checks_expire_sooner(self) -> None:
+        """A negative ar5iv check is stale after the shorter TTL, a positive one is not."""
+        store = self.make_store()
+        store.put_ar5iv_many({"2309.04535": True, "2309.01443": False})
+        self.now += DAY / 2
+        self.assertEqual(
+            store.get_ar5iv_many(["2309.04535", "2309.01443"]),
+            {"2309.04535": True, "2309.01443": False},
+        )
+        self.now += DAY
+        self.assertEqual(
+            store.get_ar5iv_many(["2309.04535", "2309.01443"]), {"2309.04535": True}
+        )
+        self.assertIsNone(store.get_ar5iv("2309.01443"))
+        self.now += 10 * DAY
+        self.assertEqual(store.get_ar5iv_many(["2309.04535", "2309.01443"]), {})
+
+    def test_stale_details(self) -> None:
+        """Details older than `details_max_age` are not returned."""
+        store = self.make_store()
+        store.put_details("2309.04535", make_details("Title"))
+        self.now += 9 * DAY
+        self.assertEqual(store.get_details("2309.04535"), make_details("Title"))
+        self.now += 2 * DAY
+        self.assertIsNone(store.get_details("2309.04535"))
+
+    def test_eviction(self) -> None:
+        """Past `max_papers`, the papers fetched longest ago are evicted."""
+        store = self.make_store(max_papers=10)
+        paper_ids = [f"2309.{i:05d}" for i in range(11)]
+        for paper_id in paper_ids:
+            store.put_ar5iv(paper_id, True)
+            self.now += 1
+        # 11 papers exceed the bound, so 11 - 10 + 10 // 10 papers are evicted
+        self.assertEqual(len(store), 9)
+        self.assertEqual(set(store.get_ar5iv_many(paper_ids)), set(paper_ids[2:]))
+
+    def test_eviction_keeps_refetched_papers(self) -> None:
+        """A paper fetched again is evicted after the papers fetched since."""
+        store = self.make_store(max_papers=3)
+        for paper_id in ["2309.00001", "2309.00002", "2309.00003"]:
+            store.put_ar5iv(paper_id, True)
+            self.now += 1
+        store.put_details("2309.00001", make_details("Title"))
+        self.now += 1
+        store.put_ar5iv("2309.00004", True)
+        self.assertEqual(
+            set(store.get_ar5iv_many(["2309.00001", "2309.00002", "2309.00003"])),
+            {"2309.00001", "2309.00003"},
+        )
+
+    def test_import_keeps_newer_entries(self) -> None:
+        """On conflict, import keeps the most recently fetched details and checks."""
+        old = self.make_store()
+        old.put_details_many(
+            {"2309.04535": make_details("Old"), "2309.01443": make_details("Old")}
+        )
+        old.put_ar5iv("2309.04535", False)
+        self.now += 1
+        new = self.make_store()
+        new.put_details("2309.04535", make_details("New"))
+        new.put_ar5iv("2309.01443", True)
+
+        path = os.path.join(self.tmp_dir.name, "paper-metadata.jsonl")
+        self.assertEqual(new.export(path), 2)
+        self.assertEqual(old.import_(path), 2)
+        self.assertEqual(
+            old.get_details_many(["2309.04535", "2309.01443"]),
+            {"2309.04535": make_details("New"), "2309.01443": make_details("Old")},
+        )
+        # the older check of 2309.04535 is kept since the export has none
+        self.assertEqual(
+            old.get_ar5iv_many(["2309.04535", "2309.01443"]),
+            {"2309.04535": False, "2309.01443": True},
+        )
+
+        # importing the older entries back does not overwrite the newer ones
+        self.assertEqual(old.export(path), 2)
+        new.put_details("2309.04535", make_details("Newer"))
+        new.import_(path)
+        self.assertEqual(new.get_details("2309.04535"), make_details("Newer"))
+        self.assertEqual(new.get_details("2309.01443"), make_details("Old"))
+
+    def test_import_checks_version(self) -> None:
+        """An export of another version is rejected."""
+        path = os.path.join(self.tmp_dir.name, "paper-metadata.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"version": STORE_VERSION + 1}) + "\n")
+            f.write(json.dumps({"paper_id": "2309.04535", "fetched_at": NOW}) + "\n")
+        store = self.make_store()
+        with self.assertRaises(ValueError):
+            store.import_(path)
+        self.assertEqual(len(store), 0)
+
+    def test_store_of_another_version_is_discarded(self) -> None:
+        """A store file of another version is rebuilt."""
+        path = os.path.join(self.tmp_dir.name, "paper-metadata.db")
+        store = self.make_store(path)
+        store.put_ar5iv("2309.04535", True)
+        store._conn.close()
+        conn = sqlite3.connect(path)
+        conn.execute(f"PRAGMA user_version = {STORE_VERSION + 1}")
+        conn.close()
+        with self.assertLogs("metadata_store", level="WARNING"):
+            store = self.make_store(path)
+        self.assertEqual(len(store), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+"""Tests of the progress documents against an in-memory `SQLiteBackend`.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import unittest
+from backend import SQLiteBackend
+from decisions import PrimaryDecision, SecondaryDecisionUponGoodOK
+from progress import (
+    completed_positions,
+    delete_with_progress,
+    queue_hash,
+    rebuild_progress,
+    submit_with_progress,
+)
+from schema import encode_result
+
+RESULTS = "mod_results"
+PROGRESS = "mod_progress"
+MOD_NAME = "Jim Cline"
+CATEGORY = "astro-ph.CO: Cosmology and Nongalactic Astrophysics"
+PROGRESS_ID = f"{MOD_NAME}:astro-ph.CO"
+QUEUE = ["1908.11218", "2309.04535", "2309.01443", "2310.00001", "2310.00002"]
+NUM_ZEROS = {decision.name: 0 for decision in PrimaryDecision}
+
+
+def result_id(paper_id: str) -> str:
+    """Format the ID of a result document like the app."""
+    return f"{MOD_NAME}_astro-ph.CO_{paper_id}"
+
+
+class ProgressTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create an empty backend."""
+        self.backend = SQLiteBackend(":memory:")
+
+    def submit(
+        self,
+        paper_id: str,
+        decision: PrimaryDecision,
+        queue: list[str] = QUEUE,
+    ) -> None:
+        """Submit a result of a paper of the queue like the app."""
+        decision_s = (
+            None
+            if decision == PrimaryDecision.GREAT_FIT
+            else SecondaryDecisionUponGoodOK.N_A
+        )
+        submit_with_progress(
+            self.backend,
+            RESULTS,
+            result_id(paper_id),
+            PROGRESS,
+            PROGRESS_ID,
+            encode_result(MOD_NAME, CATEGORY, paper_id, decision, decision_s, 0.0),
+            queue.index(paper_id),
+            len(queue),
+            queue_hash(queue),
+        )
+
+    def delete(self, paper_id: str) -> None:
+        """Delete the result of a paper of the queue like the app."""
+        delete_with_progress(
+            self.backend,
+            RESULTS,
+            result_id(paper_id),
+            PROGRESS,
+            PROGRESS_ID,
+            QUEUE.index(paper_id),
+        )
+
+    def progress(self) -> dict:
+        """Read the progress document."""
+        return self.backend.get(PROGRESS, PROGRESS_ID)
+
+    def test_first_submit(self) -> None:
+        """The first submit creates the progress document."""
+        self.submit(QUEUE[2], PrimaryDecision.GOOD_FIT)
+        progress = self.progress()
+        self.assertEqual(progress["queue_size"], len(QUEUE))
+        self.assertEqual(progress["queue_hash"], queue_hash(QUEUE))
+        self.assertEqual(completed_positions(progress), [2])
+        self.assertEqual(progress["num_completed"], 1)
+        self.assertEqual(progress["counts"], NUM_ZEROS | {"GOOD_FIT": 1})
+
+    def test_overwrite(self) -> None:
+        """Overwriting a result moves its count and does not count it twice."""
+        self.submit(QUEUE[0], PrimaryDecision.GREAT_FIT)
+        self.submit(QUEUE[1], PrimaryDecision.GREAT_FIT)
+        self.submit(QUEUE[0], PrimaryDecision.BAD_FIT)
+        progress = self.progress()
+        self.assertEqual(completed_positions(progress), [0, 1])
+        self.assertEqual(progress["num_completed"], 2)
+        self.assertEqual(progress["counts"], NUM_ZEROS | {"GREAT_FIT": 1, "BAD_FIT": 1})
+
+    def test_delete(self) -> None:
+        """Deleting a result unmarks it, and deleting it again is a no-op."""
+        self.submit(QUEUE[0], PrimaryDecision.OK_FIT)
+        self.submit(QUEUE[3], PrimaryDecision.GOOD_FIT)
+        self.delete(QUEUE[0])
+        self.delete(QUEUE[0])
+        progress = self.progress()
+        self.assertIsNone(self.backend.get(RESULTS, result_id(QUEUE[0])))
+        self.assertEqual(completed_positions(progress), [3])
+        self.assertEqual(progress["num_completed"], 1)
+        self.assertEqual(progress["counts"], NUM_ZEROS | {"GOOD_FIT": 1})
+
+    def test_rebuild_from_results(self) -> None:
+        """Rebuilding from the results gives the incrementally maintained document."""
+        self.submit(QUEUE[1], PrimaryDecision.GREAT_FIT)
+        self.submit(QUEUE[4], PrimaryDecision.BAD_FIT)
+        self.submit(QUEUE[1], PrimaryDecision.OK_FIT)
+        expected = self.progress()
+        self.backend.delete(PROGRESS, PROGRESS_ID)
+        rebuilt = rebuild_progress(
+            self.backend, RESULTS, PROGRESS, PROGRESS_ID, MOD_NAME, CATEGORY, QUEUE
+        )
+        self.assertEqual(rebuilt, expected)
+        self.assertEqual(self.progress(), expected)
+
+    def test_rebuild_does_not_overwrite(self) -> None:
+        """Without `overwrite`, an existing document is returned as is."""
+        self.submit(QUEUE[0], PrimaryDecision.GREAT_FIT)
+        expected = self.progress()
+        rebuilt = rebuild_progress(
+            self.backend, RESULTS, PROGRESS, PROGRESS_ID, MOD_NAME, CATEGORY, []
+        )
+        self.assertEqual(rebuilt, expected)
+
+    def test_queue_hash_mismatch(self) -> None:
+        """A queue re-pushed in another order is detected and rebuilt."""
+        self.submit(QUEUE[0], PrimaryDecision.GREAT_FIT)
+        self.submit(QUEUE[3], PrimaryDecision.BAD_FIT)
+        new_queue = QUEUE[::-1]
+        progress = self.progress()
+        # the size is unchanged, only the hash tells the queues apart
+        self.assertEqual(progress["queue_size"], len(new_queue))
+        self.assertNotEqual(progress["queue_hash"], queue_hash(new_queue))
+        rebuilt = rebuild_progress(
+            self.backend,
+            RESULTS,
+            PROGRESS,
+            PROGRESS_ID,
+            MOD_NAME,
+            CATEGORY,
+            new_queue,
+            overwrite=True,
+        )
+        self.assertEqual(rebuilt["queue_hash"], queue_hash(new_queue))
+        self.assertEqual(
+            {new_queue[position] for position in completed_positions(rebuilt)},
+            {QUEUE[0], QUEUE[3]},
+        )
+        self.assertEqual(self.progress(), rebuilt)
+        # later submits against the new queue update the rebuilt document
+        self.submit(QUEUE[2], PrimaryDecision.GOOD_FIT, queue=new_queue)
+        progress = self.progress()
+        self.assertEqual(progress["num_completed"], 3)
+        self.assertEqual(
+            progress["counts"],
+            NUM_ZEROS | {"GREAT_FIT": 1, "GOOD_FIT": 1, "BAD_FIT": 1},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
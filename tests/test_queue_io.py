@@ -0,0 +1,186 @@
+"""Tests of the queue file formats of `queue_io.py`.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from queue_io import (
+    PackedQueues,
+    _JSONObjectReader,
+    iter_queues,
+    pack_paper_ids,
+    unpack_paper_ids,
+    write_queues,
+)
+
+# IDs with lost trailing zeros, leading zeros, 4- and 5-digit numbers and old-style IDs
+PAPER_IDS = [
+    "2309.04535",
+    "2310.08",
+    "2308.0173",
+    "0704.0001",
+    "1501.00100",
+    "math/0501001",
+    "hep-th/9901001",
+    "2309.04535",
+    "math/0501001",
+]
+DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "mod-queue-all2023_v2-test-pos10-neg10.json",
+)
+QUEUES = {
+    "Jim Cline:astro-ph.CO": ["2309.04535", "2310.08", "math/0501001"],
+    "Gonzalo Alonso-Álvarez:astro-ph.CO": ["2310.08", "0704.0001"],
+    "Anonymous:cs.LG": [],
+    "Someone Else:hep-th": ["hep-th/9901001", "2309.04535", "1501.00100"],
+}
+
+
+class PackedQueuesTest(unittest.TestCase):
+    def test_pack_round_trip(self) -> None:
+        """Packed paper IDs unpack to the same IDs."""
+        extra_ids = {}
+        codes = pack_paper_ids(PAPER_IDS, extra_ids)
+        self.assertEqual(codes.dtype, np.int64)
+        self.assertEqual(list(extra_ids), ["math/0501001", "hep-th/9901001"])
+        # only the old-style IDs are interned
+        self.assertEqual(int((codes < 0).sum()), 3)
+        self.assertEqual(codes[0], codes[7])
+        self.assertEqual(unpack_paper_ids(codes, list(extra_ids)).tolist(), PAPER_IDS)
+
+    def test_pack_empty(self) -> None:
+        """An empty list of IDs packs to an empty array."""
+        codes = pack_paper_ids([], {})
+        self.assertEqual(len(codes), 0)
+        self.assertEqual(unpack_paper_ids(codes, []).tolist(), [])
+
+    def test_pack_old_style_only(self) -> None:
+        """IDs that are all interned unpack to the same IDs."""
+        extra_ids = {}
+        codes = pack_paper_ids(["math/0501001", "hep-th/9901001"], extra_ids)
+        self.assertEqual(
+            unpack_paper_ids(codes, list(extra_ids)).tolist(),
+            ["math/0501001", "hep-th/9901001"],
+        )
+
+    def test_packed_queues_round_trip(self) -> None:
+        """Queues saved to and loaded from a `.queues` directory are unchanged."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "mod-queue.queues")
+            self.assertEqual(write_queues(path, QUEUES.items()), len(QUEUES))
+            self.assertEqual(dict(iter_queues(path)), QUEUES)
+            packed = PackedQueues.load(path)
+            self.assertEqual(packed.names, list(QUEUES))
+            # each unique paper is stored once
+            self.assertEqual(len(packed.ids), 6)
+            self.assertEqual(packed.paper_counts().sum(), 8)
+            jim = packed.index("Jim Cline:astro-ph.CO")
+            other = packed.index("Someone Else:hep-th")
+            self.assertEqual(
+                packed.decode(packed.intersection(jim, other)), ["2309.04535"]
+            )
+            # papers in no queue are encoded as -1
+            indices = packed.encode(["2310.08", "2401.00001", "math/0501001"])
+            self.assertEqual(indices[1], -1)
+            self.assertEqual(
+                packed.decode(indices[[0, 2]]), ["2310.08", "math/0501001"]
+            )
+
+    def test_overlap_matrix(self) -> None:
+        """The overlap matrix counts the papers shared by each pair of queues."""
+        packed = PackedQueues.from_queues(QUEUES.items())
+        queues = [set(queue) for queue in QUEUES.values()]
+        expected = [[len(a & b) for b in queues] for a in queues]
+        self.assertEqual(packed.overlap_matrix().tolist(), expected)
+        # slices of fewer papers than the matrix give the same counts
+        with mock.patch("queue_io.MAX_INCIDENCE_SIZE", 2 * len(QUEUES)):
+            self.assertEqual(packed.overlap_matrix().tolist(), expected)
+
+    def test_data_file_round_trip(self) -> None:
+        """The queues of a data file survive the conversion to the packed format."""
+        with open(DATA_PATH, "r") as f:
+            queues = json.load(f)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "mod-queue.queues")
+            write_queues(path, iter_queues(DATA_PATH))
+            self.assertEqual(dict(iter_queues(path)), queues)
+
+
+class StreamingReaderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a temporary directory for the queue files."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        """Remove the temporary directory."""
+        self.tmp_dir.cleanup()
+
+    def assert_streamed(self, text: str) -> None:
+        """Check that streaming a JSON queue file gives the result of json.load."""
+        path = os.path.join(self.tmp_dir.name, "mod-queue.json")
+        with open(path, "w") as f:
+            f.write(text)
+        with open(path, "r") as f:
+            expected = json.load(f)
+        self.assertEqual(list(iter_queues(path)), list(expected.items()))
+        # tiny chunks split the names, the IDs and the separators between reads
+        with open(path, "r") as f:
+            self.assertEqual(
+                list(_JSONObjectReader(f, chunk_size=3)), list(expected.items())
+            )
+
+    def test_fixture(self) -> None:
+        """A small queue file is read like json.load, with or without indentation."""
+        self.assert_streamed(json.dumps(QUEUES, indent=4))
+        self.assert_streamed(json.dumps(QUEUES))
+        self.assert_streamed(json.dumps(QUEUES, separators=(",", ":")))
+
+    def test_empty_queue_file(self) -> None:
+        """A file without queues yields nothing."""
+        self.assert_streamed("{}")
+        self.assert_streamed(" {\n}\n")
+
+    def test_empty_queue(self) -> None:
+        """An empty queue is read as an empty list."""
+        self.assert_streamed(json.dumps({"Anonymous:cs.LG": []}, indent=4))
+
+    def test_single_moderator(self) -> None:
+        """A file with the queue of a single moderator is read in full."""
+        queue = {"Jim Cline:astro-ph.CO": [f"2309.{i:05d}" for i in range(1000)]}
+        self.assert_streamed(json.dumps(queue, indent=4))
+
+    def test_data_file(self) -> None:
+        """A data file of the repo is read like json.load."""
+        with open(DATA_PATH, "r") as f:
+            self.assert_streamed(f.read())
+
+    def test_writer_output(self) -> None:
+        """Files written by `write_queues` are read back in every JSON format."""
+        for extension in [".json", ".jsonl"]:
+            path = os.path.join(self.tmp_dir.name, f"mod-queue{extension}")
+            write_queues(path, QUEUES.items())
+            self.assertEqual(dict(iter_queues(path)), QUEUES)
+            write_queues(path, [])
+            self.assertEqual(list(iter_queues(path)), [])
+
+    def test_invalid_file(self) -> None:
+        """A file that is not a JSON object is rejected."""
+        with self.assertRaises(ValueError):
+            list(_JSONObjectReader(io.StringIO("[]")))
+        with self.assertRaises(ValueError):
+            list(_JSONObjectReader(io.StringIO('{"a": [] "b": []}')))
+
+
+if __name__ == "__main__":
+    unittest.main()
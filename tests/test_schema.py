@@ -0,0 +1,145 @@
+"""Tests of the result schema and its migration against an in-memory `SQLiteBackend`.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import unittest
+from backend import SQLiteBackend
+from batch_writer import ChunkedBatchWriter
+from decisions import (
+    PrimaryDecision,
+    SecondaryDecisionUponBad,
+    SecondaryDecisionUponGoodOK,
+)
+from migrate_results import iter_migrations
+from schema import SCHEMA_VERSION, category_filter, decode_result, encode_result
+
+RESULTS = "mod_results"
+TARGET = "mod_results_v2"
+CATEGORY = "astro-ph.CO: Cosmology and Nongalactic Astrophysics"
+
+# results as written by the app before the schema was versioned
+V1_RESULTS = {
+    "Jim Cline_astro-ph.CO_2309.04535": {
+        "name": "Jim Cline",
+        "category": CATEGORY,
+        "paper_id": "2309.04535",
+        "primary_decision": PrimaryDecision.BAD_FIT.value,
+        "secondary_decision": SecondaryDecisionUponBad.OK_FIT.value,
+        "updated_at": 1727740800.0,
+    },
+    "Jim Cline_astro-ph.CO_2309.01443": {
+        "name": "Jim Cline",
+        "category": CATEGORY,
+        "paper_id": "2309.01443",
+        "primary_decision": PrimaryDecision.GREAT_FIT.value,
+        "secondary_decision": None,
+        "updated_at": 1727740900.0,
+    },
+    "Jim Cline_astro-ph.CO_1908.11218": {
+        "name": "Jim Cline",
+        "category": CATEGORY,
+        "paper_id": "1908.11218",
+        "primary_decision": PrimaryDecision.GOOD_FIT.value,
+        "secondary_decision": SecondaryDecisionUponGoodOK.N_A.value,
+    },
+}
+V2_RESULTS = {
+    "Jim Cline_astro-ph.CO_2310.08633": encode_result(
+        "Jim Cline",
+        CATEGORY,
+        "2310.08633",
+        PrimaryDecision.OK_FIT,
+        SecondaryDecisionUponGoodOK.BAD_FIT,
+        1727741000.0,
+    ),
+}
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a backend with the v1 and v2 results."""
+        self.backend = SQLiteBackend(":memory:")
+        self.backend.commit_batch(
+            [
+                (RESULTS, doc_id, data)
+                for doc_id, data in {**V1_RESULTS, **V2_RESULTS}.items()
+            ]
+        )
+
+    def migrate(self, target_collection: str = RESULTS) -> dict[str, int]:
+        """Migrate the results in pages of 2 and get the statistics."""
+        stats = {"read": 0, "migrated": 0, "bytes_before": 0, "bytes_after": 0}
+        writes = iter_migrations(self.backend, RESULTS, target_collection, 2, stats)
+        ChunkedBatchWriter(self.backend, chunk_size=3).commit(writes)
+        return stats
+
+    def test_v1_results_are_migrated(self) -> None:
+        """v1 results are rewritten in v2 and decode to the same enums."""
+        stats = self.migrate()
+        self.assertEqual(stats["read"], 4)
+        self.assertEqual(stats["migrated"], 3)
+        self.assertLess(stats["bytes_after"], stats["bytes_before"])
+        for doc_id, data in V1_RESULTS.items():
+            migrated = self.backend.get(RESULTS, doc_id)
+            self.assertEqual(migrated["schema_version"], SCHEMA_VERSION)
+            self.assertEqual(migrated["category"], "astro-ph.CO")
+            self.assertEqual(decode_result(migrated), decode_result(data))
+        decoded = decode_result(
+            self.backend.get(RESULTS, "Jim Cline_astro-ph.CO_2309.04535")
+        )
+        self.assertEqual(decoded["primary_decision"], PrimaryDecision.BAD_FIT)
+        self.assertEqual(decoded["secondary_decision"], SecondaryDecisionUponBad.OK_FIT)
+        decoded = decode_result(
+            self.backend.get(RESULTS, "Jim Cline_astro-ph.CO_2309.01443")
+        )
+        self.assertEqual(decoded["primary_decision"], PrimaryDecision.GREAT_FIT)
+        self.assertIsNone(decoded["secondary_decision"])
+        # a result without a time is not given one
+        migrated = self.backend.get(RESULTS, "Jim Cline_astro-ph.CO_1908.11218")
+        self.assertNotIn("updated_at", migrated)
+        self.assertIsNone(decode_result(migrated)["updated_at"])
+        for doc_id, data in V2_RESULTS.items():
+            self.assertEqual(self.backend.get(RESULTS, doc_id), data)
+
+    def test_second_run_migrates_nothing(self) -> None:
+        """Running the migration again leaves every result untouched."""
+        self.migrate()
+        before = dict(self.backend.query(RESULTS))
+        stats = self.migrate()
+        self.assertEqual(stats["read"], 4)
+        self.assertEqual(stats["migrated"], 0)
+        self.assertEqual(dict(self.backend.query(RESULTS)), before)
+
+    def test_category_filter_finds_both_versions(self) -> None:
+        """The category filter matches v1 and v2 results of a category."""
+        expected = set(V1_RESULTS) | set(V2_RESULTS)
+        filters = [("name", "==", "Jim Cline"), category_filter(CATEGORY)]
+        found = {doc_id for doc_id, _ in self.backend.query(RESULTS, filters)}
+        self.assertEqual(found, expected)
+        # and all of them once migrated
+        self.migrate()
+        found = {doc_id for doc_id, _ in self.backend.query(RESULTS, filters)}
+        self.assertEqual(found, expected)
+
+    def test_target_collection(self) -> None:
+        """Migrating to another collection copies v2 results unchanged."""
+        source = dict(self.backend.query(RESULTS))
+        stats = self.migrate(TARGET)
+        self.assertEqual(stats["migrated"], 3)
+        # the source collection is left as it was
+        self.assertEqual(dict(self.backend.query(RESULTS)), source)
+        target = dict(self.backend.query(TARGET))
+        self.assertEqual(set(target), set(V1_RESULTS) | set(V2_RESULTS))
+        for doc_id, data in V2_RESULTS.items():
+            self.assertEqual(target[doc_id], data)
+        for doc_id, data in V1_RESULTS.items():
+            self.assertEqual(target[doc_id]["schema_version"], SCHEMA_VERSION)
+            self.assertEqual(decode_result(target[doc_id]), decode_result(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
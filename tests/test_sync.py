@@ -0,0 +1,89 @@
+"""Tests of the differential push of `sync.py` against an in-memory `SQLiteBackend`.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import unittest
+from backend import SQLiteBackend, Write
+from batch_writer import ChunkedBatchWriter
+from sync import load_manifest, push_collection, sync_collection
+
+COLLECTION = "mod_queues"
+
+
+class CountingBackend(SQLiteBackend):
+    """Backend counting the document writes of `COLLECTION`."""
+
+    def __init__(self) -> None:
+        super().__init__(":memory:")
+        self.num_writes = 0
+
+    def commit_batch(self, writes: list[Write]) -> None:
+        """Commit a batch and count its writes of `COLLECTION`."""
+        self.num_writes += sum(write[0] == COLLECTION for write in writes)
+        super().commit_batch(writes)
+
+
+def make_docs() -> dict[str, dict]:
+    """Make the documents of a few queues."""
+    return {
+        f"moderator-{i}:cs.LG": {"queue": [f"2309.{j:05d}" for j in range(i, i + 5)]}
+        for i in range(20)
+    }
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create an empty backend and a writer."""
+        self.backend = CountingBackend()
+        self.writer = ChunkedBatchWriter(self.backend, chunk_size=7)
+
+    def sync(self, docs: dict[str, dict]) -> tuple[int, int]:
+        """Sync the documents and reset the write count."""
+        self.backend.num_writes = 0
+        return sync_collection(self.backend, COLLECTION, docs, self.writer)
+
+    def test_unchanged_push_writes_nothing(self) -> None:
+        """Pushing the same documents twice writes nothing the second time."""
+        docs = make_docs()
+        self.assertEqual(self.sync(docs), (len(docs), 0))
+        self.assertEqual(self.backend.num_writes, len(docs))
+        self.assertEqual(self.sync(docs), (0, 0))
+        self.assertEqual(self.backend.num_writes, 0)
+
+    def test_changed_doc_is_written(self) -> None:
+        """Only the changed document is written."""
+        docs = make_docs()
+        self.sync(docs)
+        docs["moderator-3:cs.LG"]["queue"].append("2309.99999")
+        self.assertEqual(self.sync(docs), (1, 0))
+        self.assertEqual(self.backend.num_writes, 1)
+        self.assertEqual(
+            self.backend.get(COLLECTION, "moderator-3:cs.LG"),
+            docs["moderator-3:cs.LG"],
+        )
+
+    def test_removed_doc_is_deleted(self) -> None:
+        """A document that is no longer pushed is deleted."""
+        docs = make_docs()
+        self.sync(docs)
+        del docs["moderator-0:cs.LG"]
+        self.assertEqual(self.sync(docs), (0, 1))
+        self.assertIsNone(self.backend.get(COLLECTION, "moderator-0:cs.LG"))
+        self.assertEqual(self.backend.count(COLLECTION), len(docs))
+
+    def test_plain_push_updates_manifest(self) -> None:
+        """A plain push keeps the manifest up to date for the next sync."""
+        docs = make_docs()
+        self.sync(docs)
+        docs["moderator-5:cs.LG"] = {"queue": []}
+        push_collection(self.backend, COLLECTION, docs, self.writer)
+        self.assertEqual(set(load_manifest(self.backend, COLLECTION)), set(docs))
+        self.assertEqual(self.sync(docs), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
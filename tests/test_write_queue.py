@@ -0,0 +1,104 @@
+"""Tests of `WriteBehindQueue` against an in-memory `SQLiteBackend`.
+
+Example usage:
+```bash
+python -m unittest discover tests
+```
+"""
+
+import threading
+import unittest
+from collections.abc import Callable
+from backend import SQLiteBackend
+from write_queue import DELETE, SUBMIT, WriteBehindQueue
+
+KEY = "Jim Cline"
+DOC_ID = "1908.11218_Jim Cline"
+
+
+class WriteBehindQueueTest(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create an empty backend and a queue that gives up after one attempt."""
+        self.backend = SQLiteBackend(":memory:")
+        self.queue = WriteBehindQueue(num_workers=2, max_attempts=1, backoff=0)
+
+    def submit(self, value: str, fail: threading.Event | None = None) -> Callable:
+        """Make a submit of `value` that raises while `fail` is set."""
+
+        def apply() -> None:
+            if fail is not None and fail.is_set():
+                raise RuntimeError("unavailable")
+            self.backend.set("mod_results", DOC_ID, {"value": value})
+
+        return apply
+
+    def stored(self) -> str | None:
+        """Get the stored value of the document."""
+        doc = self.backend.get("mod_results", DOC_ID)
+        return doc["value"] if doc else None
+
+    def test_failed_write_is_retried(self) -> None:
+        """A failed write is applied by retry_failed."""
+        fail = threading.Event()
+        fail.set()
+        self.queue.enqueue(KEY, DOC_ID, SUBMIT, self.submit("old", fail))
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        self.assertEqual(self.queue.status(KEY), (0, 1))
+        fail.clear()
+        self.queue.retry_failed(KEY)
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        self.assertEqual(self.queue.status(KEY), (0, 0))
+        self.assertEqual(self.stored(), "old")
+
+    def test_failed_write_is_superseded_by_later_submit(self) -> None:
+        """Retrying a failed submit does not overwrite a later submit."""
+        fail = threading.Event()
+        fail.set()
+        self.queue.enqueue(KEY, DOC_ID, SUBMIT, self.submit("old", fail))
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        fail.clear()
+        self.queue.enqueue(KEY, DOC_ID, SUBMIT, self.submit("new"))
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        self.assertEqual(self.queue.status(KEY), (0, 0))
+        self.queue.retry_failed(KEY)
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        self.assertEqual(self.stored(), "new")
+
+    def test_failed_write_is_superseded_by_later_delete(self) -> None:
+        """Retrying a failed submit does not undo a later delete."""
+        self.queue.enqueue(KEY, DOC_ID, SUBMIT, self.submit("old"))
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        fail = threading.Event()
+        fail.set()
+        self.queue.enqueue(KEY, DOC_ID, SUBMIT, self.submit("new", fail))
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        self.queue.enqueue(
+            KEY, DOC_ID, DELETE, lambda: self.backend.delete("mod_results", DOC_ID)
+        )
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        fail.clear()
+        self.queue.retry_failed(KEY)
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        self.assertIsNone(self.stored())
+
+    def test_write_failing_in_flight_is_superseded(self) -> None:
+        """A write failing while a later write of the document is queued is dropped."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def apply_old() -> None:
+            started.set()
+            release.wait()
+            raise RuntimeError("unavailable")
+
+        self.queue.enqueue(KEY, DOC_ID, SUBMIT, apply_old)
+        self.assertTrue(started.wait(timeout=5))
+        self.queue.enqueue(KEY, DOC_ID, SUBMIT, self.submit("new"))
+        release.set()
+        self.assertTrue(self.queue.flush(KEY, timeout=5))
+        self.assertEqual(self.queue.status(KEY), (0, 0))
+        self.assertEqual(self.stored(), "new")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,30 @@
-"""Helper functions for the app and data processing."""
+"""Helper functions for the app and data processing.
+
+NOTE: the Firebase, scraping and storage libraries are imported when they are
+first used, so that importing this module (e.g. for the parser) stays cheap.
+"""
 
 import logging
 from argparse import ArgumentParser
-import requests
-from bs4 import BeautifulSoup
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-from tenacity import retry, stop_after_attempt, wait_exponential
-from enum import Enum
-from joblib import Memory
+from functools import cache
+from typing import TYPE_CHECKING
+from collections.abc import Iterable
+from decisions import (  # noqa: F401
+    PrimaryDecision,
+    SecondaryDecisionUponGoodOK,
+    SecondaryDecisionUponBad,
+)
 
-memory = Memory("cachedir")
+if TYPE_CHECKING:
+    from google.cloud import firestore
+    from ar5iv_checker import Ar5ivChecker
+    from arxiv_fetcher import ArxivFetcher
 
 logger = logging.getLogger(__name__)
 
+# fields of the paper details stored in the metadata store
+DETAILS_FIELDS = ["title", "authors", "abstract"]
+
 
 #
 # Data utils
@@ -27,42 +37,20 @@ parser.add_argument(
     default="data/mod-queue-all2023_v2-test-pos50-neg50.json",
     help="Path to moderator queues stored as a json file",
 )
-
-
-class PrimaryDecision(Enum):
-    """Enum for primary category decision options."""
-
-    GREAT_FIT = "Great fit (no other category would be better)"
-    GOOD_FIT = "Good fit (category is fine, but other categories may be better)"
-    OK_FIT = "OK fit (category is ok, but it is very likely that some other category would be better)"
-    BAD_FIT = "Bad fit (category should definitely not be primary)"
-
-    def __str__(self):
-        return self.value
-
-
-class SecondaryDecisionUponGoodOK(Enum):
-    """Enum for secondary category decision options conditional on the primary category being good or ok."""
-
-    GOOD_FIT = "Good Fit (category should definitely be secondary if it is not primary)"
-    OK_FIT = "OK Fit (I have no objection to listing the category as secondary)"
-    BAD_FIT = "Bad Fit (category should definitely not be secondary)"
-    N_A = "N/A"
-
-    def __str__(self):
-        return self.value
-
-
-class SecondaryDecisionUponBad(Enum):
-    """Enum for secondary category decision options conditional on the primary category being bad."""
-
-    GREAT_FIT = "Great Fit (category should definitely be secondary)"
-    OK_FIT = "OK Fit (I have no objection to listing the category as secondary)"
-    BAD_FIT = "Bad Fit (category should definitely not be secondary)"
-    N_A = "N/A"
-
-    def __str__(self):
-        return self.value
+parser.add_argument(
+    "--backend",
+    type=str,
+    choices=["firestore", "sqlite"],
+    default=None,
+    help="Storage backend (default: $ARXIV_ANNOTATOR_BACKEND or firestore)",
+)
+parser.add_argument(
+    "--sqlite_path",
+    type=str,
+    default=None,
+    help="Path to the SQLite file of the sqlite backend "
+    "(default: $ARXIV_ANNOTATOR_SQLITE_PATH or local.db)",
+)
 
 
 #
@@ -87,7 +75,7 @@ else:
     )
 
 
-def get_firestore() -> firestore.client:
+def get_firestore() -> "firestore.Client":
     """Get the firestore client
 
     Refs:
@@ -97,6 +85,9 @@ def get_firestore() -> firestore.client:
     https://docs.streamlit.io/develop/concepts/connections/secrets-management
     # NOTE: need change to secrets instead of json for deployment
     """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     if not firebase_admin._apps:
         # cred = credentials.Certificate('API_KEYS/arxiv-website-firebase-adminsdk-mkdbk-dc872d30e8.json')
         # point to soft link so that we don't have to modify this part of the code
@@ -110,85 +101,212 @@ def get_firestore() -> firestore.client:
 def get_arxiv_details_from_id(paper_id: str) -> dict:
     """Get paper info from the arXiv abstract page.
 
+    The details are read through the local metadata store (see
+    `metadata_store.py`), so the page is only fetched if the store has no
+    fresh details of the paper.
+
     Args:
         paper_id (str): arXiv paper ID
     Returns:
         dict: arxiv details
 
     """
-    try:
-        # Construct the URL from the paper ID
-        # TODO: get this information from the all2023_v2 split of the HF dataset
-
-        url = f"https://export.arxiv.org/abs/{paper_id}"
-
-        # Send a GET request to fetch the HTML content
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, "html.parser")
-        # import pdb; pdb.set_trace()
-
-        # Extract the title
-        title_element = soup.find("h1", {"class": "title mathjax"})
-        if title_element:
-            title = title_element.get_text(strip=True).replace("Title:", "")
-        else:
-            logger.warning(f"Title not found for paper at {url}")
-            title = "Title not found"
+    import requests
+    from metadata_store import get_metadata_store
+
+    store = get_metadata_store()
+    details = store.get_details(paper_id)
+    if details is None:
+        try:
+            details = _get_arxiv_fetcher().fetch(paper_id)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"An error occurred while fetching the page: {e}")
+            return {"Error": f"An error occurred while fetching the page: {e}"}
+        # incomplete pages are fetched again next time
+        if all(details.values()):
+            store.put_details(paper_id, details)
+    return format_arxiv_details(paper_id, details)
+
+
+def get_arxiv_details_many(
+    paper_ids: Iterable[str],
+    use_hf: bool = True,
+    hf_name: str = "all2023_v2",
+    hf_split: str = "test",
+    max_workers: int = 4,
+    rate: float = 4.0,
+) -> dict[str, dict]:
+    """Get the paper info of several papers.
+
+    The details are looked up in the local metadata store first, then in the
+    HF dataset (if `datasets` is installed), and only the remaining papers are
+    fetched from their arXiv abstract pages, concurrently over pooled
+    connections and with at most `rate` requests per second. Fetched details
+    are saved in the store.
 
-        # Extract the authors
-        author_elements = soup.find("div", {"class": "authors"})
-        if author_elements:
-            authors = author_elements.get_text(strip=True).replace("Authors:", "")
+    Args:
+        paper_ids (Iterable[str]): arXiv paper IDs
+        use_hf (bool): whether to look up the papers in the HF dataset
+        hf_name (str): config of the HF dataset
+        hf_split (str): split of the HF dataset
+        max_workers (int): number of concurrent requests to arXiv
+        rate (float): maximum number of requests to arXiv per second
+    Returns:
+        dict mapping each paper ID to its arxiv details, or to a dict with an
+        "Error" key if its page could not be fetched
+
+    """
+    from arxiv_fetcher import ArxivFetcher
+    from metadata_store import get_metadata_store
+
+    paper_ids = list(dict.fromkeys(paper_ids))
+    store = get_metadata_store()
+    details = store.get_details_many(paper_ids)
+    logger.info(f"Found {len(details)} / {len(paper_ids)} papers in the metadata store")
+
+    missing = [paper_id for paper_id in paper_ids if paper_id not in details]
+    if missing and use_hf:
+        try:
+            from hf_data import load_papers
+        except ImportError:
+            logger.warning("`datasets` is not installed, skipping the HF dataset")
         else:
-            logger.warning(f"Authors not found for paper at {url}")
-            authors = "Authors not found"
+            papers = load_papers(missing, name=hf_name, split=hf_split)
+            found = {
+                paper_id: {field: paper[field] for field in DETAILS_FIELDS}
+                for paper_id, paper in papers.items()
+            }
+            store.put_details_many(found)
+            details.update(found)
+            missing = [paper_id for paper_id in missing if paper_id not in details]
+
+    if missing:
+        fetched = ArxivFetcher(max_workers=max_workers, rate=rate).fetch_many(missing)
+        # incomplete pages are fetched again next time
+        store.put_details_many(
+            {
+                paper_id: paper
+                for paper_id, paper in fetched.items()
+                if paper is not None and all(paper.values())
+            }
+        )
+        details.update(
+            (paper_id, paper) for paper_id, paper in fetched.items() if paper
+        )
+
+    return {
+        paper_id: format_arxiv_details(paper_id, details[paper_id])
+        if paper_id in details
+        else {"Error": f"Could not fetch the page of {paper_id}"}
+        for paper_id in paper_ids
+    }
 
-        # Extract the abstract
-        abstract_block = soup.find("blockquote", {"class": "abstract mathjax"})
-        if abstract_block:
-            abstract = abstract_block.get_text(strip=True).replace("Abstract:", "")
+
+def format_arxiv_details(paper_id: str, details: dict) -> dict:
+    """Format the details of a paper as stored in the paper_info collection.
+
+    Args:
+        paper_id (str): arXiv paper ID
+        details (dict): title, authors and abstract, None if not found
+    Returns:
+        dict: arxiv details
+
+    """
+    url = f"https://export.arxiv.org/abs/{paper_id}"
+    formatted = {}
+    for field in DETAILS_FIELDS:
+        if details[field] is None:
+            logger.warning(f"{field.capitalize()} not found for paper at {url}")
+            formatted[field] = f"{field.capitalize()} not found"
         else:
-            logger.warning(f"Abstract not found for paper at {url}")
-            abstract = "Abstract not found"
-
-        # Return results as a dictionary
-        return {
-            "title": title,
-            "authors": authors,
-            "abstract": abstract,
-            "url": f"https://ar5iv.org/html/{paper_id}",  # construct the ar5iv website url since this doesn't display the category
-        }
-    except requests.exceptions.RequestException as e:
-        logger.error(f"An error occurred while fetching the page: {e}")
-        return {"Error": f"An error occurred while fetching the page: {e}"}
-
-
-@memory.cache
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=15))
+            formatted[field] = details[field]
+    # construct the ar5iv website url since this doesn't display the category
+    formatted["url"] = f"https://ar5iv.org/html/{paper_id}"
+    return formatted
+
+
+@cache
+def _get_arxiv_fetcher() -> "ArxivFetcher":
+    """Build the fetcher of arXiv abstract pages on first use."""
+    from arxiv_fetcher import ArxivFetcher
+
+    return ArxivFetcher(max_workers=1)
+
+
+@cache
+def _get_ar5iv_checker() -> "Ar5ivChecker":
+    """Build the checker of single ar5iv pages on first use."""
+    from ar5iv_checker import Ar5ivChecker
+
+    return Ar5ivChecker(max_workers=1)
+
+
 def has_ar5iv_page(paper_id: str) -> bool:
     """Check if the paper has an ar5iv page.
 
+    Results are read through the local metadata store (see `metadata_store.py`).
+
     Args:
         paper_id (str): arXiv paper ID
     Returns:
         bool: True if the paper has an ar5iv page, False otherwise
 
     """
-    url = f"https://ar5iv.labs.arxiv.org/html/{paper_id}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-    response = requests.get(url, headers=headers, allow_redirects=False)
-    match response.status_code:
-        case s if 200 <= s < 300:
-            return True
-        case s if 300 <= s < 400:
-            return False
-        case _:
-            raise Exception(f"Unexpected status code: {response.status_code}")
+    from metadata_store import get_metadata_store
+
+    store = get_metadata_store()
+    has_page = store.get_ar5iv(paper_id)
+    if has_page is None:
+        has_page = _get_ar5iv_checker().check(paper_id)
+        store.put_ar5iv(paper_id, has_page)
+    return has_page
+
+
+def has_ar5iv_pages(
+    paper_ids: Iterable[str],
+    base_url: str | None = None,
+    max_workers: int = 16,
+    rate: float = 20.0,
+) -> dict[str, bool | None]:
+    """Check which papers have an ar5iv page.
+
+    The checks are read from the local metadata store in bulk, and only the
+    papers without a fresh check are checked concurrently (see
+    `ar5iv_checker.py`). Successful checks are saved in the store.
+
+    Args:
+        paper_ids (Iterable[str]): arXiv paper IDs
+        base_url (str | None): URL under which the ar5iv pages are served,
+            defaults to `ar5iv_checker.AR5IV_URL`
+        max_workers (int): number of concurrent requests
+        rate (float): maximum number of requests per second
+    Returns:
+        dict mapping each paper ID to True if it has an ar5iv page, False if
+        it does not, and None if the check failed
+
+    """
+    from ar5iv_checker import AR5IV_URL, Ar5ivChecker
+    from metadata_store import get_metadata_store
+
+    paper_ids = list(dict.fromkeys(paper_ids))
+    store = get_metadata_store()
+    checks: dict[str, bool | None] = store.get_ar5iv_many(paper_ids)
+    logger.info(
+        f"Found ar5iv checks of {len(checks)} / {len(paper_ids)} papers in the metadata store"
+    )
+    unchecked_ids = [paper_id for paper_id in paper_ids if paper_id not in checks]
+    if unchecked_ids:
+        checker = Ar5ivChecker(
+            base_url=base_url or AR5IV_URL, max_workers=max_workers, rate=rate
+        )
+        results = checker.check_many(unchecked_ids)
+        # failed checks are not saved so that they are retried on the next run
+        store.put_ar5iv_many(
+            {
+                paper_id: has_page
+                for paper_id, has_page in results.items()
+                if has_page is not None
+            }
+        )
+        checks.update(results)
+    return {paper_id: checks[paper_id] for paper_id in paper_ids}
@@ -0,0 +1,200 @@
+"""Write-behind queue for moderation results.
+
+Submissions and deletions are applied by background worker threads so that the
+app can move on to the next paper without waiting for Firestore. Writes of the
+same moderator are applied in order, one at a time, while writes of different
+moderators are applied concurrently. A deletion of a document whose submission
+has not been started yet cancels the submission instead of being enqueued,
+which is the common case when a moderator presses "Back" right after
+submitting. A write that failed after all attempts is superseded, and dropped,
+by any later write of the same document, so retrying the failed writes never
+overwrites a newer submission or deletion.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+SUBMIT = "submit"
+DELETE = "delete"
+
+
+@dataclass
+class Write:
+    """A pending write of a moderation result document."""
+
+    doc_id: str
+    kind: str
+    apply: Callable[[], None]
+    attempts: int = 0
+    error: str | None = None
+
+
+class WriteBehindQueue:
+    """Apply writes in background threads with retries and per-key ordering.
+
+    Args:
+        num_workers (int): number of background worker threads
+        max_attempts (int): number of attempts before a write is marked as failed
+        backoff (float): initial number of seconds to wait before retrying,
+            doubled after each failed attempt
+
+    """
+
+    def __init__(
+        self, num_workers: int = 4, max_attempts: int = 5, backoff: float = 0.5
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._cond = threading.Condition()
+        # key -> writes not yet started
+        self._lanes: dict[str, deque[Write]] = {}
+        # keys with queued writes and no write in flight
+        self._ready: deque[str] = deque()
+        # keys with a write in flight
+        self._active: set[str] = set()
+        # key -> writes that failed after all attempts
+        self._failed: dict[str, list[Write]] = {}
+        for i in range(num_workers):
+            threading.Thread(
+                target=self._work, name=f"write-behind-{i}", daemon=True
+            ).start()
+
+    def enqueue(
+        self, key: str, doc_id: str, kind: str, apply: Callable[[], None]
+    ) -> None:
+        """Enqueue a write.
+
+        Args:
+            key (str): ordering key, e.g. the name of the moderator
+            doc_id (str): ID of the written document
+            kind (str): SUBMIT or DELETE
+            apply (Callable): function performing the write
+
+        """
+        with self._cond:
+            self._drop_failed(key, doc_id)
+            lane = self._lanes.setdefault(key, deque())
+            if (
+                kind == DELETE
+                and lane
+                and lane[-1].doc_id == doc_id
+                and lane[-1].kind == SUBMIT
+            ):
+                # the document was never written, so there is nothing to delete
+                logger.info(f"Coalescing submit and delete of {doc_id=}")
+                lane.pop()
+                return
+            lane.append(Write(doc_id, kind, apply))
+            if key not in self._active and key not in self._ready:
+                self._ready.append(key)
+                self._cond.notify()
+
+    def _work(self) -> None:
+        """Worker loop: apply the next write of a key that has no write in flight."""
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                key = self._ready.popleft()
+                write = self._lanes[key].popleft()
+                self._active.add(key)
+            self._apply(key, write)
+            with self._cond:
+                self._active.discard(key)
+                if self._lanes[key]:
+                    self._ready.append(key)
+                # wake up idle workers as well as callers of flush()
+                self._cond.notify_all()
+
+    def _apply(self, key: str, write: Write) -> None:
+        """Apply a write, retrying with exponential backoff."""
+        delay = self.backoff
+        while True:
+            write.attempts += 1
+            try:
+                write.apply()
+                return
+            except Exception as e:
+                write.error = str(e)
+                if write.attempts >= self.max_attempts:
+                    logger.error(
+                        f"Giving up on {write.kind} of {write.doc_id} after {write.attempts} attempts: {e}"
+                    )
+                    with self._cond:
+                        if any(
+                            queued.doc_id == write.doc_id
+                            for queued in self._lanes.get(key, ())
+                        ):
+                            # a later write of the document is already queued
+                            logger.info(
+                                f"Dropping failed {write.kind} of {write.doc_id} superseded by a later write"
+                            )
+                        else:
+                            self._failed.setdefault(key, []).append(write)
+                    return
+                logger.warning(
+                    f"Retrying {write.kind} of {write.doc_id} in {delay}s: {e}"
+                )
+                time.sleep(delay)
+                delay *= 2
+
+    def _drop_failed(self, key: str, doc_id: str) -> None:
+        """Drop the failed writes of a document superseded by a later write.
+
+        Must be called with `self._cond` held.
+        """
+        failed = self._failed.get(key)
+        if not failed:
+            return
+        remaining = [write for write in failed if write.doc_id != doc_id]
+        if len(remaining) < len(failed):
+            logger.info(
+                f"Dropping failed writes of {doc_id=} superseded by a later write"
+            )
+        if remaining:
+            self._failed[key] = remaining
+        else:
+            del self._failed[key]
+
+    def status(self, key: str) -> tuple[int, int]:
+        """Get the number of pending and failed writes of a key.
+
+        Args:
+            key (str): ordering key
+        Returns:
+            num_pending (int): number of queued or in-flight writes
+            num_failed (int): number of writes that failed after all attempts
+
+        """
+        with self._cond:
+            num_pending = len(self._lanes.get(key, ())) + (key in self._active)
+            return num_pending, len(self._failed.get(key, ()))
+
+    def retry_failed(self, key: str) -> None:
+        """Enqueue the failed writes of a key again."""
+        with self._cond:
+            failed = self._failed.pop(key, [])
+        for write in failed:
+            self.enqueue(key, write.doc_id, write.kind, write.apply)
+
+    def flush(self, key: str, timeout: float | None = None) -> bool:
+        """Wait until all writes of a key have been applied or have failed.
+
+        Args:
+            key (str): ordering key
+            timeout (float | None): maximum number of seconds to wait
+        Returns:
+            bool: True if no writes of the key are pending
+
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._lanes.get(key) and key not in self._active,
+                timeout=timeout,
+            )